@@ -1,311 +1,847 @@
 # app.py
+import contextvars
 import os
-import sqlite3
-from flask import Flask, request, render_template, url_for, jsonify
-import psycopg2, psycopg2.extras
-import google.generativeai as genai
-import markdown
-from PIL import Image
-from werkzeug.utils import secure_filename
+import json
+import queue
+import sys
+import threading
+import time
+import hashlib
+import zipfile
+from datetime import datetime, timezone
+from io import BytesIO
+from flask import (Blueprint, Flask, current_app, has_app_context, request, render_template, jsonify, Response,
+                   stream_with_context, redirect, url_for, make_response)
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+from petai_utils import analyze_behaviors, assess_cat_obesity, assess_dog_obesity
+from petai_jobs import get_backend, JOB_FINISHED
+from petai_db import health_check, pool_stats
+from petai_index import disease_index
+from petai_search import symptom_search, DEFAULT_LIMIT as SEARCH_LIMIT
+from petai_migrations import migrate
+from petai_cache import vision_cache, image_cache_key, prompt_cache, prompt_cache_key
+from petai_pipeline import Pipeline, Stage, StageTimeout, add_stage_observer
+from petai_images import ingest_image, guess_mime_type, wait_for_file_active, ImageBusy, INLINE_LIMIT_BYTES
+from petai_storage import get_upload_store, upload_url
+from petai_llm import get_limiter, GeminiUnavailable
+import petai_fallback
+from petai_analyses import analyses, input_hash
+from petai_prompt import build_prompt
+from petai_fragments import fragments, cached_page, CompressedAssets
+from petai_bulk import BulkRunner, BulkError, read_request as read_bulk_request, ndjson, NDJSON_MIMETYPE
+import petai_metrics as metrics
+
+# google.generativeai, PIL, markdown, psycopg2는 처음 필요할 때 불러옵니다. (import app이 빠르고, 워커 fork 전에 무거운 작업을 하지 않음)
+STREAM_TOKEN_MAX_AGE = 300
+
+# 파이프라인 단계 시간도 metrics의 단계 히스토그램에 기록합니다.
+add_stage_observer(metrics.observe_pipeline_stage)
 
-from petai_utils import analyze_behaviors, assess_cat_obesity, assess_dog_obesity, BEHAVIOR_DB
-
-
-# --- 1. Flask 앱 설정 ---
-app = Flask(__name__)
-UPLOAD_FOLDER = 'static/uploads'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-DB_FILE = 'pet_health.db'
 
 # --- 2. Gemini API 설정 ---
-try:
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if api_key:
-        genai.configure(api_key=api_key)
-        print("INFO: GEMINI_API_KEY 설정 완료")
-    else:
-        print("경고: GEMINI_API_KEY 환경 변수가 설정되지 않았습니다.")
-except Exception as e:
-    print(f"API 키 설정 오류: {e}")
-
-# setup_db.py에서 초기 데이터 가져오기
-diseases_data = [
-    ("알레르기성 피부염 (의심)", "피부 발진,붉은 반점,탈모", "가려움,핥음,비빔,발적", "주의 🟡", "사진과 증상으로 볼 때 '알레르기성 피부염'이 의심됩니다. 원인(사료, 간식, 집먼지 등)을 찾아보고, 증상이 지속되면 병원을 방문해 정확한 알레르기 원인을 찾는 것이 좋습니다."),
-    ("백내장 (초기 의심)", "흐릿한 눈,하얀 동공", "눈을 잘 못 마주침,밤에 잘 부딪힘,눈이 뿌옇게 보임", "경고 🔴", "사진상 동공이 뿌옇게 보이는 것은 '백내장'의 초기 징후일 수 있습니다. 방치하면 시력을 잃을 수 있으니 즉시 안과 전문 동물병원을 방문하여 검사를 받으세요."),
-    ("결막염 (의심)", "붉은 눈,눈곱,눈물", "눈을 찡그림,눈 주변을 비빔", "주의 🟡", "눈이 붉어지고 눈곱이 끼는 증상은 '결막염'일 수 있습니다. 세균 감염이나 알레르기 때문일 수 있으니, 병원에서 안약을 처방받아 치료하는 것이 좋습니다."),
-    ("정상 피부", "정상 피부", "특별한 증상 없음", "안전 🟢", "사진과 증상으로는 특별한 이상 징후가 보이지 않습니다. 건강한 상태로 보입니다. 하지만 평소와 다른 행동을 보인다면 주의 깊게 관찰해주세요."),
-    ("고양이 허피스 바이러스 (상부 호흡기 감염)", "눈곱,콧물,재채기,눈 부음", "재채기,콧물,눈물,식욕부진", "주의 🟡", "고양이 허피스 바이러스는 상부 호흡기 감염(고양이 감기)의 주요 원인입니다. 전염성이 매우 강하므로 다른 고양이와 격리하고, 습도를 높여주어 호흡을 편안하게 해주세요. 증상이 심하거나 2-3일 내에 개선되지 않으면 즉시 병원을 방문하여 항바이러스 치료를 받는 것이 중요합니다."),
-    ("슬개골 탈구 (강아지)", "다리를 절음,깽깽이걸음,다리를 들고 뜀", "깽깽이걸음,다리를 절음,무릎에서 소리가 남", "경고 🔴", "깽깽이걸음이나 다리를 저는 증상은 슬개골 탈구의 대표적인 증상입니다. 특히 소형견에게 흔하게 발생합니다. 방치할 경우 관절염으로 악화될 수 있으니, 정형외과 전문 동물병원에서 정확한 단계를 진단받고 수술 여부를 상담하는 것이 좋습니다.")
-]
+genai = None  # get_genai()가 처음 호출될 때 google.generativeai 모듈로 채워집니다. (테스트/벤치마크는 가짜 모듈로 교체)
+_genai_lock = threading.Lock()
+
+
+def get_genai():
+    """google.generativeai를 한 번만 불러와 API 키를 설정한 뒤 반환합니다."""
+    global genai
+    if genai is None:
+        with _genai_lock:
+            if genai is None:
+                import google.generativeai as client
+                try:
+                    api_key = os.environ.get("GEMINI_API_KEY")
+                    endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+                    if endpoint:
+                        # 부하 테스트용 대체 서버(benchmarks/mock_gemini_server.py) 등으로 보냅니다. (REST 전용)
+                        # Files API 업로드는 discovery 문서 주소가 고정되어 있어 같은 서버를 가리키도록 바꿉니다.
+                        import google.generativeai.client as genai_client
+                        genai_client.GENAI_API_DISCOVERY_URL = f"{endpoint.rstrip('/')}/$discovery/rest"
+                        client.configure(api_key=api_key or 'local', transport='rest',
+                                         client_options={'api_endpoint': endpoint})
+                        print(f"INFO: Gemini API endpoint: {endpoint}")
+                    elif api_key:
+                        client.configure(api_key=api_key)
+                        print("INFO: GEMINI_API_KEY 설정 완료")
+                    else:
+                        print("경고: GEMINI_API_KEY 환경 변수가 설정되지 않았습니다.")
+                except Exception as e:
+                    print(f"API 키 설정 오류: {e}")
+                genai = client
+    return genai
+
+
+def warm_up():
+    """
+    무거운 라이브러리를 미리 불러옵니다. gunicorn --preload에서 마스터가 fork 전에 호출하면 워커들이 메모리를 공유합니다.
+    연결, 스레드, gRPC 채널처럼 fork 후에 공유하면 안 되는 것은 만들지 않습니다.
+    """
+    import google.generativeai  # noqa: F401
+    from PIL import Image  # noqa: F401
+    # markdown을 불러오고 BCS 가이드, 이상행동 카드 같은 고정 HTML 조각을 미리 렌더링합니다.
+    fragments.build()
+    if os.environ.get("DATABASE_URL"):
+        import psycopg2.extras  # noqa: F401
+        import psycopg2.pool  # noqa: F401
+
 
 def run_db_setup():
     """
-    데이터베이스를 확인하고 필요한 테이블과 초기 데이터를 설정합니다.
-    Render 환경에서는 PostgreSQL을, 로컬에서는 SQLite를 사용합니다.
+    스키마 마이그레이션(petai_migrations)을 적용합니다. 웹 요청 경로에서는 호출하지 않으며,
+    gunicorn.conf.py의 on_starting 훅, setup_db.py, `python app.py` 실행 시 배포마다 한 번 실행됩니다.
     """
-    database_url = os.environ.get("DATABASE_URL")
-    if database_url:
-        # --- PostgreSQL 설정 (Render 환경) ---
-        try:
-            conn = psycopg2.connect(database_url)
-            cur = conn.cursor()
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS diseases (
-                    id SERIAL PRIMARY KEY,
-                    disease_name TEXT NOT NULL,
-                    image_labels TEXT,
-                    text_symptoms TEXT,
-                    warning_level TEXT,
-                    advice TEXT
-                )
-            ''')
-            conn.commit()
-            print("Postgres: 테이블 생성 확인 완료.")
-
-            cur.execute("SELECT COUNT(*) FROM diseases")
-            if cur.fetchone()[0] == 0:
-                print("Postgres: 테이블이 비어있어 초기 데이터를 삽입합니다.")
-                insert_q = '''INSERT INTO diseases (disease_name, image_labels, text_symptoms, warning_level, advice) VALUES (%s,%s,%s,%s,%s)'''
-                cur.executemany(insert_q, diseases_data)
-                conn.commit()
-                print(f"Postgres: {len(diseases_data)}개의 초기 질병 데이터가 DB에 저장되었습니다.")
-            else:
-                print("Postgres: 데이터가 이미 존재하므로 초기화를 건너뜁니다.")
-
-            cur.close()
-            conn.close()
-        except Exception as e:
-            print(f"Postgres DB 설정 중 오류 발생: {e}")
-    else:
-        # --- SQLite 설정 (로컬 환경) ---
-        try:
-            conn = sqlite3.connect(DB_FILE)
-            cur = conn.cursor()
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS diseases (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    disease_name TEXT NOT NULL, image_labels TEXT, text_symptoms TEXT,
-                    warning_level TEXT, advice TEXT
-                )
-            ''')
-            conn.commit()
-            cur.execute("SELECT COUNT(*) FROM diseases")
-            if cur.fetchone()[0] == 0:
-                insert_q = '''INSERT INTO diseases (disease_name, image_labels, text_symptoms, warning_level, advice) VALUES (?,?,?,?,?)'''
-                cur.executemany(insert_q, diseases_data)
-                conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"SQLite DB 설정 중 오류 발생: {e}")
+    label = "Postgres" if os.environ.get("DATABASE_URL") else "SQLite"
+    try:
+        migrate()
+    except Exception as e:
+        print(f"{label} DB 설정 중 오류 발생: {e}")
 
 
 # --- 3. 핵심 로직 함수 ---
-def analyze_image(image_path):
-    """실제 Gemini Vision 모델을 사용하여 이미지를 분석하고 라벨을 반환합니다."""
-    try:
-        print(f"INFO: Analyzing image at {image_path} with Gemini Vision...")
-        image_file = genai.upload_file(path=image_path)
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
-        prompt = """
+VISION_MODEL = 'models/gemini-2.5-flash'
+# Gemini 호출 한 번의 HTTP 제한 시간(초). 단계 제한 시간을 넘긴 호출도 이 시간이 지나면 끝나 스레드를 돌려줍니다.
+GEMINI_REQUEST_TIMEOUT = float(os.environ.get('GEMINI_REQUEST_TIMEOUT', 30))
+GEMINI_REQUEST_OPTIONS = {"timeout": GEMINI_REQUEST_TIMEOUT}
+VISION_PROMPT = """
         당신은 수의학 지식이 있는 AI 보조원입니다.
         이 반려동물 사진에서 관찰할 수 있는 모든 잠재적인 의학적 증상을 자세히 묘사해주세요.
         눈, 코, 입, 귀, 피부, 털 상태, 자세 등 구체적인 부위에 집중해서 설명해주세요.
         만약 여러 증상이 보인다면 모두 나열해주세요. (예: 왼쪽 눈의 탁한 분비물, 코 주변의 약간의 붉은 기, 가슴 부분의 뭉친 털)
         만약 특별한 이상 징후 없이 건강해 보인다면 '외관상 특이 소견 없음' 이라고 답변해주세요.
         """
-        response = model.generate_content([prompt, image_file])
-        
-        # 응답 후 파일 상태 확인 및 삭제
-        while image_file.state.name == "PROCESSING":
-            print('... Still processing file')
-            image_file.get_file()
-        genai.delete_file(image_file.name)
-        print(f"INFO: Image analysis result: {response.text.strip()}")
-        return response.text.strip()
+
+
+def analyze_image(image_bytes, mime_type='image/jpeg'):
+    """
+    실제 Gemini Vision 모델을 사용하여 이미지를 분석하고 라벨을 반환합니다. (같은 사진은 캐시된 결과를 사용합니다)
+    이미지는 업로드 단계에서 이미 축소/압축되어 있으므로 바이트를 그대로 인라인으로 보냅니다.
+    """
+    try:
+        from PIL import Image
+        with metrics.stage('image_hash'), Image.open(BytesIO(image_bytes)) as image:
+            cache_key = image_cache_key(image)
+    except Exception as e:
+        print(f"이미지 파일을 읽는 중 오류 발생: {e}")
+        return "이미지 분석 실패"
+    cached_label = vision_cache.get(cache_key)
+    if cached_label is not None:
+        print("INFO: Vision cache hit")
+        return cached_label
+
+    uploaded_file = None
+    client = get_genai()
+    limiter = get_limiter()
+    try:
+        print(f"INFO: Analyzing image ({len(image_bytes)} bytes) with Gemini Vision...")
+        if len(image_bytes) <= INLINE_LIMIT_BYTES:
+            image_part = {"mime_type": mime_type, "data": image_bytes}
+        else:
+            # 인라인 한도를 넘는 경우에만 Files API를 사용합니다.
+            with metrics.stage('gemini_file_upload'):
+                uploaded_file = limiter.call(client.upload_file, path=BytesIO(image_bytes), mime_type=mime_type)
+                image_part = uploaded_file = wait_for_file_active(client, uploaded_file)
+        model = client.GenerativeModel(VISION_MODEL)
+        with metrics.stage('gemini_vision'):
+            response = limiter.call(model.generate_content, [VISION_PROMPT, image_part],
+                                    request_options=GEMINI_REQUEST_OPTIONS)
+        metrics.record_gemini_usage(VISION_MODEL, response)
+        label = response.text.strip()
+        print(f"INFO: Image analysis result: {label}")
+        vision_cache.set(cache_key, label)
+        return label
     except Exception as e:
         print(f"이미지 분석 중 오류 발생: {e}")
+        metrics.record_error('vision', e)
         return "이미지 분석 실패"
+    finally:
+        if uploaded_file is not None:
+            try:
+                client.delete_file(uploaded_file.name)
+            except Exception as e:
+                print(f"업로드 파일 삭제 중 오류 발생: {e}")
+
+def search_symptoms(text):
+    """증상 문장과 관련된 질병을 관련도 순으로 검색합니다. (petai_search 전문 검색 색인 사용)"""
+    if not text:
+        return None
+    try:
+        with metrics.stage('symptom_search'):
+            ranked = symptom_search.search(text, limit=SEARCH_LIMIT)
+        return [{k: v for k, v in d.items() if k != 'search_score'} for d in ranked] or None
+    except Exception as e:
+        print(f"증상 검색 중 오류 발생: {e}")
+        metrics.record_error('symptom_search', e)
+        return None
+
 
 def search_db_by_image_label(image_label):
-    """이미지 라벨을 기반으로 데이터베이스에서 관련 질병을 검색합니다."""
-    database_url = os.environ.get("DATABASE_URL")
-    conn = None
+    """
+    이미지 라벨을 기반으로 관련 질병을 검색합니다.
+    키워드가 그대로 들어 있는 질병(메모리의 키워드 인덱스)을 먼저 두고, 전문 검색으로 찾은 질병을 관련도 순으로 덧붙입니다.
+    """
     try:
-        if database_url:
-            conn = psycopg2.connect(database_url)
-            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        else:
-            conn = sqlite3.connect(DB_FILE)
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
+        with metrics.stage('db_search'):
+            matched_diseases = disease_index.match(image_label)
+        seen = {d['id'] for d in matched_diseases}
+        for disease in search_symptoms(image_label) or []:
+            if len(matched_diseases) >= max(len(seen), SEARCH_LIMIT):
+                break
+            if disease['id'] not in seen:
+                matched_diseases.append(disease)
+        return matched_diseases if matched_diseases else None
+    except Exception as e:
+        print(f"DB 검색 중 오류 발생: {e}")
+        metrics.record_error('db_search', e)
+        return None
 
-        cur.execute("SELECT * FROM diseases")
-        all_diseases = cur.fetchall()
 
-        matched_diseases = []
-        for disease_row in all_diseases:
-            disease_dict = dict(disease_row)
-            keywords = [k.strip() for k in disease_dict['image_labels'].split(',')]
-            if any(keyword in image_label for keyword in keywords if keyword):
-                matched_diseases.append(disease_dict)
+DIAGNOSIS_MODEL = 'models/gemini-2.5-flash'
 
-        return matched_diseases if matched_diseases else None
 
+def generate_diagnosis(prompt, use_cache=True):
+    """
+    진단 프롬프트로 Gemini를 호출해 마크다운 텍스트를 반환합니다.
+    같은 프롬프트는 캐시된 응답을 쓰고, 동시에 들어온 같은 요청은 하나의 호출을 공유합니다.
+    use_cache=False이면 캐시를 건너뛰고 새로 호출합니다.
+    """
+    def call():
+        model = get_genai().GenerativeModel(DIAGNOSIS_MODEL)
+        with metrics.stage('gemini_diagnosis'):
+            response = get_limiter().call(model.generate_content, prompt, request_options=GEMINI_REQUEST_OPTIONS)
+        metrics.record_gemini_usage(DIAGNOSIS_MODEL, response)
+        return response.text
+
+    return prompt_cache.get_or_compute(prompt_cache_key(DIAGNOSIS_MODEL, prompt), call, bypass=not use_cache)
+
+
+def stream_diagnosis(prompt, use_cache=True):
+    """generate_diagnosis의 스트리밍 버전. Gemini가 보내는 텍스트 조각을 차례로 yield 합니다."""
+    cache_key = prompt_cache_key(DIAGNOSIS_MODEL, prompt)
+    if use_cache:
+        cached = prompt_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    model = get_genai().GenerativeModel(DIAGNOSIS_MODEL)
+    limiter = get_limiter()
+    parts = []
+    # 스트리밍은 클라이언트로 보내는 시간까지 포함해 측정되며, 응답을 다 받을 때까지 동시 호출 자리를 잡고 있습니다.
+    with limiter.slot(), metrics.stage('gemini_diagnosis_stream'):
+        # 조각을 읽는 도중 난 429/5xx도 브레이커에 기록되도록 stream_in_slot으로 감쌉니다.
+        stream = limiter.stream_in_slot(model.generate_content, prompt, stream=True,
+                                        request_options=GEMINI_REQUEST_OPTIONS)
+        for chunk in stream:
+            if chunk.parts:
+                parts.append(chunk.text)
+                yield chunk.text
+    metrics.record_gemini_usage(DIAGNOSIS_MODEL, stream.response)
+    prompt_cache.set(cache_key, "".join(parts))
+
+
+def render_markdown(text):
+    """마크다운을 HTML로 변환합니다."""
+    import markdown
+    return markdown.markdown(text)
+
+
+def render_markdown_safe(text):
+    """모델이 만든 마크다운을 HTML로 변환합니다. 텍스트 안의 원시 HTML 태그는 이스케이프합니다."""
+    return render_markdown(text.replace('&', '&amp;').replace('<', '&lt;'))
+
+
+def parse_analysis_form(form_data):
+    """form_data에서 분석에 필요한 값들을 추출합니다."""
+    return {
+        "pet_type": form_data.get('pet_type', '고양이'),
+        "symptom_text": form_data.get('symptoms', '').strip(),
+        "age_years": float(form_data.get('age', 2.0)),
+        "weight_kg": float(form_data.get('weight', 4.5)),
+        # no_cache=1 이면 진단 응답 캐시를 건너뜁니다.
+        "use_cache": str(form_data.get('no_cache', '')).lower() not in ('1', 'true', 'on'),
+    }
+
+
+def local_analysis(params, selected_behaviors):
+    """Gemini 없이 바로 계산되는 추가 분석 (이상행동, 비만)."""
+    result = {}
+    if selected_behaviors:
+        result['behavior_analysis'] = analyze_behaviors(selected_behaviors, params['symptom_text'])
+
+    if params['pet_type'] == '고양이':
+        result['obesity_analysis'] = assess_cat_obesity(params['age_years'], params['weight_kg'])
+    elif params['pet_type'] == '강아지':
+        result['obesity_analysis'] = assess_dog_obesity(params['age_years'], params['weight_kg'])
+    return result
+
+
+def load_upload(image_key):
+    """업로드 저장소에서 (이미지 바이트, MIME 타입)을 읽어옵니다."""
+    return get_upload_store().read(image_key), guess_mime_type(image_key)
+
+
+def analyze_upload(image_key):
+    """업로드한 사진을 분석해 라벨을 반환합니다."""
+    return analyze_image(*load_upload(image_key))
+
+
+def build_diagnosis_prompt(pet_type, symptom_text, has_image, image_label=None, db_results=None, symptom_results=None):
+    """진단용 Gemini 프롬프트를 만듭니다. (DB 검색 결과는 petai_prompt가 관련도 순으로 토큰 예산 안에서 간결하게 적습니다)"""
+    return build_prompt(pet_type, symptom_text, has_image, image_label, db_results, symptom_results)
+
+
+VISION_TIMEOUT = float(os.environ.get('VISION_TIMEOUT', 30))
+DB_SEARCH_TIMEOUT = float(os.environ.get('DB_SEARCH_TIMEOUT', 5))
+DIAGNOSIS_TIMEOUT = float(os.environ.get('DIAGNOSIS_TIMEOUT', 60))
+# 분석 전체를 기다리는 최대 시간. 넘으면 Gemini 대신 로컬 진단(petai_fallback)으로 먼저 답합니다.
+ANALYSIS_DEADLINE = float(os.environ.get('ANALYSIS_DEADLINE', 20))
+
+
+def symptom_stage(params, calls):
+    return Stage('symptoms', lambda: calls.search_symptoms(params['symptom_text']), timeout=DB_SEARCH_TIMEOUT)
+
+
+def image_stages(image_key, calls):
+    """사진 분석(vision)과 라벨로 찾는 DB 검색(db) 단계. 사진 분석이 제한 시간을 넘기면 '이미지 분석 실패' 라벨로 계속합니다."""
+    return [
+        Stage('vision', lambda: calls.analyze_upload(image_key), timeout=VISION_TIMEOUT, default="이미지 분석 실패",
+              pool='gemini'),
+        Stage('db', calls.search_db_by_image_label, deps=['vision'], timeout=DB_SEARCH_TIMEOUT),
+    ]
+
+
+def build_analysis_pipeline(params, image_key, selected_behaviors, calls=None):
+    """
+    분석 단계 의존성 그래프.
+        vision -> db -> prompt -> diagnosis
+        symptoms (증상 전문 검색) -> prompt
+        local (이상행동, 비만)은 다른 단계와 동시에 실행됩니다.
+    Gemini를 부르는 vision/diagnosis는 gemini 스레드 풀에서 실행되어, Gemini가 멈춰도 DB 검색 단계가 밀리지 않습니다.
+    run(deadline=ANALYSIS_DEADLINE)으로 실행하면 진단이 늦어도 그 시간 안에 끝납니다.
+
+    calls는 단계가 부르는 I/O 함수(analyze_upload, search_symptoms, search_db_by_image_label, generate_diagnosis)를
+    가진 객체입니다. 기본값은 이 모듈이고, petai_aio는 같은 이름의 코루틴 함수를 가진 자기 모듈을 넘겨 run_async()로 실행합니다.
+    """
+    calls = calls or sys.modules[__name__]
+    stages = [Stage('local', lambda: local_analysis(params, selected_behaviors)), symptom_stage(params, calls)]
+    if image_key:
+        stages += image_stages(image_key, calls)
+        stages.append(Stage('prompt', lambda label, db_results, symptom_results: build_diagnosis_prompt(
+            params['pet_type'], params['symptom_text'], True, label, db_results, symptom_results),
+            deps=['vision', 'db', 'symptoms']))
+    else:
+        stages.append(Stage('prompt', lambda symptom_results: build_diagnosis_prompt(
+            params['pet_type'], params['symptom_text'], False, symptom_results=symptom_results), deps=['symptoms']))
+    stages.append(Stage('diagnosis', lambda prompt: calls.generate_diagnosis(prompt, use_cache=params['use_cache']),
+                        deps=['prompt'], timeout=DIAGNOSIS_TIMEOUT, pool='gemini'))
+    return Pipeline(stages)
+
+
+def fallback_diagnosis(params, selected_behaviors, results, reason, local=None):
+    """Gemini 진단 대신 쓸 로컬 진단 마크다운. results는 파이프라인 단계 결과(없는 단계는 건너뜀)."""
+    related = [*(results.get('db') or []), *(results.get('symptoms') or [])]
+    behavior_analysis = (local or {}).get('behavior_analysis')
+    with metrics.stage('fallback_diagnosis'):
+        fallback = petai_fallback.diagnose(params['symptom_text'], results.get('vision'), selected_behaviors,
+                                           related, reason=reason, behavior_analysis=behavior_analysis)
+    return fallback['markdown']
+
+
+def render_result_fragment(result):
+    """결과 페이지 본문(_result.html)을 렌더링합니다. 작업 스레드/RQ 워커에서는 모듈 수준 앱의 컨텍스트를 씁니다."""
+    if has_app_context():
+        return render_template('_result.html', result=result)
+    with app.app_context():
+        return render_template('_result.html', result=result)
+
+
+def store_result(form_data, image_key, selected_behaviors, result):
+    """완료된 분석을 analyses에 저장하고 id를 반환합니다. 저장에 실패해도 분석 결과는 그대로 돌려줍니다."""
+    try:
+        with metrics.stage('store_result'):
+            return analyses.save(input_hash(form_data, image_key, selected_behaviors), result,
+                                 render_result_fragment(result))
     except Exception as e:
-        print(f"DB 검색 중 오류 발생: {e}")
+        print(f"분석 결과 저장 중 오류 발생: {e}")
+        metrics.record_error('store_result', e)
         return None
-    finally:
-        if conn:
-            conn.close()
 
 
-def run_analysis_task(form_data, image_path_relative, selected_behaviors):
-    """오래 걸리는 분석 작업을 수행하는 함수 (백그라운드 워커에서 실행됨)"""
-    # form_data에서 필요한 값들을 다시 추출
-    pet_type = form_data.get('pet_type', '고양이')
-    symptom_text = form_data.get('symptoms', '').strip()
-    age_years = float(form_data.get('age', 2.0))
-    weight_kg = float(form_data.get('weight', 4.5))
+def context_result(params, image_key, results):
+    """결과의 입력 부분: 사진 키와 분석 라벨, 증상 텍스트와 증상 검색 결과. results는 파이프라인 단계 결과."""
+    result = {}
+    if image_key:
+        result['image_path'] = image_key
+        result['image_analysis_label'] = results.get('vision')
+    if params['symptom_text']:
+        result['symptom_text'] = params['symptom_text']
+        if results.get('symptoms'):
+            result['symptom_matches'] = results['symptoms']
+    return result
+
+
+def fallback_reason(run):
+    """
+    진단 단계가 실패한 파이프라인의 (대체 진단 이유, diagnosis_key).
+    제한 시간에 걸렸으면(맥락 수집 중이었더라도) 'timeout', 그 외 실패는 'error'입니다.
+    프롬프트까지 만들었으면 늦게 도착한 Gemini 응답이 프롬프트 캐시에 저장되므로, 결과 페이지가 /diagnosis/<key>로 받아 갑니다.
+    """
+    error = run.errors.get('diagnosis') or run.errors.get('prompt')
+    if not isinstance(error, StageTimeout):
+        return 'error', None
+    return 'timeout', prompt_cache_key(DIAGNOSIS_MODEL, run.results['prompt']) if run.ok('prompt') else None
+
 
-    result_data = {}
-    prompt_contexts = []
+def analysis_result(params, image_key, selected_behaviors, run):
+    """파이프라인 실행 결과로 결과 dict를 만듭니다. Gemini가 늦거나 실패하면 로컬 진단으로 답합니다. (저장 전)"""
+    # 이상행동/비만 분석은 Gemini와 무관하므로, 전체 제한 시간에 걸렸다면 여기서 다시 계산합니다. (오류는 그대로 전파)
+    local = run.results['local'] if run.ok('local') else local_analysis(params, selected_behaviors)
+    result_data = context_result(params, image_key, run.results)
 
+    if run.ok('diagnosis'):
+        diagnosis = run.results['diagnosis']
+    else:
+        reason, diagnosis_key = fallback_reason(run)
+        print(f"INFO: Gemini 진단 대신 로컬 진단을 사용합니다. ({run.errors.get('diagnosis') or run.errors.get('prompt')})")
+        diagnosis = fallback_diagnosis(params, selected_behaviors, run.results, reason, local)
+        result_data['fallback'] = True
+        if diagnosis_key:
+            result_data['diagnosis_key'] = diagnosis_key
+
+    # Gemini가 생성한 마크다운 텍스트를 HTML로 변환
+    with metrics.stage('markdown'):
+        result_data['gemini_response'] = render_markdown_safe(diagnosis)
+
+    # --- 추가 분석 (이상행동, 비만) ---
+    result_data.update(local)
+    return result_data
+
+
+def finish_analysis_task(started, result_data=None, error=None):
+    """분석 작업의 소요 시간을 상태(ok | fallback | error)별로 기록하고 돌려줄 dict를 반환합니다."""
+    if error is not None:
+        print(f"분석 중 오류 발생: {error}")
+        metrics.stage_seconds.observe(time.perf_counter() - started, stage='analysis_task', status='error')
+        metrics.record_error('analysis_task', error)
+        # 오류 발생 시 오류 정보를 담은 딕셔너리 반환
+        return {"error": f"분석 중 오류가 발생했습니다: {error}"}
+    status = 'fallback' if result_data.get('fallback') else 'ok'
+    metrics.stage_seconds.observe(time.perf_counter() - started, stage='analysis_task', status=status)
+    return result_data
+
+
+def run_analysis_task(form_data, image_key, selected_behaviors):
+    """오래 걸리는 분석 작업을 수행하는 함수 (백그라운드 워커에서 실행됨)"""
+    params = parse_analysis_form(form_data)
+    started = time.perf_counter()
     try:
-        # --- 이미지 처리 (이미지가 있는 경우) ---
-        if image_path_relative:
-            result_data['image_path'] = image_path_relative
-            image_path = os.path.join('static', image_path_relative) # 실제 파일 경로
-
-            image_result_label = analyze_image(image_path)
-            db_results = search_db_by_image_label(image_result_label)
-
-            result_data['image_analysis_label'] = image_result_label
-            if db_results:
-                prompt_contexts.append(f"[사진 분석과 관련된 수의학 지식 (DB 검색 결과)]\n{db_results}")
-            else:
-                prompt_contexts.append("[사진 분석과 관련된 수의학 지식 (DB 검색 결과)]\n일치하는 정보를 찾지 못했습니다.")
-
-        # --- 증상 텍스트 처리 (증상이 있는 경우) ---
-        if symptom_text:
-            result_data['symptom_text'] = symptom_text
-            prompt_contexts.append(f"[보호자 관찰 내용]\n{symptom_text}")
-
-        mission = "" # mission 변수 초기화
-        if symptom_text and image_path_relative:
-            mission = "위의 [사진 분석과 관련된 수의학 지식]을 바탕으로, [보호자 관찰 내용]과 [사진 분석 결과 라벨]을 종합하여" 
-        elif image_path_relative:
-            mission = "위의 [사진 분석과 관련된 수의학 지식]과 [사진 분석 결과 라벨]을 바탕으로,"
-        else: # symptom_text only
-            mission = "[보호자 관찰 내용]을 바탕으로,"
-
-        # --- Gemini 모델 초기화 ---
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
-
-        if 'image_analysis_label' in result_data:
-            prompt_contexts.append(f"[사진 분석 결과 라벨]\n{result_data['image_analysis_label']}")
-
-        prompt = f'''
-        당신은 전문 {pet_type} 수의사 AI 조수입니다. {", ".join(prompt_contexts)}
-
-
-        ---
-        [임무]
-        {mission} 보호자에게 가장 가능성이 높은 질병과 경고, 조언을 생성해주세요.
-        만약 [사진 분석과 관련된 수의학 지식]이 제공되었다면, 해당 내용을 우선적으로 참고하여 답변을 구성하세요.
-        증상만으로 판단이 어려울 경우, 여러 가능성을 제시하고 사진 등의 추가 정보를 요청할 수 있습니다.
-        답변은 반드시 아래 [출력 형식]을 따라야 합니다.
-
-        [규칙] 
-        [출력 형식]
-        ### 핵심 요약
-        (모든 내용을 한두 문장으로 요약)
-        ### 상세 설명
-        (의심되는 점과 그 이유를 자세히 설명)
-        ### 권장 조치
-        (보호자가 해야 할 일, 예를 들어 병원 방문 권유 등)
-        '''
-        response = model.generate_content(prompt)
-        # Gemini가 생성한 마크다운 텍스트를 HTML로 변환
-        result_data['gemini_response'] = markdown.markdown(response.text)
-
-        # --- 추가 분석 (이상행동, 비만) ---
-        if selected_behaviors:
-            result_data['behavior_analysis'] = analyze_behaviors(selected_behaviors, symptom_text)
-        
-        if pet_type == '고양이':
-            result_data['obesity_analysis'] = assess_cat_obesity(age_years, weight_kg)
-        elif pet_type == '강아지':
-            result_data['obesity_analysis'] = assess_dog_obesity(age_years, weight_kg)
-
-        return result_data
+        run = build_analysis_pipeline(params, image_key, selected_behaviors).run(deadline=ANALYSIS_DEADLINE)
+        result_data = analysis_result(params, image_key, selected_behaviors, run)
+        # Gemini 답변이 있는 결과만 저장합니다. (로컬 진단은 나중에 Gemini 답변으로 바뀔 수 있으므로)
+        if not result_data.get('fallback'):
+            analysis_id = store_result(form_data, image_key, selected_behaviors, result_data)
+            if analysis_id:
+                result_data['analysis_id'] = analysis_id
+        return finish_analysis_task(started, result_data)
+    except Exception as e:
+        return finish_analysis_task(started, error=e)
+
+
+def sse_event(event, data):
+    """Server-Sent Events 형식의 메시지 한 개를 만듭니다."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+_STREAM_END = object()
+
+
+def iter_with_deadline(iterable, timeout):
+    """
+    iterable을 별도 스레드에서 읽어 조각을 그대로 yield 합니다.
+    timeout초 안에 첫 조각이 오지 않으면 None을 한 번 yield 한 뒤(그 사이 대체 응답을 보내도록) 계속 기다립니다.
+    """
+    pieces = queue.Queue()
+
+    def produce():
+        try:
+            for piece in iterable:
+                pieces.put((piece, None))
+        except Exception as e:
+            pieces.put((_STREAM_END, e))
+        else:
+            pieces.put((_STREAM_END, None))
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(produce,), daemon=True, name='petai-stream').start()
+    first = True
+    while True:
+        try:
+            piece, error = pieces.get(timeout=timeout if first else None)
+        except queue.Empty:
+            first = False
+            yield None
+            continue
+        first = False
+        if piece is _STREAM_END:
+            if error is not None:
+                raise error
+            return
+        yield piece
+
+
+def _stream_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='analysis-stream')
+
+
+def stream_analysis_steps(form_data, image_key, selected_behaviors, calls, render, result_url):
+    """
+    스트리밍 분석의 이벤트 순서. 동기(stream_analysis_events)와 비동기(petai_aio) 드라이버가 함께 씁니다.
+    Gemini를 기다리지 않는 결과(이상행동, 비만, DB 검색)를 먼저 보내고, 진단 텍스트는 도착하는 대로 렌더링된 HTML로 보냅니다.
+
+    보낼 SSE 문자열과 I/O 요청을 yield 합니다. 드라이버는 I/O 결과를 send()로, 예외를 throw()로 돌려줍니다.
+        ('run', pipeline, deadline)              -> PipelineRun (calls의 함수로 만든 단계)
+        ('call', func, args)                     -> func(*args) (DB를 읽는 대체 진단, 결과 저장. 비동기 드라이버는 스레드에서 실행)
+        ('stream', prompt, use_cache, timeout)   -> 진단 조각 반복자 (첫 조각이 timeout초 안에 오지 않으면 None 한 번)
+        ('next', pieces)                         -> 다음 조각, 끝나면 _STREAM_END
+    render(template, **context)는 템플릿 렌더링, result_url(analysis_id)는 저장된 결과 페이지 주소입니다.
+    """
+    started = time.monotonic()
+
+    def remaining():
+        return max(0.0, ANALYSIS_DEADLINE - (time.monotonic() - started))
 
+    try:
+        params = parse_analysis_form(form_data)
+        extras = local_analysis(params, selected_behaviors)
+        run = yield ('run', Pipeline([symptom_stage(params, calls)]), remaining())
+        results = {'symptoms': run.results['symptoms']}
+        if results['symptoms']:
+            extras['symptom_matches'] = results['symptoms']
+        yield sse_event('context', {"html": render('_extras.html', result=extras)})
+
+        if image_key:
+            run = yield ('run', Pipeline(image_stages(image_key, calls)), remaining())
+            results.update(vision=run.results['vision'], db=run.results['db'])
+            yield sse_event('context', {"html": render(
+                '_extras.html', result=extras, image_label=results['vision'], db_matches=results['db'] or [])})
+
+        prompt = build_diagnosis_prompt(params['pet_type'], params['symptom_text'], bool(image_key),
+                                        results.get('vision'), results.get('db'), results['symptoms'])
+        response_text, fell_back = "", False
+        try:
+            pieces = yield ('stream', prompt, params['use_cache'], remaining())
+            while True:
+                piece = yield ('next', pieces)
+                if piece is _STREAM_END:
+                    break
+                if piece is None:
+                    # Gemini의 첫 조각이 늦으면 로컬 진단을 먼저 보내고, Gemini 답변이 오면 덮어씁니다.
+                    fallback = yield ('call', fallback_diagnosis,
+                                      (params, selected_behaviors, results, 'timeout', extras))
+                    yield sse_event('chunk', {"html": render_markdown_safe(fallback), "fallback": True})
+                    continue
+                response_text += piece
+                yield sse_event('chunk', {"html": render_markdown_safe(response_text)})
+        except Exception as e:
+            print(f"스트리밍 진단 실패, 로컬 진단으로 대체합니다: {e}")
+            metrics.record_error('gemini_diagnosis_stream', e)
+            fallback = yield ('call', fallback_diagnosis, (params, selected_behaviors, results, 'error', extras))
+            yield sse_event('chunk', {"html": render_markdown_safe(fallback), "fallback": True})
+            fell_back = True
+
+        done = {}
+        if response_text and not fell_back:
+            result = {**context_result(params, image_key, results), **extras,
+                      "gemini_response": render_markdown_safe(response_text)}
+            analysis_id = yield ('call', store_result, (form_data, image_key, selected_behaviors, result))
+            if analysis_id:
+                # 페이지 주소를 저장된 결과로 바꿔, 새로고침이나 공유 시 분석을 다시 실행하지 않도록 합니다.
+                done['url'] = result_url(analysis_id)
+        yield sse_event('done', done)
     except Exception as e:
-        print(f"분석 중 오류 발생: {e}")
-        # 오류 발생 시 오류 정보를 담은 딕셔너리 반환
-        return {"error": f"분석 중 오류가 발생했습니다: {e}"}
+        print(f"스트리밍 분석 중 오류 발생: {e}")
+        metrics.record_error('analysis_stream', e)
+        yield sse_event('error', {"message": f"분석 중 오류가 발생했습니다: {e}"})
+
+
+def _perform_step(step):
+    kind, *args = step
+    if kind == 'run':
+        pipeline, deadline = args
+        return pipeline.run(deadline=deadline)
+    if kind == 'call':
+        func, call_args = args
+        return func(*call_args)
+    if kind == 'stream':
+        prompt, use_cache, timeout = args
+        return iter_with_deadline(stream_diagnosis(prompt, use_cache=use_cache), timeout)
+    return next(args[0], _STREAM_END)
+
+
+def stream_analysis_events(form_data, image_key, selected_behaviors):
+    """스트리밍 분석 (stream_analysis_steps의 동기 드라이버). 요청 컨텍스트 안에서 실행합니다."""
+    steps = stream_analysis_steps(form_data, image_key, selected_behaviors, sys.modules[__name__], render_template,
+                                  lambda analysis_id: url_for('petai.stored_result', analysis_id=analysis_id))
+    value, error, streams = None, None, []
+    try:
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration:
+                return
+            value, error = None, None
+            if isinstance(step, str):
+                yield step
+                continue
+            try:
+                value = _perform_step(step)
+            except Exception as e:
+                error = e
+            if step[0] == 'stream' and error is None:
+                streams.append(value)
+    finally:
+        steps.close()
+        for pieces in streams:
+            pieces.close()
 
 # --- 4. Flask 라우트(경로) 설정 ---
-@app.route('/')
+bp = Blueprint('petai', __name__)
+
+
+@bp.route('/')
 def index():
-    behavior_options = list(BEHAVIOR_DB.keys())
-    return render_template('index.html', behaviors=behavior_options)
+    """첫 화면은 입력에 따라 바뀌지 않으므로 한 번만 렌더링해 두고, ETag가 같으면 304로 답합니다."""
+    return cached_page('index', lambda: render_template('index.html')).response()
 
-@app.route('/analyze', methods=['POST'])
+@bp.route('/analyze', methods=['POST'])
 def analyze():
     symptom_text = request.form.get('symptoms', '').strip()
     uploaded_file = request.files.get('image')
 
     if not symptom_text and not (uploaded_file and uploaded_file.filename != ''):
-        return render_template('index.html', error="사진 또는 증상 중 하나는 반드시 입력해야 합니다.", behaviors=list(BEHAVIOR_DB.keys())), 400
+        return render_template('index.html', error="사진 또는 증상 중 하나는 반드시 입력해야 합니다."), 400
 
-    image_path_relative = None
+    image_key = None
     if uploaded_file and uploaded_file.filename != '':
         try:
-            image = Image.open(uploaded_file.stream)
-            original_filename = secure_filename(uploaded_file.filename)
-            filename_stem = os.path.splitext(original_filename)[0]
-            new_filename = f"{filename_stem}.png"
-            image_path_full = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
-            image.save(image_path_full, 'PNG')
-            image_path_relative = os.path.join(os.path.basename(app.config['UPLOAD_FOLDER']), new_filename).replace('\\', '/')
+            # 헤더로 형식/해상도를 먼저 확인하고, 한 번만 디코드해 축소/압축한 뒤 내용 해시 이름으로 저장합니다.
+            # (결과 페이지 표시와 Gemini 전송에 같은 파일을 사용)
+            with metrics.stage('image_ingest'):
+                ingested = ingest_image(uploaded_file.stream)
+            with metrics.stage('upload_store'):
+                image_key = get_upload_store().put(ingested.data, ingested.extension)
+        except ImageBusy as e:
+            return render_template('index.html', error=str(e)), 503, {'Retry-After': str(e.retry_after)}
         except Exception as e:
             print(f"이미지 처리 중 오류 발생: {e}")
-            return render_template('index.html', error=f"이미지 파일을 처리할 수 없습니다: {e}", behaviors=list(BEHAVIOR_DB.keys())), 400
+            return render_template('index.html', error=f"이미지 파일을 처리할 수 없습니다: {e}"), 400
 
     selected_behaviors = request.form.getlist('behaviors')
 
-    # 동기식으로 분석을 직접 수행하고 결과를 바로 렌더링합니다.
+    # 같은 입력으로 저장된 결과가 있으면 분석을 다시 실행하지 않고 그 결과로 보냅니다. (no_cache=1이면 새로 분석)
+    if parse_analysis_form(request.form)['use_cache']:
+        try:
+            analysis_id = analyses.find_id(input_hash(request.form, image_key, selected_behaviors))
+        except Exception as e:
+            print(f"저장된 분석 결과 조회 중 오류 발생: {e}")
+            analysis_id = None
+        if analysis_id:
+            return redirect(url_for('petai.stored_result', analysis_id=analysis_id), code=303)
+
+    # Gemini 대기열이 가득 찼거나 브레이커가 열려 있으면 작업을 만들지 않고 바로 503으로 돌려보냅니다.
+    get_limiter().check_admission()
+
+    # 스트리밍 모드: 결과 페이지를 바로 보여주고, 페이지가 /analyze/stream에서 결과를 받아옵니다.
+    if request.form.get('stream'):
+        stream_token = _stream_serializer().dumps({
+            "form": dict(request.form), "image_path": image_key, "behaviors": selected_behaviors,
+        })
+        result_stub = {"image_path": image_key, "symptom_text": symptom_text}
+        return render_template('results.html', result=result_stub, stream_token=stream_token)
+
+    # 분석 작업을 큐에 넣고, 로딩 페이지가 /jobs/<job_id>를 폴링하도록 합니다.
     try:
-        result_data = run_analysis_task(dict(request.form), image_path_relative, selected_behaviors)
-        # 분석이 끝나면 바로 결과 페이지를 보여줍니다.
-        return render_template('results.html', result=result_data, behaviors=list(BEHAVIOR_DB.keys()))
+        job_id = get_backend().enqueue(run_analysis_task, dict(request.form), image_key, selected_behaviors)
     except Exception as e:
-        print(f"분석 처리 중 오류: {e}")
-        # 오류 발생 시, 에러 메시지와 함께 메인 페이지로 돌아갑니다.
-        return render_template('index.html', error=f"분석 처리 중 오류가 발생했습니다: {e}", behaviors=list(BEHAVIOR_DB.keys())), 500
+        print(f"분석 작업 등록 중 오류: {e}")
+        return render_template('index.html', error=f"분석 처리 중 오류가 발생했습니다: {e}"), 500
+    return render_template('loading.html', job_id=job_id), 202
+
+
+@bp.route('/analyze/stream', methods=['GET', 'POST'])
+def analyze_stream():
+    """/analyze가 발급한 서명된 토큰으로 분석을 실행하고 결과를 text/event-stream으로 보냅니다."""
+    try:
+        payload = _stream_serializer().loads(request.values.get('token', ''), max_age=STREAM_TOKEN_MAX_AGE)
+    except BadSignature:
+        return jsonify({"error": "유효하지 않거나 만료된 스트리밍 요청입니다."}), 400
+    get_limiter().check_admission()
+    events = stream_analysis_events(payload['form'], payload['image_path'], payload['behaviors'])
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@bp.route('/analyze/bulk', methods=['POST'])
+def analyze_bulk():
+    """
+    여러 항목(zip, multipart, JSONL 매니페스트)을 한 번에 분석하고, 끝나는 순서대로 결과를 NDJSON으로 보냅니다.
+    항목 형식과 입력 방식은 petai_bulk를 참고하세요.
+    """
+    try:
+        items, images = read_bulk_request(request)
+    except (BulkError, zipfile.BadZipFile) as e:
+        return jsonify({"error": str(e)}), 400
+    if not items:
+        return jsonify({"error": "분석할 항목이 없습니다."}), 400
+    get_limiter().check_admission()
+
+    def lines():
+        for line in BulkRunner(run_analysis_task).run(items, images):
+            if line.get('analysis_id'):
+                line['url'] = url_for('petai.stored_result', analysis_id=line['analysis_id'])
+            yield line
+
+    return Response(stream_with_context(ndjson(lines())), mimetype=NDJSON_MIMETYPE,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    """분석 작업의 상태(queued/started/finished/failed)와 완료 시 결과를 JSON으로 반환합니다."""
+    job = get_backend().get(job_id)
+    if job is None:
+        return jsonify({"job_id": job_id, "status": "not_found"}), 404
+    return jsonify({"job_id": job_id, **job})
+
+
+@bp.route('/show_result/<job_id>')
+def show_result(job_id):
+    """완료된 분석 작업의 결과 페이지를 렌더링합니다."""
+    job = get_backend().get(job_id)
+    if job is None or job['status'] != JOB_FINISHED:
+        return render_template('results.html', result=None), 404
+    return render_template('results.html', result=job['result'])
+
+RESULT_MAX_AGE = int(os.environ.get('RESULT_MAX_AGE', 3600))
+
+
+@bp.route('/results/<analysis_id>')
+def stored_result(analysis_id):
+    """저장된 분석 결과 페이지. 내용이 바뀌지 않으므로 ETag/Last-Modified로 조건부 요청에 304를 돌려줍니다."""
+    row = analyses.get(analysis_id)
+    if row is None:
+        return render_template('results.html', result=None), 404
+    etag = hashlib.sha256(row['html'].encode('utf-8')).hexdigest()[:32]
+    last_modified = datetime.fromtimestamp(int(row['created_at']), timezone.utc)
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since and request.if_modified_since >= last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template('results.html', result=row['result'], result_html=row['html']))
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = RESULT_MAX_AGE
+    return response
+
+
+@bp.route('/diagnosis/<key>')
+def late_diagnosis(key):
+    """로컬 진단으로 먼저 답한 분석의 Gemini 답변. 아직 없으면 202 pending."""
+    text = prompt_cache.get(key, count=False)
+    if text is None:
+        return jsonify({"status": "pending"}), 202
+    return jsonify({"status": "ready", "html": render_markdown_safe(text)})
+
+
+@bp.route('/healthz')
+def healthz():
+    """DB 상태와 커넥션 풀 지표(대기 시간, 사용률)를 JSON으로 반환합니다."""
+    db_ok = health_check()
+    return jsonify({
+        "status": "ok" if db_ok else "degraded",
+        "db": pool_stats(),
+        "vision_cache": vision_cache.stats(),
+        "prompt_cache": prompt_cache.stats(),
+    }), (200 if db_ok else 503)
+
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """단계별 지연 시간 히스토그램, Gemini 토큰 수, 오류 수를 Prometheus 텍스트 형식으로 반환합니다."""
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+
+def _cache_gauges():
+    for name, cache in (('vision', vision_cache), ('prompt', prompt_cache)):
+        stats = cache.stats()
+        yield f'petai_{name}_cache_hits', f'{name} 캐시 적중 수', stats['hits']
+        yield f'petai_{name}_cache_misses', f'{name} 캐시 실패 수', stats['misses']
 
 
-_db_initialized = False
-@app.before_request
-def initialize_database():
-    """앱이 첫 요청을 받기 전에 딱 한 번 DB를 초기화합니다."""
-    global _db_initialized
-    if not _db_initialized:
-        run_db_setup()
-        _db_initialized = True
+metrics.REGISTRY.add_collector(_cache_gauges)
 
-@app.errorhandler(500)
+
+def _db_pool_gauges():
+    """/healthz의 커넥션 풀 통계(대기 시간, 사용률)를 /metrics에도 내보냅니다."""
+    stats = pool_stats()
+    yield 'petai_db_pool_in_use', '사용 중인 DB 연결 수', stats['in_use']
+    yield 'petai_db_pool_max_size', 'DB 커넥션 풀 최대 크기', stats['max_size']
+    yield 'petai_db_pool_utilization', 'DB 커넥션 풀 사용률 (0~1)', stats['utilization']
+    yield 'petai_db_pool_checkouts', 'DB 연결을 빌려 간 횟수', stats['checkouts']
+    yield 'petai_db_pool_timeouts', 'DB 연결을 기다리다 시간 초과된 횟수', stats['timeouts']
+    yield 'petai_db_pool_wait_seconds_sum', 'DB 연결을 기다린 시간 합계(초)', stats['wait_seconds_total']
+    yield 'petai_db_pool_wait_seconds_max', 'DB 연결을 기다린 최대 시간(초)', stats['wait_seconds_max']
+
+
+metrics.REGISTRY.add_collector(_db_pool_gauges)
+
+
+@bp.app_errorhandler(GeminiUnavailable)
+def gemini_unavailable(error):
+    """Gemini 제한기가 거절한 요청은 Retry-After와 함께 503으로 응답합니다."""
+    headers = {'Retry-After': str(error.retry_after)}
+    if request.accept_mimetypes.best == 'application/json' or request.path.startswith('/analyze/stream'):
+        return jsonify({"error": str(error), "retry_after": error.retry_after}), 503, headers
+    return render_template('index.html', error=str(error)), 503, headers
+
+
+@bp.app_errorhandler(500)
 def internal_error(error):
     print(f"500 Error: {error}")
-    return render_template('index.html', error="서버 오류가 발생했습니다. 다시 시도해주세요.", behaviors=list(BEHAVIOR_DB.keys())), 500
+    return render_template('index.html', error="서버 오류가 발생했습니다. 다시 시도해주세요."), 500
 
-# --- 5. 앱 실행 ---
+# --- 5. 앱 생성 ---
+def create_app(config=None):
+    """
+    Flask 앱을 만듭니다. DB 연결, Gemini 클라이언트, 작업 스레드는 만들지 않고 처음 쓰일 때 준비되므로
+    gunicorn --preload로 마스터에서 만든 앱을 워커에 그대로 fork해도 안전합니다.
+    """
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    # 스트리밍 토큰 서명용. 워커가 여러 개라면 모든 워커가 같은 SECRET_KEY를 써야 합니다.
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or os.urandom(32).hex()
+    if config:
+        app.config.update(config)
+    app.jinja_env.globals['upload_url'] = upload_url
+    app.jinja_env.globals['fragments'] = fragments
+    # static/style.css는 압축본과 ETag를 미리 만들어 둡니다.
+    CompressedAssets(app.static_folder).init_app(app)
+    # 요청별 request id, 처리 시간 히스토그램, JSON 접근 로그
+    metrics.init_app(app)
+    app.register_blueprint(bp)
+    return app
+
+
+# gunicorn app:app 호환용 모듈 수준 앱
+app = create_app()
+
+# --- 6. 앱 실행 ---
 if __name__ == '__main__':
     # 개발/테스트 시에는 waitress를 사용하여 Windows에서도 안정적으로 실행
     from waitress import serve
+    run_db_setup()
     port = int(os.environ.get('PORT', 5001))
     print(f"INFO: Starting web server on http://0.0.0.0:{port}")
     serve(app, host='0.0.0.0', port=port)
@@ -0,0 +1,133 @@
+# asgi.py
+"""
+비동기(ASGI) 서빙 모드.
+
+    uvicorn asgi:app --port 5001
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+Gemini를 기다리는 분석 경로(/analyze, /analyze/stream)는 petai_aio의 비동기 코어가 처리하므로,
+대기 중인 분석이 스레드나 워커를 잡지 않아 프로세스 하나가 수백 개의 분석을 동시에 기다릴 수 있습니다.
+나머지 경로(첫 화면, /results/<id>, /diagnosis/<key>, /analyze/bulk, /healthz, /metrics 등)는
+같은 Flask 앱(app.app)을 a2wsgi로 감싸 그대로 씁니다.
+
+/analyze는 작업 큐(petai_jobs) 대신 요청 안에서 분석을 기다린 뒤 저장된 결과 페이지(/results/<id>)로 보냅니다.
+"""
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as petai_app
+import petai_aio
+from petai_images import ImageBusy
+from petai_llm import GeminiUnavailable, get_async_limiter
+
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def _index_error(message, status_code, headers=None):
+    return HTMLResponse(petai_aio.render('index.html', error=message), status_code, headers=headers)
+
+
+async def _read_form(request):
+    """(폼, 문자열 필드 dict). Flask의 request.form처럼 같은 이름의 필드는 첫 값을 씁니다."""
+    form = await request.form()
+    fields = {}
+    for key, value in form.multi_items():
+        if isinstance(value, str):
+            fields.setdefault(key, value)
+    return form, fields
+
+
+async def analyze(request):
+    max_length = petai_app.app.config['MAX_CONTENT_LENGTH']
+    if int(request.headers.get('content-length') or 0) > max_length:
+        return _index_error(f"업로드 크기가 {max_length // (1024 * 1024)}MB를 넘습니다.", 413)
+    form, form_data = await _read_form(request)
+    symptom_text = form_data.get('symptoms', '').strip()
+    uploaded_file = form.get('image')
+    has_image = isinstance(uploaded_file, UploadFile) and uploaded_file.filename
+
+    if not symptom_text and not has_image:
+        return _index_error("사진 또는 증상 중 하나는 반드시 입력해야 합니다.", 400)
+
+    image_key = None
+    if has_image:
+        try:
+            image_key = await petai_aio.ingest_upload(uploaded_file.file)
+        except ImageBusy as e:
+            return _index_error(str(e), 503, {'Retry-After': str(e.retry_after)})
+        except Exception as e:
+            print(f"이미지 처리 중 오류 발생: {e}")
+            return _index_error(f"이미지 파일을 처리할 수 없습니다: {e}", 400)
+
+    selected_behaviors = [v for v in form.getlist('behaviors') if isinstance(v, str)]
+
+    analysis_id = await petai_aio.find_stored(form_data, image_key, selected_behaviors)
+    if analysis_id:
+        return RedirectResponse(petai_aio.result_url(analysis_id), status_code=303)
+
+    get_async_limiter().check_admission()
+
+    if form_data.get('stream'):
+        stream_token = petai_aio.dump_stream_token({
+            "form": form_data, "image_path": image_key, "behaviors": selected_behaviors,
+        })
+        result_stub = {"image_path": image_key, "symptom_text": symptom_text}
+        return HTMLResponse(petai_aio.render('results.html', result=result_stub, stream_token=stream_token))
+
+    result = await petai_aio.run_analysis(form_data, image_key, selected_behaviors)
+    if result.get('analysis_id'):
+        return RedirectResponse(petai_aio.result_url(result['analysis_id']), status_code=303)
+    return HTMLResponse(petai_aio.render('results.html', result=result))
+
+
+async def analyze_stream(request):
+    """app.analyze_stream의 비동기 버전."""
+    values = dict(request.query_params)
+    if request.method == 'POST':
+        values.update((await _read_form(request))[1])
+    try:
+        payload = petai_aio.load_stream_token(values.get('token', ''))
+    except BadSignature:
+        return JSONResponse({"error": "유효하지 않거나 만료된 스트리밍 요청입니다."}, 400)
+    get_async_limiter().check_admission()
+    events = petai_aio.stream_analysis_events(payload['form'], payload['image_path'], payload['behaviors'])
+    return StreamingResponse(events, media_type='text/event-stream', headers=STREAM_HEADERS)
+
+
+async def gemini_unavailable(request, error):
+    """app.gemini_unavailable과 같은 503 응답."""
+    headers = {'Retry-After': str(error.retry_after)}
+    if 'application/json' in request.headers.get('accept', '') or request.url.path.startswith('/analyze/stream'):
+        return JSONResponse({"error": str(error), "retry_after": error.retry_after}, 503, headers=headers)
+    return _index_error(str(error), 503, headers)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await petai_aio.db.connect()
+    try:
+        yield
+    finally:
+        await petai_aio.db.close()
+
+
+def create_asgi_app():
+    """비동기 분석 경로 + 나머지는 Flask 앱(app.app)으로 넘기는 Starlette 앱을 만듭니다."""
+    return Starlette(
+        routes=[
+            Route('/analyze', analyze, methods=['POST']),
+            Route('/analyze/stream', analyze_stream, methods=['GET', 'POST']),
+            Mount('/', WSGIMiddleware(petai_app.app)),
+        ],
+        exception_handlers={GeminiUnavailable: gemini_unavailable},
+        lifespan=lifespan,
+    )
+
+
+app = create_asgi_app()
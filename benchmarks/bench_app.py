@@ -0,0 +1,20 @@
+# benchmarks/bench_app.py
+"""
+WSGI 서버(gunicorn 등)로 띄우는 벤치마크용 앱. 가짜 Gemini가 설치된 app:app 입니다.
+
+    BENCH_LATENCY=0.3 BENCH_JITTER=0.05 gunicorn benchmarks.bench_app:app
+"""
+import os
+
+import app as petai_app
+from benchmarks import fake_gemini
+
+fake_gemini.install(
+    petai_app,
+    latency=float(os.environ.get('BENCH_LATENCY', 0.3)),
+    jitter=float(os.environ.get('BENCH_JITTER', 0.05)),
+)
+if os.environ.get('BENCH_UPLOAD_DIR'):
+    from benchmarks.bench_pipeline import use_upload_dir
+    use_upload_dir(os.environ['BENCH_UPLOAD_DIR'])
+app = petai_app.app
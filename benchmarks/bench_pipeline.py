@@ -0,0 +1,402 @@
+# benchmarks/bench_pipeline.py
+"""
+분석 파이프라인 벤치마크.
+가짜 Gemini(지연 시간/지터 설정 가능)와 합성 질병 테이블(행 수 설정 가능), 여러 크기의 생성 이미지로
+단계별 지연 시간과 Flask 테스트 클라이언트 / 실제 WSGI 서버(gunicorn, waitress)를 통한 처리량을 측정합니다.
+결과는 커밋 간 비교할 수 있도록 JSON으로 저장합니다.
+
+    python -m benchmarks.bench_pipeline --rows 10,1000,100000 --image-sizes 256,1024,4000 \\
+        --concurrency 1,8,32 --requests 64 --server gunicorn --output bench_results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from benchmarks.fake_gemini import DIAGNOSIS_TEXT
+
+KEYWORDS = ["붉은 눈", "눈곱", "눈물", "피부 발진", "탈모", "콧물", "재채기", "흐릿한 눈", "하얀 동공", "다리를 절음",
+            "붉은 반점", "각질", "귀 분비물", "잇몸 출혈", "구토", "설사", "기침", "부종", "상처", "딱지"]
+
+
+# --- 통계 ---
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q
+    lo, hi = int(pos), min(int(pos) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def summarize(samples, wall_seconds=None):
+    """지연 시간 목록(초)을 p50/p95/p99(ms)와 초당 처리량으로 요약합니다."""
+    values = sorted(samples)
+    total = wall_seconds if wall_seconds is not None else sum(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3) if values else None,
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3) if values else None,
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3) if values else None,
+        "max_ms": round(values[-1] * 1000, 3) if values else None,
+        "rps": round(len(values) / total, 3) if total else None,
+    }
+
+
+class StageRecorder:
+    """petai_pipeline 단계 관찰자. 단계 이름별로 소요 시간을 모읍니다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def __call__(self, name, seconds, status):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def add(self, name, seconds):
+        self(name, seconds, 'ok')
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+    def report(self):
+        with self._lock:
+            return {name: summarize(values) for name, values in sorted(self.samples.items())}
+
+
+# --- 합성 데이터 ---
+def make_image_bytes(size, seed):
+    """size x (size*3/4) 크기의 무작위 노이즈 PNG. 매번 다른 이미지라 사진 캐시에 걸리지 않습니다."""
+    from PIL import Image
+    rnd = random.Random(seed)
+    height = max(1, size * 3 // 4)
+    tile = Image.frombytes('RGB', (64, 48), bytes(rnd.getrandbits(8) for _ in range(64 * 48 * 3)))
+    buf = BytesIO()
+    tile.resize((size, height)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def synthetic_rows(count, seed=0):
+    rnd = random.Random(seed)
+    for i in range(count):
+        labels = ",".join(f"{rnd.choice(KEYWORDS)} {i}" if rnd.random() < 0.9 else rnd.choice(KEYWORDS)
+                          for _ in range(3))
+        yield (f"합성 질병 {i}", labels, "가려움,핥음", "주의 🟡", f"합성 질병 {i}에 대한 조언입니다.")
+
+
+def prepare_database(app_module, rows):
+    """diseases 테이블을 rows개의 합성 데이터로 채웁니다."""
+    from petai_db import get_connection, placeholder
+    app_module.run_db_setup()
+    p = placeholder()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM diseases")
+        cur.executemany(
+            f"INSERT INTO diseases (disease_name, image_labels, text_symptoms, warning_level, advice) VALUES ({p},{p},{p},{p},{p})",
+            list(synthetic_rows(rows)))
+
+
+def form_for(i, with_image):
+    form = {
+        "pet_type": "고양이" if i % 2 else "강아지",
+        "age": "3", "weight": "5.2",
+        "symptoms": f"눈곱이 끼고 눈이 붉어요 ({i})",
+        "behaviors": ["과도한 핥기"],
+        "no_cache": "1",
+    }
+    if not with_image:
+        form["symptoms"] = f"구토를 자주 해요 ({i})"
+    return form
+
+
+# --- 단계별 측정 ---
+def use_upload_dir(path):
+    """업로드 저장소를 임시 디렉터리로 바꿔 벤치마크 이미지가 static/uploads에 쌓이지 않게 합니다."""
+    import petai_storage
+    petai_storage._store = petai_storage.LocalUploadStore(root=path, static_root=os.path.dirname(path))
+    return petai_storage._store
+
+
+def bench_stages(app_module, recorder, image_sizes, iterations):
+    """이미지 처리, DB 검색, 프롬프트 생성, 마크다운 렌더링과 run_analysis_task 전체를 직접 호출해 측정합니다."""
+    from petai_images import ingest_image
+    from petai_storage import get_upload_store
+    recorder.reset()
+    for size in image_sizes:
+        for i in range(iterations):
+            image_key = None
+            if size:
+                raw = make_image_bytes(size, seed=size * 1000 + i)
+                started = time.perf_counter()
+                ingested = ingest_image(BytesIO(raw))
+                recorder.add(f"ingest_{size}px", time.perf_counter() - started)
+                image_key = get_upload_store(start_sweeper=False).put(ingested.data, ingested.extension)
+
+            started = time.perf_counter()
+            app_module.search_db_by_image_label("왼쪽 눈의 탁한 분비물, 붉은 눈 3, 눈곱")
+            recorder.add("db_search", time.perf_counter() - started)
+
+            started = time.perf_counter()
+            app_module.render_markdown(DIAGNOSIS_TEXT)
+            recorder.add("markdown", time.perf_counter() - started)
+
+            started = time.perf_counter()
+            result = app_module.run_analysis_task(form_for(i, bool(size)), image_key, ["과도한 핥기"])
+            recorder.add("run_analysis_task", time.perf_counter() - started)
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+    return recorder.report()
+
+
+# --- HTTP 측정 ---
+def _multipart(form, image_bytes):
+    boundary = uuid.uuid4().hex
+    lines = []
+    for key, value in form.items():
+        for v in (value if isinstance(value, list) else [value]):
+            lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{v}\r\n'.encode())
+    if image_bytes is not None:
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="bench.png"\r\n'
+                     f'Content-Type: image/png\r\n\r\n'.encode() + image_bytes + b'\r\n')
+    lines.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(lines), f'multipart/form-data; boundary={boundary}'
+
+
+class TestClientDriver:
+    """Flask 테스트 클라이언트로 요청합니다 (네트워크/WSGI 서버 비용 제외)."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+
+    def post(self, path, body, content_type):
+        response = self.flask_app.test_client().post(path, data=body, content_type=content_type)
+        return response.status_code, response.get_data(as_text=True)
+
+    def get(self, path):
+        response = self.flask_app.test_client().get(path)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class HTTPDriver:
+    """실제 WSGI 서버에 urllib로 요청합니다."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def _send(self, request):
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return response.status, response.read().decode('utf-8')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8')
+
+    def post(self, path, body, content_type):
+        return self._send(urllib.request.Request(self.base_url + path, data=body, headers={'Content-Type': content_type}))
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+
+def one_analysis(driver, i, image_bytes, poll_interval=0.02):
+    """/analyze에 제출하고 /jobs/<id>가 끝날 때까지 폴링합니다. (제출 지연, 전체 지연)을 반환합니다."""
+    import re
+    body, content_type = _multipart(form_for(i, image_bytes is not None), image_bytes)
+    started = time.perf_counter()
+    status, html = driver.post('/analyze', body, content_type)
+    submitted = time.perf_counter() - started
+    match = re.search(r'const jobId = "(\w+)"', html)
+    if status != 202 or not match:
+        raise RuntimeError(f"/analyze 실패 (HTTP {status})")
+    while True:
+        status, text = driver.get(f'/jobs/{match.group(1)}')
+        job = json.loads(text)
+        if job.get('status') in ('finished', 'failed', 'not_found'):
+            break
+        time.sleep(poll_interval)
+    if job['status'] != 'finished' or 'error' in (job.get('result') or {}):
+        raise RuntimeError(f"분석 실패: {job}")
+    return submitted, time.perf_counter() - started
+
+
+_image_seeds = itertools.count(1_000_000)
+
+
+def bench_http(driver, image_size, concurrency, requests):
+    # 조합마다 새 이미지를 만들어 사진 분석 캐시에 걸리지 않게 합니다.
+    images = [make_image_bytes(image_size, seed=next(_image_seeds)) if image_size else None for _ in range(requests)]
+    submit, end_to_end, errors = [], [], 0
+
+    def task(i):
+        return one_analysis(driver, i, images[i])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(task, i) for i in range(requests)]:
+            try:
+                s, e = future.result()
+                submit.append(s)
+                end_to_end.append(e)
+            except Exception as e:
+                errors += 1
+                print(f"요청 실패: {e}", file=sys.stderr)
+    wall = time.perf_counter() - started
+    return {
+        "image_size": image_size, "concurrency": concurrency, "requests": requests, "errors": errors,
+        "submit": summarize(submit, wall), "end_to_end": summarize(end_to_end, wall),
+    }
+
+
+# --- WSGI 서버 ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/healthz', timeout=1):
+                return
+        except Exception:
+            time.sleep(0.1)
+    raise RuntimeError(f"{base_url} 서버가 {timeout}초 안에 준비되지 않았습니다.")
+
+
+class GunicornServer:
+    """app(기본값 benchmarks.bench_app:app)을 gunicorn 하위 프로세스로 띄웁니다.
+    작업 상태가 워커 메모리에 있으므로(스레드 백엔드) 기본값은 워커 1개이고 스레드 수로 동시성을 조절합니다."""
+
+    def __init__(self, env, threads, workers=1, app='benchmarks.bench_app:app', timeout=30.0):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.proc = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+             '-b', f'127.0.0.1:{self.port}', '--log-level', 'warning', app],
+            env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        _wait_ready(self.base_url, timeout)
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait(timeout=10)
+
+
+class WaitressServer:
+    """waitress를 같은 프로세스의 스레드로 띄웁니다."""
+
+    def __init__(self, flask_app, threads):
+        from waitress import create_server
+        self.server = create_server(flask_app, host='127.0.0.1', port=0, threads=threads)
+        self.base_url = f"http://127.0.0.1:{self.server.effective_port}"
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        _wait_ready(self.base_url)
+
+    def stop(self):
+        self.server.close()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(',') if x.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pet.AI 분석 파이프라인 벤치마크")
+    parser.add_argument('--rows', type=_int_list, default=[10, 1000], help="합성 diseases 행 수 목록")
+    parser.add_argument('--image-sizes', type=_int_list, default=[256, 1024], help="생성 이미지 긴 변 목록 (0 = 증상만)")
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 8], help="동시 요청 수 목록")
+    parser.add_argument('--requests', type=int, default=16, help="조합마다 보낼 요청 수")
+    parser.add_argument('--stage-iterations', type=int, default=5, help="단계별 직접 호출 반복 횟수")
+    parser.add_argument('--latency', type=float, default=0.3, help="가짜 Gemini 평균 지연(초)")
+    parser.add_argument('--jitter', type=float, default=0.05, help="가짜 Gemini 지연 표준편차(초)")
+    parser.add_argument('--server', choices=['none', 'gunicorn', 'waitress'], default='none',
+                        help="테스트 클라이언트 외에 추가로 측정할 WSGI 서버")
+    parser.add_argument('--output', default='bench_results.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='petai-bench-')
+    # app을 임포트하기 전에 DB/업로드/작업 설정을 벤치마크 전용으로 바꿉니다.
+    os.environ['SQLITE_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('JOB_WORKERS', str(max(args.concurrency)))
+    os.environ.setdefault('PIPELINE_WORKERS', str(max(args.concurrency) * 3))
+    # 가짜 Gemini에는 할당량이 없으므로 분당 호출 제한은 끄고, 동시 호출 수는 요청 동시성보다 크게 둡니다.
+    os.environ.setdefault('GEMINI_RPM', '0')
+    os.environ.setdefault('GEMINI_MAX_INFLIGHT', str(max(args.concurrency) * 2))
+    os.environ['BENCH_LATENCY'] = str(args.latency)
+    os.environ['BENCH_JITTER'] = str(args.jitter)
+    os.environ['BENCH_UPLOAD_DIR'] = os.path.join(workdir, 'uploads')
+
+    import app as app_module
+    from benchmarks import fake_gemini
+    from petai_pipeline import add_stage_observer
+    fake_gemini.install(app_module, latency=args.latency, jitter=args.jitter, seed=0)
+    use_upload_dir(os.environ['BENCH_UPLOAD_DIR'])
+    recorder = StageRecorder()
+    add_stage_observer(recorder)
+
+    report = {
+        "meta": {
+            "commit": git_commit(), "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "python": sys.version.split()[0], "args": vars(args),
+        },
+        "runs": [],
+    }
+    for rows in args.rows:
+        print(f"INFO: diseases {rows}행 준비 중...")
+        prepare_database(app_module, rows)
+        run = {"rows": rows, "stages": bench_stages(app_module, recorder, args.image_sizes, args.stage_iterations),
+               "http": []}
+
+        targets = [("test_client", TestClientDriver(app_module.app), None)]
+        if args.server == 'gunicorn':
+            server = GunicornServer(dict(os.environ), threads=max(args.concurrency))
+            targets.append(("gunicorn", HTTPDriver(server.base_url), server))
+        elif args.server == 'waitress':
+            server = WaitressServer(app_module.app, threads=max(args.concurrency))
+            targets.append(("waitress", HTTPDriver(server.base_url), server))
+
+        for target, driver, server in targets:
+            for size in args.image_sizes:
+                for concurrency in args.concurrency:
+                    recorder.reset()
+                    print(f"INFO: {target} rows={rows} image={size} concurrency={concurrency}")
+                    result = bench_http(driver, size, concurrency, args.requests)
+                    result["target"] = target
+                    result["stages"] = recorder.report()
+                    run["http"].append(result)
+            if server is not None:
+                server.stop()
+        report["runs"].append(run)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"INFO: 결과를 {args.output}에 저장했습니다.")
+    return report
+
+
+if __name__ == '__main__':
+    main()
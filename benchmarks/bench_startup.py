@@ -0,0 +1,115 @@
+# benchmarks/bench_startup.py
+"""
+시작 시간 벤치마크.
+새 파이썬 프로세스에서 `import app`에 걸리는 시간과, gunicorn을 띄운 뒤 첫 요청(/healthz)에 응답하기까지의
+시간(워커 준비 시간)을 --preload 사용/미사용으로 나눠 측정하고 JSON으로 저장합니다.
+
+    python -m benchmarks.bench_startup --repeat 5 --workers 1,4 --output startup_results.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.bench_pipeline import summarize, git_commit, _free_port, _int_list
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import sys, time, json
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+heavy = [m for m in ('google.generativeai', 'PIL', 'markdown', 'psycopg2') if m in sys.modules]
+print(json.dumps({"seconds": elapsed, "heavy_modules": heavy}))
+"""
+
+
+def measure_import(env, repeat):
+    samples, heavy = [], []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', IMPORT_SNIPPET], env=env, cwd=ROOT, text=True)
+        result = json.loads(out.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        heavy = result['heavy_modules']
+    return {**summarize(samples), "heavy_modules_loaded": heavy}
+
+
+def top_imports(env, limit=10):
+    """python -X importtime 결과에서 누적 시간이 큰 모듈 limit개."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], env=env, cwd=ROOT,
+                          capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 3)} for us, name in sorted(rows, reverse=True)[:limit]]
+
+
+def measure_worker_ready(env, workers, preload, timeout=60.0):
+    """gunicorn 실행부터 /healthz가 처음 200을 반환할 때까지의 시간(초)."""
+    port = _free_port()
+    env = dict(env, GUNICORN_PRELOAD='1' if preload else '0')
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                             '--log-level', 'warning', 'app:app'],
+                            env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/healthz', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except Exception:
+                time.sleep(0.02)
+        raise RuntimeError(f"gunicorn이 {timeout}초 안에 준비되지 않았습니다.")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pet.AI 시작 시간 벤치마크")
+    parser.add_argument('--repeat', type=int, default=5, help="측정 반복 횟수")
+    parser.add_argument('--workers', type=_int_list, default=[1, 4], help="gunicorn 워커 수 목록")
+    parser.add_argument('--skip-gunicorn', action='store_true', help="import 시간만 측정")
+    parser.add_argument('--output', default='startup_results.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='petai-startup-')
+    env = dict(os.environ, SQLITE_PATH=os.path.join(workdir, 'startup.db'), LOG_JSON='0')
+
+    report = {
+        "meta": {"commit": git_commit(), "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                 "python": sys.version.split()[0], "args": vars(args)},
+        "import_app": measure_import(env, args.repeat),
+        "top_imports": top_imports(env),
+        "worker_ready": [],
+    }
+    print(f"INFO: import app p50 {report['import_app']['p50_ms']}ms")
+    if not args.skip_gunicorn:
+        for workers in args.workers:
+            for preload in (False, True):
+                samples = [measure_worker_ready(env, workers, preload) for _ in range(args.repeat)]
+                result = {"workers": workers, "preload": preload, **summarize(samples)}
+                report["worker_ready"].append(result)
+                print(f"INFO: gunicorn -w {workers} preload={preload} 준비 p50 {result['p50_ms']}ms")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"INFO: 결과를 {args.output}에 저장했습니다.")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/fake_gemini.py
+"""
+벤치마크용 가짜 Gemini 클라이언트.
+google.generativeai 모듈에서 app.py와 petai_aio.py가 쓰는 부분(GenerativeModel의 generate_content/generate_content_async,
+upload_file, get_file, delete_file, configure)만 흉내 내며, 응답마다 설정한 지연 시간(평균 latency, 표준편차 jitter)만큼 기다립니다.
+
+    fake_gemini.install(app, latency=0.3, jitter=0.05)
+"""
+import asyncio
+import random
+import threading
+import time
+
+VISION_LABEL = "왼쪽 눈의 탁한 분비물, 붉은 눈, 눈곱"
+DIAGNOSIS_TEXT = """### 핵심 요약
+결막염이 의심됩니다.
+### 상세 설명
+눈이 붉어지고 눈곱이 끼는 증상은 결막염의 대표적인 증상입니다.
+### 권장 조치
+병원에서 안약을 처방받아 치료하는 것이 좋습니다.
+"""
+
+
+class _State:
+    def __init__(self, name):
+        self.name = name
+
+
+class _File:
+    def __init__(self, name):
+        self.name = name
+        self.state = _State("ACTIVE")
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text] if text else []
+
+
+class _Response(_Chunk):
+    def __iter__(self):
+        return iter([self])
+
+
+class FakeGenai:
+    def __init__(self, latency=0.3, jitter=0.05, seed=None, stream_chunks=4):
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = stream_chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _delay(self):
+        with self._lock:
+            self.calls += 1
+            return max(0.0, self._random.gauss(self.latency, self.jitter))
+
+    def _sleep(self):
+        time.sleep(self._delay())
+
+    async def _async_sleep(self):
+        await asyncio.sleep(self._delay())
+
+    # --- google.generativeai 호환 인터페이스 ---
+    def configure(self, **kwargs):
+        pass
+
+    def GenerativeModel(self, model_name):
+        return _FakeModel(self)
+
+    def upload_file(self, path=None, mime_type=None, **kwargs):
+        self._sleep()
+        return _File("files/fake")
+
+    def get_file(self, name):
+        return _File(name)
+
+    def delete_file(self, name):
+        pass
+
+
+class _FakeModel:
+    def __init__(self, client):
+        self.client = client
+
+    def _chunks(self, text):
+        size = max(1, len(text) // self.client.stream_chunks)
+        return [_Chunk(text[i:i + size]) for i in range(0, len(text), size)]
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        self.client._sleep()
+        text = VISION_LABEL if isinstance(contents, list) else DIAGNOSIS_TEXT
+        return self._chunks(text) if stream else _Response(text)
+
+    async def generate_content_async(self, contents, stream=False, request_options=None):
+        await self.client._async_sleep()
+        text = VISION_LABEL if isinstance(contents, list) else DIAGNOSIS_TEXT
+        return _AsyncChunks(self._chunks(text)) if stream else _Response(text)
+
+
+class _AsyncChunks:
+    """스트리밍 응답 (async for로 읽음)."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+
+def install(app_module, latency=0.3, jitter=0.05, seed=None):
+    """app 모듈의 genai를 가짜 클라이언트로 바꾸고 그 클라이언트를 반환합니다."""
+    fake = FakeGenai(latency=latency, jitter=jitter, seed=seed)
+    app_module.genai = fake
+    return fake
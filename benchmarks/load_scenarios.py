@@ -0,0 +1,486 @@
+# benchmarks/load_scenarios.py
+"""
+부하 테스트 시나리오 실행기.
+Gemini 대체 서버(mock_gemini_server)를 띄우고, 그 서버를 가리키는 gunicorn app:app(SQLite 임시 파일 또는
+--database-url의 PostgreSQL)에 가상 사용자 수를 단계별로 늘려 가며 실제 HTTP 요청을 보냅니다.
+요청은 사진+증상, 증상만, 이상행동 위주의 세 시나리오를 --mix 비율로 섞습니다.
+
+단계마다 처리량, 지연 시간(p50/p95/p99), 결과별 비율(정상, 로컬 대체 진단, 503 거절, 오류),
+gunicorn 워커 메모리(RSS), Gemini 대체 서버가 받은 호출 수를 기록하고, 처리량이 더 늘지 않거나
+p95/오류율이 한도를 넘는 첫 단계를 포화 지점으로 보고합니다. --baseline으로 이전 결과와 비교해
+최대 처리량이 줄었거나 워커 메모리가 늘었으면 종료 코드 1로 끝납니다.
+
+    python -m benchmarks.load_scenarios --users 4,8,16,32 --step-duration 20 --workers 2 --threads 8 \\
+        --latency 0.8 --jitter 0.2 --error-rate 0.01 --output load_results.json
+    python -m benchmarks.load_scenarios --baseline load_results.json --output load_new.json
+
+-   --mode stream(기본값)은 /analyze(stream=1) 후 /analyze/stream으로 결과를 끝까지 받습니다. 워커가 여러 개여도
+    됩니다. --mode job은 /jobs/<id>를 폴링하므로 워커 1개 또는 JOB_BACKEND=rq에서만 쓰세요.
+-   --rows를 주면 diseases 테이블을 합성 데이터로 바꿉니다. (--database-url과 함께 쓰면 그 DB의 diseases가 지워집니다)
+-   Linux에서만 /proc으로 워커 메모리를 읽습니다. 다른 OS에서는 memory가 null입니다.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.parse import urlencode
+
+from benchmarks.bench_pipeline import (GunicornServer, HTTPDriver, _free_port, _int_list, _multipart, git_commit,
+                                       make_image_bytes, prepare_database, summarize)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SYMPTOMS = ["눈곱이 끼고 눈이 붉어요", "재채기와 콧물이 계속돼요", "피부에 붉은 반점과 탈모가 있어요",
+            "다리를 절어요", "구토를 자주 해요", "설사를 하고 기운이 없어요", "눈이 뿌옇게 보여요", "기침을 해요"]
+OUTCOMES = ('ok', 'fallback', 'rejected', 'error')
+
+
+# --- 시나리오 ---
+class Scenario:
+    """요청 하나의 폼과 사진을 만드는 시나리오."""
+
+    def __init__(self, name, with_image=False, behaviors=(0, 0)):
+        self.name = name
+        self.with_image = with_image
+        self.behaviors = behaviors
+
+    def build(self, i, rnd, images, behavior_names):
+        form = {
+            "pet_type": rnd.choice(["고양이", "강아지"]),
+            "age": str(rnd.randint(1, 15)), "weight": f"{rnd.uniform(2, 30):.1f}",
+            # 같은 입력으로 저장된 결과나 프롬프트 캐시에 걸리지 않도록 매번 다른 문장과 no_cache=1을 보냅니다.
+            "symptoms": f"{rnd.choice(SYMPTOMS)} ({i})",
+            "no_cache": "1",
+        }
+        low, high = self.behaviors
+        if high:
+            form["behaviors"] = rnd.sample(behavior_names, min(len(behavior_names), rnd.randint(low, high)))
+        return form, rnd.choice(images) if self.with_image and images else None
+
+
+SCENARIOS = {
+    'image_symptom': Scenario('image_symptom', with_image=True, behaviors=(0, 1)),
+    'symptom': Scenario('symptom'),
+    'behavior': Scenario('behavior', behaviors=(3, 6)),
+}
+
+
+def parse_mix(text):
+    """'image_symptom=0.4,symptom=0.4,behavior=0.2' -> [(Scenario, 가중치)]"""
+    mix = []
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"알 수 없는 시나리오입니다: {name} (가능한 값: {', '.join(SCENARIOS)})")
+        mix.append((SCENARIOS[name.strip()], float(weight or 1)))
+    return mix
+
+
+def pick(mix, rnd):
+    return rnd.choices([s for s, _ in mix], weights=[w for _, w in mix])[0]
+
+
+# --- 요청 ---
+_STREAM_TOKEN = re.compile(r'const streamToken = "([^"]+)"')
+_JOB_ID = re.compile(r'const jobId = "(\w+)"')
+
+
+def run_stream(driver, form, image):
+    """/analyze(stream=1) -> /analyze/stream. 결과(OUTCOMES 중 하나)를 반환합니다."""
+    body, content_type = _multipart({**form, "stream": "1"}, image)
+    status, html = driver.post('/analyze', body, content_type)
+    if status == 503:
+        return 'rejected'
+    match = _STREAM_TOKEN.search(html)
+    if status != 200 or not match:
+        return 'error'
+    status, events = driver.post('/analyze/stream', urlencode({"token": match.group(1)}).encode(),
+                                 'application/x-www-form-urlencoded')
+    if status == 503:
+        return 'rejected'
+    if status != 200 or 'event: done' not in events:
+        return 'error'
+    return 'fallback' if '"fallback": true' in events else 'ok'
+
+
+def run_job(driver, form, image, poll_interval=0.05):
+    """/analyze -> /jobs/<id> 폴링."""
+    body, content_type = _multipart(form, image)
+    status, html = driver.post('/analyze', body, content_type)
+    if status == 503:
+        return 'rejected'
+    match = _JOB_ID.search(html)
+    if status != 202 or not match:
+        return 'error'
+    while True:
+        status, text = driver.get(f'/jobs/{match.group(1)}')
+        job = json.loads(text) if status in (200, 404) else {}
+        if job.get('status') in ('finished', 'failed', 'not_found') or not job:
+            break
+        time.sleep(poll_interval)
+    result = job.get('result') or {}
+    if job.get('status') != 'finished' or 'error' in result:
+        return 'error'
+    return 'fallback' if result.get('fallback') else 'ok'
+
+
+# --- 메모리 ---
+def rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def child_pids(pid):
+    children = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+class MemorySampler:
+    """gunicorn 마스터의 자식(워커) 프로세스 RSS를 interval초마다 읽습니다."""
+
+    def __init__(self, master_pid, interval=0.5):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        workers = [r for r in (rss_bytes(pid) for pid in child_pids(self.master_pid)) if r is not None]
+        return workers or None
+
+    def start(self):
+        self.samples = []
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                workers = self.sample()
+                if workers:
+                    self.samples.append(workers)
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=loop, daemon=True, name='memory-sampler')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if not self.samples:
+            return None
+        totals = [sum(s) for s in self.samples]
+        mb = 1024 * 1024
+        return {
+            "workers": max(len(s) for s in self.samples),
+            "total_rss_mb_max": round(max(totals) / mb, 1),
+            "total_rss_mb_mean": round(sum(totals) / len(totals) / mb, 1),
+            "worker_rss_mb_max": round(max(max(s) for s in self.samples) / mb, 1),
+        }
+
+
+# --- Gemini 대체 서버 ---
+class MockServerProcess:
+    """mock_gemini_server를 하위 프로세스로 띄웁니다. (부하 생성기와 GIL을 나눠 쓰지 않도록)"""
+
+    def __init__(self, args):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        command = [sys.executable, '-m', 'benchmarks.mock_gemini_server', '--port', str(self.port),
+                   '--latency', str(args.latency), '--jitter', str(args.jitter),
+                   '--error-rate', str(args.error_rate), '--error-status', str(args.error_status)]
+        if args.script:
+            command += ['--script', args.script]
+        if args.seed is not None:
+            command += ['--seed', str(args.seed)]
+        self.proc = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                self.stats()
+                return
+            except Exception:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("Gemini 대체 서버가 10초 안에 준비되지 않았습니다.")
+                time.sleep(0.05)
+
+    def stats(self):
+        with urllib.request.urlopen(f'{self.base_url}/stats', timeout=5) as response:
+            return json.loads(response.read())
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait(timeout=10)
+
+
+def _stats_delta(before, after):
+    if before is None or after is None:
+        return None
+    return {key: {kind: after[key][kind] - before[key].get(kind, 0) for kind in after[key]}
+            for key in ('requests', 'errors')}
+
+
+# --- 단계 실행 ---
+def run_step(driver, mix, users, duration, images, behavior_names, mode='stream', think=0.0, seed=0):
+    """users명의 가상 사용자가 duration초 동안 요청을 반복합니다. (응답을 받아야 다음 요청을 보내는 closed-loop)"""
+    run_one = run_stream if mode == 'stream' else run_job
+    records, lock = [], threading.Lock()
+    counter = iter(range(10 ** 9))
+    stop_at = time.monotonic() + duration
+
+    def user(u):
+        rnd = random.Random(seed * 100_003 + u)
+        while time.monotonic() < stop_at:
+            scenario = pick(mix, rnd)
+            with lock:
+                i = next(counter)
+            form, image = scenario.build(f"{seed}-{users}-{i}", rnd, images, behavior_names)
+            started = time.perf_counter()
+            try:
+                outcome = run_one(driver, form, image)
+            except Exception as e:
+                print(f"요청 실패: {e}", file=sys.stderr)
+                outcome = 'error'
+            with lock:
+                records.append((scenario.name, outcome, time.perf_counter() - started))
+            if think:
+                time.sleep(rnd.expovariate(1 / think))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(u,), daemon=True) for u in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return records, time.perf_counter() - started
+
+
+def summarize_step(users, records, wall):
+    total = len(records)
+    counts = {o: sum(1 for _, outcome, _ in records if outcome == o) for o in OUTCOMES}
+    answered = [s for _, outcome, s in records if outcome in ('ok', 'fallback')]
+    step = {
+        "users": users, "requests": total, "wall_seconds": round(wall, 3),
+        "rps": round(len(answered) / wall, 3) if wall else None,
+        "latency": summarize(answered),
+        "outcomes": counts,
+        "error_rate": round((counts['error'] + counts['rejected']) / total, 4) if total else 0.0,
+        "fallback_rate": round(counts['fallback'] / total, 4) if total else 0.0,
+        "scenarios": {},
+    }
+    for name in sorted({n for n, _, _ in records}):
+        samples = [s for n, outcome, s in records if n == name and outcome in ('ok', 'fallback')]
+        step["scenarios"][name] = {**summarize(samples, wall),
+                                   "errors": sum(1 for n, o, _ in records if n == name and o in ('error', 'rejected'))}
+    return step
+
+
+def find_saturation(steps, slo_p95_ms=None, max_error_rate=0.05, min_gain=0.1):
+    """
+    포화 지점: 오류율이 max_error_rate를 넘거나, p95가 slo_p95_ms를 넘거나,
+    처리량이 이전 단계보다 min_gain(비율) 이상 늘지 않은 첫 단계. 없으면 None.
+    """
+    previous = None
+    for step in steps:
+        reasons = []
+        if step['error_rate'] > max_error_rate:
+            reasons.append('error_rate')
+        p95 = step['latency']['p95_ms']
+        if slo_p95_ms and p95 is not None and p95 > slo_p95_ms:
+            reasons.append('p95')
+        if previous is not None and (step['rps'] or 0) < (previous['rps'] or 0) * (1 + min_gain):
+            reasons.append('throughput_plateau')
+        if reasons:
+            return {"users": step['users'], "reasons": reasons,
+                    "last_good_users": previous['users'] if previous else None}
+        previous = step
+    return None
+
+
+def capacity(steps, saturation):
+    """포화 전 단계 중 가장 높은 처리량과 그때의 워커 메모리."""
+    good = [s for s in steps if saturation is None or s['users'] < saturation['users']] or steps[:1]
+    best = max(good, key=lambda s: s['rps'] or 0) if good else None
+    if best is None:
+        return None
+    return {"users": best['users'], "rps": best['rps'], "p95_ms": best['latency']['p95_ms'],
+            "worker_rss_mb_max": (best.get('memory') or {}).get('worker_rss_mb_max')}
+
+
+def compare(report, baseline, threshold=0.1):
+    """baseline보다 최대 처리량이 threshold 이상 줄었거나 워커 메모리가 threshold 이상 늘었으면 그 목록을 반환합니다."""
+    regressions = []
+    now, before = report.get('capacity') or {}, baseline.get('capacity') or {}
+    if before.get('rps') and (now.get('rps') or 0) < before['rps'] * (1 - threshold):
+        regressions.append(f"최대 처리량 {before['rps']} -> {now.get('rps')} rps")
+    if before.get('worker_rss_mb_max') and now.get('worker_rss_mb_max') and \
+            now['worker_rss_mb_max'] > before['worker_rss_mb_max'] * (1 + threshold):
+        regressions.append(f"워커 최대 메모리 {before['worker_rss_mb_max']} -> {now['worker_rss_mb_max']} MB")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pet.AI 부하 테스트 시나리오")
+    parser.add_argument('--users', type=_int_list, default=[2, 4, 8, 16], help="단계별 가상 사용자 수")
+    parser.add_argument('--step-duration', type=float, default=15.0, help="단계마다 요청을 보내는 시간(초)")
+    parser.add_argument('--think', type=float, default=0.0, help="사용자별 요청 간 평균 대기(초)")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('image_symptom=0.4,symptom=0.4,behavior=0.2'),
+                        help="시나리오 비율 (image_symptom, symptom, behavior)")
+    parser.add_argument('--mode', choices=['stream', 'job'], default='stream')
+    parser.add_argument('--url', help="이미 떠 있는 서버 주소 (주면 gunicorn/대체 서버를 띄우지 않고 메모리도 재지 않음)")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn 워커 수")
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn 워커별 스레드 수")
+    parser.add_argument('--database-url', help="PostgreSQL DATABASE_URL (없으면 임시 SQLite 파일)")
+    parser.add_argument('--rows', type=int, default=0, help="합성 diseases 행 수 (0이면 기본 데이터 그대로)")
+    parser.add_argument('--image-sizes', type=_int_list, default=[1024, 3000], help="생성 이미지 긴 변 목록")
+    parser.add_argument('--image-pool', type=int, default=32, help="미리 만들어 둘 이미지 수")
+    parser.add_argument('--gemini-endpoint', help="이미 떠 있는 Gemini 대체 서버 주소")
+    parser.add_argument('--latency', type=float, default=0.8, help="Gemini 대체 서버 평균 지연(초)")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Gemini 대체 서버 지연 표준편차(초)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Gemini 대체 서버 오류 비율")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--script', help="Gemini 대체 서버의 시간별 지연/오류 설정 JSON")
+    parser.add_argument('--slo-p95-ms', type=float, default=None, help="이 p95(ms)를 넘으면 포화로 봅니다")
+    parser.add_argument('--max-error-rate', type=float, default=0.05, help="이 오류율을 넘으면 포화로 봅니다")
+    parser.add_argument('--baseline', help="비교할 이전 결과 JSON")
+    parser.add_argument('--regression-threshold', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='load_results.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.mode == 'job' and args.workers > 1 and os.environ.get('JOB_BACKEND', 'thread') != 'rq' and not args.url:
+        raise SystemExit("--mode job은 --workers 1 또는 JOB_BACKEND=rq에서만 쓸 수 있습니다.")
+    from petai_utils import BEHAVIOR_DB
+    behavior_names = list(BEHAVIOR_DB)
+
+    print(f"INFO: 이미지 {args.image_pool}개 생성 중...")
+    images = [make_image_bytes(args.image_sizes[i % len(args.image_sizes)], seed=args.seed * 1000 + i)
+              for i in range(args.image_pool)] if args.image_sizes else []
+
+    mock, server, sampler = None, None, None
+    try:
+        if args.url:
+            base_url, gemini_url = args.url.rstrip('/'), args.gemini_endpoint
+        else:
+            if args.gemini_endpoint:
+                gemini_url = args.gemini_endpoint
+            else:
+                mock = MockServerProcess(args)
+                gemini_url = mock.base_url
+            workdir = tempfile.mkdtemp(prefix='petai-load-')
+            env = dict(os.environ, GEMINI_API_ENDPOINT=gemini_url, LOG_JSON='0',
+                       SECRET_KEY=os.environ.get('SECRET_KEY') or os.urandom(16).hex())
+            if args.database_url:
+                env['DATABASE_URL'] = args.database_url
+            else:
+                env.pop('DATABASE_URL', None)
+                env['SQLITE_PATH'] = os.path.join(workdir, 'load.db')
+            # 대체 서버에는 할당량이 없으므로 분당 호출 제한은 끕니다. 사진 분석 캐시는 이미지 묶음을 반복해도 걸리지 않게 1개만 둡니다.
+            env.setdefault('GEMINI_RPM', '0')
+            env.setdefault('VISION_CACHE_MAX', '1')
+            if args.rows:
+                os.environ.update({k: env[k] for k in ('SQLITE_PATH', 'DATABASE_URL') if k in env})
+                import app as app_module
+                print(f"INFO: diseases {args.rows}행 준비 중...")
+                prepare_database(app_module, args.rows)
+            server = GunicornServer(env, threads=args.threads, workers=args.workers, app='app:app', timeout=60)
+            base_url = server.base_url
+            sampler = MemorySampler(server.proc.pid)
+        driver = HTTPDriver(base_url)
+        stats_url = gemini_url
+
+        report = {
+            "meta": {"commit": git_commit(), "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                     "python": sys.version.split()[0],
+                     "args": {k: v for k, v in vars(args).items() if k != 'mix'},
+                     "mix": {s.name: w for s, w in args.mix}},
+            "steps": [],
+        }
+        idle = sampler.sample() if sampler else None
+        report["idle_worker_rss_mb"] = [round(r / 1024 / 1024, 1) for r in idle] if idle else None
+
+        for users in args.users:
+            before = _fetch_stats(stats_url)
+            if sampler:
+                sampler.start()
+            records, wall = run_step(driver, args.mix, users, args.step_duration, images, behavior_names,
+                                     mode=args.mode, think=args.think, seed=args.seed)
+            step = summarize_step(users, records, wall)
+            step["memory"] = sampler.stop() if sampler else None
+            step["gemini"] = _stats_delta(before, _fetch_stats(stats_url))
+            report["steps"].append(step)
+            memory = step['memory'] or {}
+            print(f"INFO: users={users} rps={step['rps']} p95={step['latency']['p95_ms']}ms "
+                  f"error_rate={step['error_rate']} fallback_rate={step['fallback_rate']} "
+                  f"worker_rss_max={memory.get('worker_rss_mb_max')}MB")
+
+        report["saturation"] = find_saturation(report["steps"], args.slo_p95_ms, args.max_error_rate)
+        report["capacity"] = capacity(report["steps"], report["saturation"])
+        regressions = []
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                regressions = compare(report, json.load(f), args.regression_threshold)
+            report["regressions"] = regressions
+    finally:
+        if server is not None:
+            server.stop()
+        if mock is not None:
+            mock.stop()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    saturation = report["saturation"]
+    print(f"INFO: 포화 지점: {saturation['users']}명 ({', '.join(saturation['reasons'])})" if saturation
+          else "INFO: 측정한 범위에서는 포화되지 않았습니다.")
+    print(f"INFO: 최대 처리량: {report['capacity']}")
+    print(f"INFO: 결과를 {args.output}에 저장했습니다.")
+    if regressions:
+        print(f"경고: 이전 결과보다 용량이 줄었습니다: {'; '.join(regressions)}")
+        sys.exit(1)
+    return report
+
+
+def _fetch_stats(gemini_url):
+    if not gemini_url:
+        return None
+    try:
+        with urllib.request.urlopen(f'{gemini_url.rstrip("/")}/stats', timeout=5) as response:
+            return json.loads(response.read())
+    except Exception:
+        return None
+
+
+if __name__ == '__main__':
+    main()
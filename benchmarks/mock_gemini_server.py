@@ -0,0 +1,341 @@
+# benchmarks/mock_gemini_server.py
+"""
+부하 테스트용 Gemini 대체 HTTP 서버.
+google.generativeai 클라이언트(transport='rest')가 호출하는 엔드포인트를 흉내 내므로, 앱 코드를 바꾸지 않고
+`GEMINI_API_ENDPOINT=http://127.0.0.1:8808`만 설정하면 실제 Gemini 대신 이 서버로 요청이 갑니다.
+
+    python -m benchmarks.mock_gemini_server --port 8808 --latency 0.8 --jitter 0.2 --error-rate 0.02
+    python -m benchmarks.mock_gemini_server --script outage.json
+
+    POST /v1beta/models/<모델>:generateContent         사진이 있으면 VISION_LABEL, 없으면 DIAGNOSIS_TEXT
+    POST /v1beta/models/<모델>:streamGenerateContent   같은 응답을 JSON 배열 조각으로 나눠 보냄 (?alt=sse이면 SSE)
+    GET  /$discovery/rest                              Files API 업로드용 discovery 문서
+    POST /upload/v1beta/files, PUT ?upload_id=...      upload_file (단순/재개 가능 업로드)
+    GET/DELETE /v1beta/files/<id>                      get_file / delete_file
+    GET  /stats                                        종류별 요청 수, 주입한 오류 수, 진행 중 요청 수
+
+지연 시간과 오류율은 요청 종류(vision, diagnosis, upload)마다 정할 수 있으며, --script JSON으로 시간에 따라 바꿀 수 있습니다.
+
+    {"phases": [
+        {"at": 0,  "vision": {"latency": 1.0}, "diagnosis": {"latency": 3.0, "jitter": 0.5}},
+        {"at": 30, "diagnosis": {"error_rate": 0.5, "error_status": 503}},
+        {"at": 60, "diagnosis": {"error_rate": 0}}
+    ]}
+
+각 단계는 이전 단계의 설정에 덮어쓰며, at은 서버 시작 후 경과 시간(초)입니다.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fake_gemini import DIAGNOSIS_TEXT, VISION_LABEL
+
+KINDS = ('vision', 'diagnosis', 'upload')
+DEFAULT_BEHAVIOR = {"latency": 0.3, "jitter": 0.05, "error_rate": 0.0, "error_status": 503}
+
+_GENERATE = re.compile(r'^/v1beta/(models/[^:/]+):(generateContent|streamGenerateContent)$')
+_FILE = re.compile(r'^/v1beta/(files/[\w-]+)$')
+
+
+class Script:
+    """경과 시간에 따른 요청 종류별 {latency, jitter, error_rate, error_status}."""
+
+    def __init__(self, phases=None, **defaults):
+        base = {kind: {**DEFAULT_BEHAVIOR, **defaults} for kind in KINDS}
+        self.phases = []
+        for phase in sorted(phases or [{"at": 0}], key=lambda p: p.get('at', 0)):
+            base = {kind: {**base[kind], **phase.get(kind, {})} for kind in KINDS}
+            self.phases.append((phase.get('at', 0), base))
+
+    @classmethod
+    def load(cls, path, **defaults):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f).get('phases'), **defaults)
+
+    def behavior(self, kind, elapsed):
+        current = self.phases[0][1]
+        for at, behavior in self.phases:
+            if elapsed < at:
+                break
+            current = behavior
+        return current[kind]
+
+
+class MockGemini:
+    """요청 처리 상태(업로드된 파일, 통계)와 응답 생성."""
+
+    def __init__(self, script=None, seed=None, stream_chunks=4):
+        self.script = script or Script()
+        self.stream_chunks = stream_chunks
+        self.started = time.monotonic()
+        self.files = {}
+        self.uploads = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {kind: 0 for kind in KINDS}
+        self.errors = {kind: 0 for kind in KINDS}
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def plan(self, kind):
+        """(지연 시간, 주입할 오류 상태 코드 또는 None)."""
+        behavior = self.script.behavior(kind, time.monotonic() - self.started)
+        with self._lock:
+            self.counts[kind] += 1
+            delay = max(0.0, self._random.gauss(behavior['latency'], behavior['jitter']))
+            failed = self._random.random() < behavior['error_rate']
+            if failed:
+                self.errors[kind] += 1
+        return delay, behavior['error_status'] if failed else None
+
+    def enter(self):
+        with self._lock:
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+
+    def leave(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"requests": dict(self.counts), "errors": dict(self.errors), "inflight": self.inflight,
+                    "max_inflight": self.max_inflight, "files": len(self.files),
+                    "uptime": round(time.monotonic() - self.started, 3)}
+
+    def new_file(self, mime_type, size):
+        name = f"files/{uuid.uuid4().hex[:16]}"
+        record = {"name": name, "mimeType": mime_type or 'application/octet-stream', "sizeBytes": str(size),
+                  "state": "ACTIVE", "uri": f"https://mock.invalid/v1beta/{name}",
+                  "createTime": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+        with self._lock:
+            self.files[name] = record
+        return record
+
+    @staticmethod
+    def is_vision(body):
+        """사진(inline_data/file_data)이 들어 있으면 사진 분석 요청입니다."""
+        return any('inlineData' in part or 'inline_data' in part or 'fileData' in part or 'file_data' in part
+                   for content in body.get('contents', []) for part in content.get('parts', []))
+
+    def chunks(self, text):
+        size = max(1, len(text) // self.stream_chunks)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    @staticmethod
+    def response(text, prompt_chars, final=True):
+        body = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}],
+                "usageMetadata": {"promptTokenCount": prompt_chars, "candidatesTokenCount": len(text),
+                                  "totalTokenCount": prompt_chars + len(text)}}
+        if final:
+            body["candidates"][0]["finishReason"] = "STOP"
+        return body
+
+    def discovery(self, root):
+        """googleapiclient가 media.upload를 만들 수 있을 만큼의 discovery 문서."""
+        file_schema = {"id": "File", "type": "object", "properties": {
+            k: {"type": "string"} for k in ("name", "displayName", "mimeType", "sizeBytes", "state", "uri")}}
+        return {
+            "kind": "discovery#restDescription", "discoveryVersion": "v1", "id": "generativelanguage:v1beta",
+            "name": "generativelanguage", "version": "v1beta", "protocol": "rest",
+            "rootUrl": root, "servicePath": "", "baseUrl": root, "batchPath": "batch",
+            "parameters": {"key": {"type": "string", "location": "query"},
+                           "alt": {"type": "string", "location": "query", "default": "json"}},
+            "schemas": {
+                "File": file_schema,
+                "CreateFileRequest": {"id": "CreateFileRequest", "type": "object",
+                                      "properties": {"file": {"$ref": "File"}}},
+                "CreateFileResponse": {"id": "CreateFileResponse", "type": "object",
+                                       "properties": {"file": {"$ref": "File"}}},
+            },
+            "resources": {"media": {"methods": {"upload": {
+                "id": "generativelanguage.media.upload", "path": "v1beta/files", "flatPath": "v1beta/files",
+                "httpMethod": "POST", "parameters": {}, "parameterOrder": [],
+                "request": {"$ref": "CreateFileRequest"}, "response": {"$ref": "CreateFileResponse"},
+                "supportsMediaUpload": True,
+                "mediaUpload": {"accept": ["*/*"], "protocols": {
+                    "simple": {"multipart": True, "path": "/upload/v1beta/files"},
+                    "resumable": {"multipart": True, "path": "/upload/v1beta/files"}}},
+            }}}},
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockGemini/1.0'
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send_json(self, data, status=200, headers=None):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, status):
+        message = {429: "Resource has been exhausted (mock)", 500: "Internal error (mock)",
+                   503: "The model is overloaded (mock)"}.get(status, "Mock error")
+        self._send_json({"error": {"code": status, "message": message, "status": "UNAVAILABLE"}}, status)
+
+    def _scripted(self, kind):
+        """종류별 지연 시간만큼 기다립니다. 오류를 주입했으면 응답을 보내고 False."""
+        delay, error_status = self.mock.plan(kind)
+        time.sleep(delay)
+        if error_status:
+            self._send_error(error_status)
+            return False
+        return True
+
+    def _root(self):
+        return f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}/"
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/$discovery/rest':
+            return self._send_json(self.mock.discovery(self._root()))
+        if path == '/stats':
+            return self._send_json(self.mock.stats())
+        match = _FILE.match(path)
+        if match and match.group(1) in self.mock.files:
+            return self._send_json(self.mock.files[match.group(1)])
+        self._send_json({"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}}, 404)
+
+    def do_DELETE(self):
+        match = _FILE.match(urlparse(self.path).path)
+        if match:
+            self.mock.files.pop(match.group(1), None)
+        self._send_json({})
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        upload_id = parse_qs(url.query).get('upload_id', [None])[0]
+        pending = self.mock.uploads.pop(upload_id, None)
+        size = len(self._body())
+        if pending is None:
+            return self._send_json({"error": {"code": 404, "message": "unknown upload", "status": "NOT_FOUND"}}, 404)
+        if not self._scripted('upload'):
+            return
+        self._send_json({"file": self.mock.new_file(pending, size)})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._body()
+        if url.path == '/upload/v1beta/files' and parse_qs(url.query).get('uploadType') == ['resumable']:
+            # 재개 가능 업로드: 업로드 주소를 알려 주고, 본문은 그 주소로 PUT 됩니다.
+            upload_id = uuid.uuid4().hex
+            self.mock.uploads[upload_id] = self.headers.get('X-Upload-Content-Type')
+            return self._send_json({}, headers={'Location': f"{self._root()}upload/v1beta/files?upload_id={upload_id}"})
+        if url.path == '/upload/v1beta/files':
+            if not self._scripted('upload'):
+                return
+            return self._send_json({"file": self.mock.new_file(self.headers.get('Content-Type'), len(body))})
+
+        match = _GENERATE.match(url.path)
+        if not match:
+            return self._send_json({"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}}, 404)
+        request = json.loads(body or b'{}')
+        kind = 'vision' if self.mock.is_vision(request) else 'diagnosis'
+        self.mock.enter()
+        try:
+            if not self._scripted(kind):
+                return
+            text = VISION_LABEL if kind == 'vision' else DIAGNOSIS_TEXT
+            if match.group(2) == 'generateContent':
+                return self._send_json(self.mock.response(text, len(body)))
+            self._stream(text, len(body), sse=parse_qs(url.query).get('alt') == ['sse'])
+        finally:
+            self.mock.leave()
+
+    def _stream(self, text, prompt_chars, sse):
+        """응답을 조각으로 나눠 chunked 전송합니다. (REST 클라이언트는 JSON 배열, alt=sse이면 SSE)"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream' if sse else 'application/json; charset=UTF-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        pieces = self.mock.chunks(text)
+        for i, piece in enumerate(pieces):
+            item = json.dumps(self.mock.response(piece, prompt_chars, final=i == len(pieces) - 1), ensure_ascii=False)
+            if sse:
+                data = f"data: {item}\r\n\r\n"
+            else:
+                data = ('[' if i == 0 else ',\r\n') + item + (']' if i == len(pieces) - 1 else '')
+            self._write_chunk(data.encode('utf-8'))
+        self._write_chunk(b'')
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address=('127.0.0.1', 0), mock=None):
+        super().__init__(address, Handler)
+        self.mock = mock or MockGemini()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """백그라운드 스레드에서 서버를 띄우고 자신을 반환합니다."""
+        threading.Thread(target=self.serve_forever, daemon=True, name='mock-gemini').start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="부하 테스트용 Gemini 대체 서버")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8808)
+    parser.add_argument('--latency', type=float, default=DEFAULT_BEHAVIOR['latency'], help="평균 지연(초)")
+    parser.add_argument('--jitter', type=float, default=DEFAULT_BEHAVIOR['jitter'], help="지연 표준편차(초)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="오류 응답 비율 (0~1)")
+    parser.add_argument('--error-status', type=int, default=503, help="오류 응답 상태 코드")
+    parser.add_argument('--script', help="시간에 따른 지연/오류 설정 JSON 파일")
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    defaults = {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+                "error_status": args.error_status}
+    script = Script.load(args.script, **defaults) if args.script else Script(**defaults)
+    server = MockGeminiServer((args.host, args.port), MockGemini(script, seed=args.seed))
+    print(f"INFO: Mock Gemini server on {server.base_url} (GEMINI_API_ENDPOINT={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# gunicorn.conf.py
+# gunicorn이 실행 위치의 이 파일을 자동으로 읽습니다. (gunicorn app:app)
+import os
+
+# 마스터에서 앱을 한 번 불러온 뒤 워커로 fork 합니다. GUNICORN_PRELOAD=0이면 워커마다 따로 불러옵니다.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'off')
+
+
+def on_starting(server):
+    """워커를 띄우기 전 마스터 프로세스에서 한 번 스키마 마이그레이션을 적용합니다. 워커는 DDL을 실행하지 않습니다."""
+    import petai_db
+    from petai_migrations import migrate
+    migrate()
+    # 마스터가 연 DB 연결을 워커가 물려받지 않도록 닫습니다.
+    petai_db.reset_pool()
+    if server.cfg.preload_app:
+        from app import warm_up
+        warm_up()
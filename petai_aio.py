@@ -0,0 +1,404 @@
+# petai_aio.py
+"""
+비동기 분석 코어 (asgi.py).
+Gemini 응답을 기다리는 동안 스레드를 잡지 않도록 google.generativeai의 generate_content_async를 쓰고,
+diseases 검색은 asyncpg(PostgreSQL)/aiosqlite(SQLite), 업로드 파일 입출력은 aiofiles로 합니다.
+분석 단계 그래프(build_analysis_pipeline), 결과 조립과 대체 진단 판단(analysis_result), 스트리밍 이벤트 순서
+(stream_analysis_steps)는 app.py의 것을 그대로 쓰고, 여기서는 단계가 부르는 I/O를 코루틴으로 구현합니다.
+
+    result = await run_analysis(form_data, image_key, behaviors)   # run_analysis_task와 같은 dict
+    async for event in stream_analysis_events(form_data, image_key, behaviors):
+        ...                                                         # SSE 문자열 (stream_analysis_events와 같은 형식)
+
+CPU 작업(이미지 축소, 템플릿)과 드문 동기 I/O(캐시, 결과 저장, 색인 버전 확인)는 asyncio.to_thread로 넘깁니다.
+
+환경 변수
+    ASYNC_DB_POOL_MIN / ASYNC_DB_POOL_MAX   asyncpg 풀 크기 (기본값 1 / 20)
+"""
+import asyncio
+import os
+import re
+import sys
+import time
+import uuid
+from io import BytesIO
+
+from flask import render_template
+
+import app as petai_app
+import petai_metrics as metrics
+from petai_analyses import analyses, input_hash
+from petai_cache import vision_cache, image_cache_key, prompt_cache, prompt_cache_key
+from petai_db import get_pool
+from petai_images import ingest_image, guess_mime_type, INLINE_LIMIT_BYTES
+from petai_index import disease_index
+from petai_llm import get_async_limiter
+from petai_search import (symptom_search, _query_terms, fts_match, SQLITE_SEARCH_SQL, POSTGRES_SEARCH_SQL,
+                          POSTGRES_TRGM_SEARCH_SQL, HAS_TRGM_SQL, DEFAULT_LIMIT as SEARCH_LIMIT)
+from petai_storage import LocalUploadStore, content_key, get_upload_store
+
+FAILED_IMAGE_LABEL = "이미지 분석 실패"
+
+_PARAM = re.compile(r'%%|%s')
+
+
+def asyncpg_sql(sql):
+    """psycopg2 형식(%s, %%) 쿼리를 asyncpg 형식($1, $2, ..., %)으로 바꿉니다."""
+    counter = iter(range(1, 1000))
+    return _PARAM.sub(lambda m: '%' if m.group() == '%%' else f'${next(counter)}', sql)
+
+
+class AsyncDatabase:
+    """diseases 검색용 비동기 연결. petai_db와 같은 DB(DATABASE_URL 또는 SQLite 파일)를 씁니다."""
+
+    def __init__(self):
+        self._pg = None
+        self._sqlite = None
+        self._lock = None
+        self._trgm = None
+
+    @property
+    def is_postgres(self):
+        return get_pool().is_postgres
+
+    async def connect(self):
+        if self._pg is not None or self._sqlite is not None:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._pg is not None or self._sqlite is not None:
+                return
+            pool = get_pool()
+            if pool.is_postgres:
+                import asyncpg
+                self._pg = await asyncpg.create_pool(pool.dsn,
+                                                     min_size=int(os.environ.get('ASYNC_DB_POOL_MIN', 1)),
+                                                     max_size=int(os.environ.get('ASYNC_DB_POOL_MAX', 20)))
+            else:
+                import aiosqlite
+                self._sqlite = await aiosqlite.connect(pool.path)
+                self._sqlite.row_factory = aiosqlite.Row
+
+    async def close(self):
+        if self._pg is not None:
+            await self._pg.close()
+        if self._sqlite is not None:
+            await self._sqlite.close()
+        self._pg = self._sqlite = self._lock = None
+
+    async def fetch(self, sql, params=()):
+        """petai_db 형식(PostgreSQL은 %s, SQLite는 ?) 쿼리를 실행하고 dict 목록을 반환합니다."""
+        await self.connect()
+        if self._pg is not None:
+            return [dict(row) for row in await self._pg.fetch(asyncpg_sql(sql), *params)]
+        async with self._sqlite.execute(sql, params) as cur:
+            return [dict(row) for row in await cur.fetchall()]
+
+    async def search(self, text, limit=SEARCH_LIMIT):
+        """SymptomSearch.search의 비동기 버전 (같은 쿼리)."""
+        terms = _query_terms(text)
+        if not terms:
+            return []
+        if not self.is_postgres:
+            if symptom_search.sync_due():
+                await asyncio.to_thread(symptom_search.sync)
+            return await self.fetch(SQLITE_SEARCH_SQL, (fts_match(terms), limit))
+        if self._trgm is None:
+            self._trgm = bool(await self.fetch(HAS_TRGM_SQL))
+        if self._trgm:
+            return await self.fetch(POSTGRES_TRGM_SEARCH_SQL, (text, ' | '.join(terms), text, limit))
+        return await self.fetch(POSTGRES_SEARCH_SQL, (' | '.join(terms), limit))
+
+
+db = AsyncDatabase()
+
+
+# --- DB 검색 ---
+async def search_symptoms(text):
+    """app.search_symptoms의 비동기 버전."""
+    if not text:
+        return None
+    try:
+        with metrics.stage('symptom_search'):
+            ranked = await db.search(text, limit=SEARCH_LIMIT)
+        return [{k: v for k, v in d.items() if k != 'search_score'} for d in ranked] or None
+    except Exception as e:
+        print(f"증상 검색 중 오류 발생: {e}")
+        metrics.record_error('symptom_search', e)
+        return None
+
+
+async def search_db_by_image_label(image_label):
+    """app.search_db_by_image_label의 비동기 버전. 키워드 인덱스는 메모리에 있으므로 버전 확인만 스레드에서 합니다."""
+    try:
+        if disease_index.refresh_due():
+            await asyncio.to_thread(disease_index.refresh)
+        with metrics.stage('db_search'):
+            matched_diseases = disease_index.match(image_label)
+        seen = {d['id'] for d in matched_diseases}
+        for disease in await search_symptoms(image_label) or []:
+            if len(matched_diseases) >= max(len(seen), SEARCH_LIMIT):
+                break
+            if disease['id'] not in seen:
+                matched_diseases.append(disease)
+        return matched_diseases if matched_diseases else None
+    except Exception as e:
+        print(f"DB 검색 중 오류 발생: {e}")
+        metrics.record_error('db_search', e)
+        return None
+
+
+# --- 업로드 ---
+async def read_upload(image_key):
+    """업로드 저장소에서 사진 바이트를 읽습니다. 로컬 저장소는 aiofiles, 그 외는 스레드에서 읽습니다."""
+    store = get_upload_store()
+    if isinstance(store, LocalUploadStore):
+        import aiofiles
+        async with aiofiles.open(store.path(image_key), 'rb') as f:
+            return await f.read()
+    return await asyncio.to_thread(store.read, image_key)
+
+
+async def save_upload(data, extension):
+    """LocalUploadStore.put의 비동기 버전 (같은 키, 같은 원자적 쓰기). 그 외 저장소는 스레드에서 저장합니다."""
+    store = get_upload_store()
+    if not isinstance(store, LocalUploadStore):
+        return await asyncio.to_thread(store.put, data, extension)
+    import aiofiles
+    import aiofiles.os
+    key = content_key(data, extension)
+    path = store.path(key)
+    if await aiofiles.os.path.exists(path):
+        await asyncio.to_thread(os.utime, path)
+        return key
+    await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    async with aiofiles.open(tmp_path, 'wb') as f:
+        await f.write(data)
+    await aiofiles.os.replace(tmp_path, path)
+    return key
+
+
+async def ingest_upload(stream):
+    """업로드 파일 객체를 축소/재인코딩(스레드)한 뒤 저장하고 키를 반환합니다. (본문을 통째로 읽지 않음)"""
+    with metrics.stage('image_ingest'):
+        ingested = await asyncio.to_thread(ingest_image, stream)
+    with metrics.stage('upload_store'):
+        return await save_upload(ingested.data, ingested.extension)
+
+
+# --- Gemini ---
+def _image_cache_key(image_bytes):
+    from PIL import Image
+    with Image.open(BytesIO(image_bytes)) as image:
+        return image_cache_key(image)
+
+
+async def analyze_image(image_bytes, mime_type='image/jpeg'):
+    """app.analyze_image의 비동기 버전."""
+    if len(image_bytes) > INLINE_LIMIT_BYTES:
+        # Files API 업로드와 처리 대기는 드문 경우이므로 sync 구현을 스레드에서 씁니다.
+        return await asyncio.to_thread(petai_app.analyze_image, image_bytes, mime_type)
+    try:
+        with metrics.stage('image_hash'):
+            cache_key = await asyncio.to_thread(_image_cache_key, image_bytes)
+    except Exception as e:
+        print(f"이미지 파일을 읽는 중 오류 발생: {e}")
+        return FAILED_IMAGE_LABEL
+    cached_label = await asyncio.to_thread(vision_cache.get, cache_key)
+    if cached_label is not None:
+        print("INFO: Vision cache hit")
+        return cached_label
+    try:
+        model = petai_app.get_genai().GenerativeModel(petai_app.VISION_MODEL)
+        image_part = {"mime_type": mime_type, "data": image_bytes}
+        with metrics.stage('gemini_vision'):
+            response = await get_async_limiter().call(model.generate_content_async,
+                                                      [petai_app.VISION_PROMPT, image_part],
+                                                      request_options=petai_app.GEMINI_REQUEST_OPTIONS)
+        metrics.record_gemini_usage(petai_app.VISION_MODEL, response)
+        label = response.text.strip()
+        print(f"INFO: Image analysis result: {label}")
+        await asyncio.to_thread(vision_cache.set, cache_key, label)
+        return label
+    except Exception as e:
+        print(f"이미지 분석 중 오류 발생: {e}")
+        metrics.record_error('vision', e)
+        return FAILED_IMAGE_LABEL
+
+
+async def analyze_upload(image_key):
+    """app.analyze_upload의 비동기 버전."""
+    return await analyze_image(await read_upload(image_key), guess_mime_type(image_key))
+
+
+_diagnosis_calls = {}
+
+
+async def _call_diagnosis(prompt, cache_key):
+    model = petai_app.get_genai().GenerativeModel(petai_app.DIAGNOSIS_MODEL)
+    with metrics.stage('gemini_diagnosis'):
+        response = await get_async_limiter().call(model.generate_content_async, prompt,
+                                                  request_options=petai_app.GEMINI_REQUEST_OPTIONS)
+    metrics.record_gemini_usage(petai_app.DIAGNOSIS_MODEL, response)
+    await asyncio.to_thread(prompt_cache.set, cache_key, response.text)
+    return response.text
+
+
+async def generate_diagnosis(prompt, use_cache=True):
+    """
+    app.generate_diagnosis의 비동기 버전. 같은 프롬프트가 동시에 들어오면 호출 하나를 함께 기다립니다.
+    호출은 기다리던 요청이 취소되어도 끝까지 진행되어 프롬프트 캐시에 저장됩니다. (/diagnosis/<key>가 받아 감)
+    """
+    cache_key = prompt_cache_key(petai_app.DIAGNOSIS_MODEL, prompt)
+    if use_cache:
+        cached = await asyncio.to_thread(prompt_cache.get, cache_key)
+        if cached is not None:
+            return cached
+    task = _diagnosis_calls.get(cache_key) if use_cache else None
+    if task is None:
+        task = asyncio.ensure_future(_call_diagnosis(prompt, cache_key))
+        if use_cache:
+            _diagnosis_calls[cache_key] = task
+            task.add_done_callback(lambda _: _diagnosis_calls.pop(cache_key, None))
+    return await asyncio.shield(task)
+
+
+async def stream_diagnosis(prompt, use_cache=True):
+    """app.stream_diagnosis의 비동기 버전."""
+    cache_key = prompt_cache_key(petai_app.DIAGNOSIS_MODEL, prompt)
+    if use_cache:
+        cached = await asyncio.to_thread(prompt_cache.get, cache_key)
+        if cached is not None:
+            yield cached
+            return
+    model = petai_app.get_genai().GenerativeModel(petai_app.DIAGNOSIS_MODEL)
+    limiter = get_async_limiter()
+    parts = []
+    async with limiter.slot():
+        with metrics.stage('gemini_diagnosis_stream'):
+            stream = await limiter.stream_in_slot(model.generate_content_async, prompt, stream=True,
+                                                  request_options=petai_app.GEMINI_REQUEST_OPTIONS)
+            async for chunk in stream:
+                if chunk.parts:
+                    parts.append(chunk.text)
+                    yield chunk.text
+    metrics.record_gemini_usage(petai_app.DIAGNOSIS_MODEL, stream.response)
+    await asyncio.to_thread(prompt_cache.set, cache_key, "".join(parts))
+
+
+# --- 분석 ---
+async def run_analysis(form_data, image_key, selected_behaviors):
+    """run_analysis_task의 비동기 버전. 같은 단계 그래프를 이벤트 루프에서 실행합니다. (ANALYSIS_DEADLINE을 넘기면 로컬 진단)"""
+    params = petai_app.parse_analysis_form(form_data)
+    started = time.perf_counter()
+    try:
+        pipeline = petai_app.build_analysis_pipeline(params, image_key, selected_behaviors, calls=sys.modules[__name__])
+        run = await pipeline.run_async(deadline=petai_app.ANALYSIS_DEADLINE)
+        # 대체 진단은 질병 인덱스를 DB에서 새로 읽을 수 있으므로 이벤트 루프를 막지 않도록 스레드에서 조립합니다.
+        result_data = await asyncio.to_thread(petai_app.analysis_result, params, image_key, selected_behaviors, run)
+        if not result_data.get('fallback'):
+            analysis_id = await asyncio.to_thread(petai_app.store_result, form_data, image_key,
+                                                  selected_behaviors, result_data)
+            if analysis_id:
+                result_data['analysis_id'] = analysis_id
+        return petai_app.finish_analysis_task(started, result_data)
+    except Exception as e:
+        return petai_app.finish_analysis_task(started, error=e)
+
+
+async def find_stored(form_data, image_key, selected_behaviors):
+    """같은 입력으로 저장된 결과 id (no_cache이면 None)."""
+    if not petai_app.parse_analysis_form(form_data)['use_cache']:
+        return None
+    try:
+        return await asyncio.to_thread(analyses.find_id, input_hash(form_data, image_key, selected_behaviors))
+    except Exception as e:
+        print(f"저장된 분석 결과 조회 중 오류 발생: {e}")
+        return None
+
+
+def result_url(analysis_id):
+    """저장된 결과 페이지 경로 (요청 컨텍스트 없이)."""
+    return petai_app.app.url_map.bind('').build('petai.stored_result', {'analysis_id': analysis_id})
+
+
+def dump_stream_token(payload):
+    """/analyze/stream에서 쓸 서명된 스트리밍 토큰 (app.analyze와 같은 형식)."""
+    with petai_app.app.app_context():
+        return petai_app._stream_serializer().dumps(payload)
+
+
+def load_stream_token(token):
+    """스트리밍 토큰을 검증합니다. 잘못되었거나 만료되면 BadSignature."""
+    with petai_app.app.app_context():
+        return petai_app._stream_serializer().loads(token, max_age=petai_app.STREAM_TOKEN_MAX_AGE)
+
+
+def render(template, **context):
+    """Flask 앱의 템플릿을 렌더링합니다. (템플릿의 url_for를 위해 요청 컨텍스트를 만듭니다)"""
+    with petai_app.app.test_request_context():
+        return render_template(template, **context)
+
+
+async def _with_first_deadline(agen, timeout):
+    """petai_app.iter_with_deadline의 비동기 버전: 첫 조각이 timeout초 안에 오지 않으면 None을 한 번 yield 합니다."""
+    iterator = agen.__aiter__()
+    first = asyncio.ensure_future(iterator.__anext__())
+    try:
+        done, _ = await asyncio.wait({first}, timeout=timeout)
+        if not done:
+            yield None
+        try:
+            yield await first
+        except StopAsyncIteration:
+            return
+        async for piece in iterator:
+            yield piece
+    finally:
+        first.cancel()
+
+
+async def _perform_step(step):
+    kind, *args = step
+    if kind == 'run':
+        pipeline, deadline = args
+        return await pipeline.run_async(deadline=deadline)
+    if kind == 'call':
+        func, call_args = args
+        return await asyncio.to_thread(func, *call_args)
+    if kind == 'stream':
+        prompt, use_cache, timeout = args
+        return _with_first_deadline(stream_diagnosis(prompt, use_cache=use_cache), timeout)
+    try:
+        return await args[0].__anext__()
+    except StopAsyncIteration:
+        return petai_app._STREAM_END
+
+
+async def stream_analysis_events(form_data, image_key, selected_behaviors):
+    """app.stream_analysis_events의 비동기 버전 (stream_analysis_steps의 비동기 드라이버)."""
+    steps = petai_app.stream_analysis_steps(form_data, image_key, selected_behaviors, sys.modules[__name__],
+                                            render, result_url)
+    value, error, streams = None, None, []
+    try:
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration:
+                return
+            value, error = None, None
+            if isinstance(step, str):
+                yield step
+                continue
+            try:
+                value = await _perform_step(step)
+            except Exception as e:
+                error = e
+            if step[0] == 'stream' and error is None:
+                streams.append(value)
+    finally:
+        steps.close()
+        for pieces in streams:
+            await pieces.aclose()
@@ -0,0 +1,191 @@
+# petai_analyses.py
+"""
+분석 결과 저장소.
+완료된 분석을 analyses 테이블에 (입력 해시, 결과 JSON, 미리 렌더링한 결과 HTML 조각, 생성 시각)으로 저장해
+/results/<id>에서 Gemini를 다시 호출하지 않고 그대로 보여줍니다.
+같은 입력(반려동물 종류, 증상, 나이, 체중, 사진, 이상행동)은 같은 해시이므로 이미 저장된 결과로 연결됩니다.
+
+    analysis_id = analyses.save(input_hash(form, image_key, behaviors), result, html)
+    analyses.get(analysis_id)  # {'id', 'input_hash', 'result', 'html', 'created_at'} 또는 None
+
+결과가 가리키는 업로드 사진의 키는 image_key 열에도 저장되며, 업로드 스위퍼(petai_storage)는 pinned_uploads()가
+돌려주는 키(보관 기간이 남은 결과의 사진)를 지우지 않습니다. 그래서 /results/<id>의 사진은 결과와 함께 보관됩니다.
+
+오래된 결과는 prune_expired()가 batch_size행씩 나눠 지웁니다. 저장할 때마다 ANALYSIS_PRUNE_INTERVAL초에 한 번
+작업 큐(petai_jobs)에 정리 작업을 넣으며, `python -m petai_analyses --max-age-days 30`으로 직접 실행할 수도 있습니다.
+
+환경 변수
+    ANALYSIS_TTL_DAYS        결과 보관 기간(일, 기본값 30)
+    ANALYSIS_PRUNE_INTERVAL  정리 작업 간격(초, 기본값 3600)
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from petai_db import get_connection, placeholder
+
+TTL_SECONDS = float(os.environ.get('ANALYSIS_TTL_DAYS', 30)) * 86400
+PRUNE_INTERVAL = float(os.environ.get('ANALYSIS_PRUNE_INTERVAL', 3600))
+
+
+def install_analyses(cur, postgres):
+    """analyses 테이블을 만듭니다. (petai_migrations에서 호출)"""
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS analyses (
+            id TEXT PRIMARY KEY,
+            input_hash TEXT NOT NULL UNIQUE,
+            result_json TEXT NOT NULL,
+            html TEXT NOT NULL,
+            created_at DOUBLE PRECISION NOT NULL
+        )
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS analyses_created_at_idx ON analyses (created_at)")
+
+
+def install_image_keys(cur, postgres):
+    """analyses에 image_key 열을 추가하고 기존 결과의 사진 키를 채웁니다. (petai_migrations에서 호출)"""
+    cur.execute("ALTER TABLE analyses ADD COLUMN image_key TEXT")
+    cur.execute("CREATE INDEX IF NOT EXISTS analyses_image_key_idx ON analyses (image_key)")
+    cur.execute("SELECT id, result_json FROM analyses")
+    keys = [(json.loads(result_json).get('image_path'), analysis_id) for analysis_id, result_json in cur.fetchall()]
+    keys = [(key, analysis_id) for key, analysis_id in keys if key]
+    if keys:
+        cur.executemany(f"UPDATE analyses SET image_key = {placeholder()} WHERE id = {placeholder()}", keys)
+
+
+def input_hash(form_data, image_key, selected_behaviors):
+    """결과에 영향을 주는 입력만 정규화해 SHA-256으로 만듭니다. (no_cache, stream 같은 실행 옵션은 제외)"""
+    canonical = {
+        "pet_type": form_data.get('pet_type', '고양이'),
+        "symptoms": ' '.join(form_data.get('symptoms', '').split()),
+        "age": float(form_data.get('age', 2.0)),
+        "weight": float(form_data.get('weight', 4.5)),
+        # 업로드 키는 이미지 내용 해시로 만든 이름이므로 같은 사진이면 같은 키입니다.
+        "image": image_key or '',
+        "behaviors": sorted(selected_behaviors or []),
+    }
+    return hashlib.sha256(json.dumps(canonical, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class AnalysisRepository:
+    def __init__(self, prune_interval=PRUNE_INTERVAL):
+        self.prune_interval = prune_interval
+        self._last_prune = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        analysis_id, digest, result_json, html, created_at = row
+        return {"id": analysis_id, "input_hash": digest, "result": json.loads(result_json), "html": html,
+                "created_at": created_at}
+
+    def get(self, analysis_id):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT id, input_hash, result_json, html, created_at FROM analyses WHERE id = {placeholder()}",
+                        (analysis_id,))
+            return self._row(cur.fetchone())
+
+    def find_id(self, digest):
+        """같은 입력으로 저장된 결과의 id. 없으면 None."""
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT id FROM analyses WHERE input_hash = {placeholder()}", (digest,))
+            row = cur.fetchone()
+            return row[0] if row else None
+
+    def find_many(self, digests):
+        """여러 입력 해시로 저장된 결과를 한 번의 쿼리로 가져옵니다. {입력 해시: get()과 같은 dict}"""
+        digests = list(dict.fromkeys(digests))
+        found = {}
+        with get_connection() as conn:
+            cur = conn.cursor()
+            # SQLite의 바인드 변수 개수 제한(999)을 넘지 않도록 나눠서 조회합니다.
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                cur.execute(f"SELECT id, input_hash, result_json, html, created_at FROM analyses "
+                            f"WHERE input_hash IN ({', '.join([placeholder()] * len(chunk))})", chunk)
+                for row in cur.fetchall():
+                    found[row[1]] = self._row(row)
+        return found
+
+    def save(self, digest, result, html):
+        """결과를 저장하고 id를 반환합니다. 같은 입력이 이미 있으면(동시에 저장된 경우 포함) 기존 id를 반환합니다."""
+        p = placeholder()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f'''
+                INSERT INTO analyses (id, input_hash, result_json, html, created_at, image_key)
+                VALUES ({p}, {p}, {p}, {p}, {p}, {p})
+                ON CONFLICT (input_hash) DO NOTHING
+            ''', (uuid.uuid4().hex, digest, json.dumps(result, ensure_ascii=False), html, time.time(),
+                  result.get('image_path')))
+            cur.execute(f"SELECT id FROM analyses WHERE input_hash = {p}", (digest,))
+            analysis_id = cur.fetchone()[0]
+        self._maybe_schedule_prune()
+        return analysis_id
+
+    def pinned_uploads(self, max_age=TTL_SECONDS):
+        """보관 기간이 남은 결과가 가리키는 업로드 키 집합. 업로드 스위퍼가 이 키는 지우지 않습니다."""
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT DISTINCT image_key FROM analyses WHERE image_key IS NOT NULL AND created_at >= {placeholder()}",
+                        (time.time() - max_age,))
+            return {row[0] for row in cur.fetchall()}
+
+    def prune_expired(self, max_age=TTL_SECONDS, batch_size=1000):
+        """max_age초보다 오래된 결과를 batch_size행씩 지우고, 지운 행 수를 반환합니다. (한 트랜잭션이 테이블을 오래 잠그지 않도록)"""
+        p = placeholder()
+        cutoff = time.time() - max_age
+        total = 0
+        while True:
+            with get_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(f'''
+                    DELETE FROM analyses WHERE id IN (
+                        SELECT id FROM analyses WHERE created_at < {p} ORDER BY created_at LIMIT {int(batch_size)}
+                    )
+                ''', (cutoff,))
+                deleted = cur.rowcount
+            total += deleted
+            if deleted < batch_size:
+                break
+        if total:
+            print(f"INFO: 보관 기간이 지난 분석 결과 {total}개를 지웠습니다.")
+        return total
+
+    def _maybe_schedule_prune(self):
+        with self._lock:
+            if time.monotonic() - self._last_prune < self.prune_interval:
+                return
+            self._last_prune = time.monotonic()
+        try:
+            from petai_jobs import get_backend
+            get_backend().enqueue(prune_expired)
+        except Exception as e:
+            print(f"분석 결과 정리 작업 등록 중 오류 발생: {e}")
+
+
+analyses = AnalysisRepository()
+
+
+def prune_expired(max_age=TTL_SECONDS):
+    """작업 큐에서 실행하는 정리 작업. (RQ 워커가 import할 수 있도록 모듈 수준 함수)"""
+    return analyses.prune_expired(max_age)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="오래된 분석 결과 정리")
+    parser.add_argument('--max-age-days', type=float, default=TTL_SECONDS / 86400, help="보관 기간(일)")
+    args = parser.parse_args(argv)
+    return prune_expired(args.max_age_days * 86400)
+
+
+if __name__ == '__main__':
+    main()
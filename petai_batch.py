@@ -0,0 +1,251 @@
+# petai_batch.py
+"""
+이상행동/비만 분석의 일괄(벡터화) 버전.
+병원 단위 코호트처럼 수십만 건을 한 번에 다시 평가할 때 씁니다. 결과는 petai_utils의 단건 함수와 같습니다.
+
+    scores = score_obesity(species, age_years, weight_kg)   # NumPy 배열 (또는 pandas Series)
+    scores['status'], scores['assessable'], scores['ideal_kg']
+
+    flags = behavior_flags_from_frame(frame)                 # (행 수, 행동 수) bool 행렬
+    priority = score_behaviors(flags, symptom_texts)['priority_high']
+
+CLI (CSV/Parquet을 chunk 단위로 읽고 써서 메모리 사용량이 입력 크기와 무관합니다):
+
+    python -m petai_batch cohort.csv scored.csv --chunk-size 50000
+
+입력 열: species(고양이|강아지), age, weight, symptoms(선택), BEHAVIOR_DB의 행동 이름(0/1, 선택)
+Parquet 입출력에는 pyarrow가 필요합니다.
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+
+from petai_rules import behavior_rules, normalize_korean
+from petai_utils import BEHAVIOR_DB
+
+BEHAVIOR_NAMES = list(BEHAVIOR_DB.keys())
+
+CAT, DOG = '고양이', '강아지'
+CAT_IDEAL_KG = 4.5
+
+# 비만 상태 코드 -> 이름 ('' = 평가하지 않음)
+STATUS_NONE, STATUS_NORMAL, STATUS_OVERWEIGHT, STATUS_OBESE, STATUS_GUIDE = range(5)
+STATUS_LABELS = np.array(['', '정상', '과체중', '비만', '평가 가이드'], dtype=object)
+
+OUTPUT_COLUMNS = ['obesity_assessable', 'obesity_status', 'obesity_ideal_kg', 'behavior_count', 'behavior_priority']
+
+
+def _as_array(values, dtype=None):
+    """NumPy 배열, pandas Series, pyarrow 배열, 리스트를 NumPy 배열로 바꿉니다."""
+    if hasattr(values, 'to_numpy'):
+        values = values.to_numpy()
+    return np.asarray(values, dtype=dtype)
+
+
+def score_obesity(species, age_years, weight_kg):
+    """
+    assess_cat_obesity / assess_dog_obesity의 벡터화 버전.
+    반환: {'code': 상태 코드, 'status': 상태 이름, 'assessable': bool, 'ideal_kg': 고양이 기준 체중(그 외 NaN)}
+    고양이/강아지가 아닌 행과 1세 미만은 assessable=False, status=''입니다.
+    """
+    species = _as_array(species, dtype=object)
+    age = _as_array(age_years, dtype=np.float64)
+    weight = _as_array(weight_kg, dtype=np.float64)
+
+    is_cat = species == CAT
+    is_dog = species == DOG
+    # 단건 함수와 같은 비교(age < 1.0)이므로 NaN 나이는 평가 대상이 됩니다.
+    adult = ~(age < 1.0)
+
+    cat_code = np.where(weight <= CAT_IDEAL_KG * 1.2, STATUS_NORMAL,
+                        np.where(weight <= CAT_IDEAL_KG * 1.3, STATUS_OVERWEIGHT, STATUS_OBESE))
+    code = np.full(species.shape, STATUS_NONE, dtype=np.int8)
+    code = np.where(is_cat & adult, cat_code, code)
+    code = np.where(is_dog & adult, STATUS_GUIDE, code).astype(np.int8)
+
+    assessable = (is_cat | is_dog) & adult
+    ideal = np.where(is_cat & adult, CAT_IDEAL_KG, np.nan)
+    return {"code": code, "status": STATUS_LABELS[code], "assessable": assessable, "ideal_kg": ideal}
+
+
+def rule_priority_codes(symptom_texts, ruleset=None):
+    """
+    증상 문장마다 behavior_rules 규칙이 행동별로 정한 우선순위 코드 행렬 (행 수, len(BEHAVIOR_NAMES))을 만듭니다.
+    0은 우선순위 없음, k는 ruleset.levels[k - 1]입니다. 같은 문장은 한 번만 매칭합니다.
+    """
+    ruleset = ruleset or behavior_rules.get()
+    texts = _as_array(symptom_texts, dtype=object)
+    keys = np.array([normalize_korean(t) if isinstance(t, str) else '' for t in texts], dtype=object)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    table = np.zeros((len(unique), len(BEHAVIOR_NAMES)), dtype=np.int8)
+    for i, text in enumerate(unique):
+        if not text:
+            continue
+        for j, priority in enumerate(ruleset.priorities(tuple(BEHAVIOR_NAMES), text)):
+            if priority:
+                table[i, j] = ruleset.levels.index(priority) + 1
+    return table[inverse.reshape(-1)]
+
+
+def score_behaviors(flags, symptom_texts=None, ruleset=None):
+    """
+    analyze_behaviors의 벡터화 버전.
+    flags: (행 수, len(BEHAVIOR_NAMES)) bool 행렬 (열 순서는 BEHAVIOR_NAMES)
+    반환: {'priority': 행동별 우선순위 코드 행렬(0 = 없음), 'levels': 코드 k의 이름은 levels[k - 1],
+           'priority_high': 가장 높은 우선순위 여부 행렬, 'count': 선택한 행동 수, 'any_high': 행별 가장 높은 우선순위 여부}
+    """
+    ruleset = ruleset or behavior_rules.get()
+    flags = _as_array(flags, dtype=bool)
+    if symptom_texts is None:
+        codes = np.zeros(flags.shape, dtype=np.int8)
+    else:
+        codes = np.where(flags, rule_priority_codes(symptom_texts, ruleset), 0).astype(np.int8)
+    high = codes == 1
+    return {"priority": codes, "levels": list(ruleset.levels), "priority_high": high,
+            "count": flags.sum(axis=1), "any_high": high.any(axis=1)}
+
+
+def behavior_records(flag_row, priority_row, levels):
+    """한 행의 결과(score_behaviors의 priority 행)를 analyze_behaviors와 같은 dict 목록으로 펼칩니다."""
+    results = []
+    for name, selected, code in zip(BEHAVIOR_NAMES, flag_row, priority_row):
+        if not selected:
+            continue
+        info = BEHAVIOR_DB[name]
+        record = {"behavior": name, "possible_causes": info["possible_causes"], "coaching": info["coaching"]}
+        if code:
+            record["priority"] = levels[code - 1]
+        results.append(record)
+    return results
+
+
+def _truthy(values):
+    values = _as_array(values, dtype=object)
+    return np.isin(np.char.lower(np.where(values == None, '', values).astype(str)),  # noqa: E711
+                   ['1', 'true', 'y', 'yes', 'o'])
+
+
+def behavior_flags_from_frame(columns):
+    """열 이름 -> 값 매핑(dict, pandas DataFrame 등)에서 BEHAVIOR_NAMES 순서의 bool 행렬을 만듭니다. 없는 열은 False."""
+    length = len(next(iter(columns.values()))) if isinstance(columns, dict) else len(columns)
+    flags = np.zeros((length, len(BEHAVIOR_NAMES)), dtype=bool)
+    for j, name in enumerate(BEHAVIOR_NAMES):
+        if name in columns:
+            flags[:, j] = _truthy(columns[name])
+    return flags
+
+
+def score_columns(columns):
+    """열 dict(species, age, weight, symptoms, 행동 열)를 받아 OUTPUT_COLUMNS 열 dict를 반환합니다."""
+    obesity = score_obesity(columns['species'], columns['age'], columns['weight'])
+    behaviors = score_behaviors(behavior_flags_from_frame(columns), columns.get('symptoms'))
+    return {
+        "obesity_assessable": obesity['assessable'],
+        "obesity_status": obesity['status'],
+        "obesity_ideal_kg": obesity['ideal_kg'],
+        "behavior_count": behaviors['count'],
+        "behavior_priority": np.where(behaviors['any_high'], behaviors['levels'][0], ''),
+    }
+
+
+# --- chunk 단위 파일 처리 ---
+def _float_column(values):
+    """CSV 문자열 열을 float로 바꿉니다. 빈 값은 NaN."""
+    return np.array([float(v) if v not in ('', None) else np.nan for v in values], dtype=np.float64)
+
+
+def _csv_chunks(path, chunk_size):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                yield fieldnames, rows
+                rows = []
+        if rows:
+            yield fieldnames, rows
+
+
+def _rows_to_columns(fieldnames, rows):
+    columns = {name: np.array([row.get(name) for row in rows], dtype=object) for name in fieldnames}
+    columns['age'] = _float_column(columns['age'])
+    columns['weight'] = _float_column(columns['weight'])
+    return columns
+
+
+def _format_cell(value):
+    if isinstance(value, (bool, np.bool_)):
+        return '1' if value else '0'
+    if isinstance(value, float) and np.isnan(value):
+        return ''
+    return value
+
+
+def score_csv(input_path, output_path, chunk_size=50000):
+    """CSV를 chunk_size행씩 읽어 OUTPUT_COLUMNS를 덧붙인 CSV로 씁니다. 처리한 행 수를 반환합니다."""
+    total = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as out:
+        writer = None
+        for fieldnames, rows in _csv_chunks(input_path, chunk_size):
+            scores = score_columns(_rows_to_columns(fieldnames, rows))
+            if writer is None:
+                writer = csv.writer(out)
+                writer.writerow(list(fieldnames) + OUTPUT_COLUMNS)
+            score_rows = zip(*(scores[name].tolist() for name in OUTPUT_COLUMNS))
+            for row, extra in zip(rows, score_rows):
+                writer.writerow([row.get(name) for name in fieldnames] + [_format_cell(v) for v in extra])
+            total += len(rows)
+    return total
+
+
+def score_parquet(input_path, output_path, chunk_size=50000):
+    """Parquet을 레코드 배치 단위로 읽어 결과 열을 덧붙인 Parquet으로 씁니다. (pyarrow 필요)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet 처리에는 pyarrow가 필요합니다: pip install pyarrow")
+    source = pq.ParquetFile(input_path)
+    writer = None
+    total = 0
+    try:
+        for batch in source.iter_batches(batch_size=chunk_size):
+            columns = {name: batch.column(name).to_numpy(zero_copy_only=False) for name in batch.schema.names}
+            scores = score_columns(columns)
+            table = pa.Table.from_batches([batch])
+            for name in OUTPUT_COLUMNS:
+                table = table.append_column(name, pa.array(scores[name].tolist()))
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+            total += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="이상행동/비만 일괄 평가")
+    parser.add_argument('input', help="입력 CSV 또는 Parquet 파일")
+    parser.add_argument('output', help="출력 파일 (입력과 같은 형식)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="한 번에 처리할 행 수")
+    args = parser.parse_args(argv)
+    if _is_parquet(args.input) != _is_parquet(args.output):
+        parser.error("입력과 출력은 같은 형식(CSV 또는 Parquet)이어야 합니다.")
+    score = score_parquet if _is_parquet(args.input) else score_csv
+    total = score(args.input, args.output, chunk_size=args.chunk_size)
+    print(f"INFO: {total}행을 평가해 {args.output}에 저장했습니다.")
+    return total
+
+
+if __name__ == '__main__':
+    main()
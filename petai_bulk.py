@@ -0,0 +1,340 @@
+# petai_bulk.py
+"""
+일괄 분석 (병원 접수 파일).
+여러 반려동물의 사진과 증상 메모를 한 번에 받아 항목마다 run_analysis_task를 실행하고,
+끝나는 순서대로 결과를 NDJSON 한 줄씩 돌려줍니다.
+
+입력은 JSONL 매니페스트 한 줄이 항목 하나입니다. image는 zip 안의 파일 이름(또는 multipart 파일 이름,
+CLI에서는 매니페스트 기준 상대 경로)입니다.
+
+    {"id": "A-001", "pet_type": "고양이", "symptoms": "눈곱이 껴요", "age": 3, "weight": 4.2,
+     "behaviors": ["식욕부진"], "image": "a001.jpg"}
+
+- 같은 사진은 한 번만 디코드/축소해 저장하고, 입력이 같은 항목은 분석을 한 번만 실행해 결과를 나눠 줍니다.
+  (입력은 달라도 프롬프트가 같으면 프롬프트 캐시가 Gemini 호출 하나를 함께 기다립니다)
+- 이미 저장된 결과(analyses)는 모든 항목의 입력 해시를 한 번의 쿼리로 조회해 바로 돌려줍니다. (no_cache가 아닌 항목)
+- 분석은 BULK_WORKERS개까지만 동시에 실행합니다. Gemini 호출 수는 여기에 더해 petai_llm 제한기가 조절합니다.
+
+    for line in BulkRunner(run_analysis_task).run(items, images):
+        ...  # {"index", "id", "status": ok|fallback|error, "cached", "analysis_id", "result" 또는 "error"}
+
+CLI (기본값은 가짜 Gemini로 오프라인 실행):
+
+    python -m petai_bulk intake.zip --output results.ndjson
+    python -m petai_bulk manifest.jsonl --model gemini --workers 4
+
+환경 변수
+    BULK_WORKERS          동시에 실행할 분석 수 (기본값 4)
+    BULK_MAX_ITEMS        한 번에 받을 최대 항목 수 (기본값 200)
+    BULK_MAX_IMAGE_BYTES  압축을 푼 사진 한 장의 최대 크기 (기본값 20MB)
+"""
+import argparse
+import contextvars
+import hashlib
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from io import BytesIO
+
+import petai_metrics as metrics
+from petai_analyses import analyses, input_hash
+from petai_images import ingest_image
+from petai_storage import get_upload_store
+
+BULK_WORKERS = int(os.environ.get('BULK_WORKERS', 4))
+MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 200))
+MAX_IMAGE_BYTES = int(os.environ.get('BULK_MAX_IMAGE_BYTES', 20 * 1024 * 1024))
+MANIFEST_NAMES = ('manifest.jsonl', 'manifest.ndjson')
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# run_analysis_task가 읽는 폼 필드
+FORM_FIELDS = ('pet_type', 'symptoms', 'age', 'weight', 'no_cache')
+
+
+class BulkError(ValueError):
+    """일괄 요청 자체가 잘못되었을 때 (매니페스트 없음, 항목 수 초과 등)."""
+
+
+def parse_manifest(lines):
+    """JSONL 줄들을 항목 dict 목록으로 읽습니다. 빈 줄은 건너뛰고, 읽을 수 없는 줄은 error 항목이 됩니다."""
+    items = []
+    for number, line in enumerate(lines, 1):
+        try:
+            # UTF-8이 아닌 줄(UnicodeDecodeError도 ValueError)도 그 줄만 error 항목이 됩니다.
+            if isinstance(line, bytes):
+                line = line.decode('utf-8-sig')
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if not isinstance(item, dict):
+                raise ValueError("JSON 객체가 아닙니다")
+        except ValueError as e:
+            item = {"error": f"{number}번째 줄을 읽을 수 없습니다: {e}"}
+        items.append(item)
+        if len(items) > MAX_ITEMS:
+            raise BulkError(f"한 번에 {MAX_ITEMS}개까지만 분석할 수 있습니다.")
+    return items
+
+
+def read_zip(fileobj):
+    """zip 파일에서 (항목 목록, {이미지 이름: 바이트를 읽는 함수})를 만듭니다. 사진은 필요할 때 읽습니다."""
+    archive = zipfile.ZipFile(fileobj)
+    names = {info.filename: info for info in archive.infolist() if not info.is_dir()}
+    manifest = next((name for name in names if os.path.basename(name) in MANIFEST_NAMES), None)
+    if manifest is None:
+        raise BulkError(f"zip 안에 {MANIFEST_NAMES[0]} 파일이 없습니다.")
+    items = parse_manifest(archive.read(manifest).splitlines())
+    base = os.path.dirname(manifest)
+
+    def loader(info):
+        def load():
+            if info.file_size > MAX_IMAGE_BYTES:
+                raise ValueError(f"사진이 너무 큽니다 ({info.file_size} bytes)")
+            return archive.read(info)
+        return load
+
+    images = {}
+    for name, info in names.items():
+        if name != manifest:
+            images[os.path.relpath(name, base) if base else name] = loader(info)
+    return items, images
+
+
+def read_request(req):
+    """
+    Flask 요청에서 (항목 목록, 이미지 로더)를 읽습니다.
+    - zip: archive 파일 필드 또는 application/zip 본문
+    - JSONL: application/x-ndjson 본문 (사진 없이 증상만)
+    - multipart: manifest 필드(JSONL 텍스트 또는 파일)와 images 파일들 (매니페스트의 image는 업로드 파일 이름)
+    """
+    archive = req.files.get('archive')
+    if archive is not None:
+        return read_zip(BytesIO(archive.read()))
+    if req.mimetype in ('application/zip', 'application/x-zip-compressed'):
+        return read_zip(BytesIO(req.get_data()))
+    if req.mimetype in (NDJSON_MIMETYPE, 'application/jsonl'):
+        return parse_manifest(req.get_data().splitlines()), {}
+    manifest = req.files.get('manifest')
+    text = manifest.read() if manifest is not None else req.form.get('manifest', '').encode('utf-8')
+    if not text.strip():
+        raise BulkError("manifest(JSONL) 또는 archive(zip)가 필요합니다.")
+    images = {}
+    for upload in req.files.getlist('images'):
+        data = upload.read()
+        images[os.path.basename(upload.filename or '')] = lambda data=data: data
+    return parse_manifest(text.splitlines()), images
+
+
+def read_directory(manifest_path):
+    """로컬 매니페스트 파일과 그 디렉터리 기준 상대 경로의 사진들 (CLI용)."""
+    with open(manifest_path, 'rb') as f:
+        items = parse_manifest(f.read().splitlines())
+    base = os.path.dirname(os.path.abspath(manifest_path))
+
+    def loader(path):
+        def load():
+            if os.path.getsize(path) > MAX_IMAGE_BYTES:
+                raise ValueError(f"사진이 너무 큽니다 ({os.path.getsize(path)} bytes)")
+            with open(path, 'rb') as f:
+                return f.read()
+        return load
+
+    images = {}
+    for item in items:
+        name = item.get('image')
+        if isinstance(name, str) and name:
+            images[name] = loader(os.path.join(base, name))
+    return items, images
+
+
+def _item_form(item):
+    """항목을 run_analysis_task가 받는 폼 dict로 바꿉니다. 숫자 값이 잘못되었으면 ValueError."""
+    form = {name: str(item[name]) for name in FORM_FIELDS if item.get(name) is not None}
+    for name in ('age', 'weight'):
+        if name in form:
+            float(form[name])
+    return form
+
+
+class BulkRunner:
+    def __init__(self, analyze, workers=BULK_WORKERS, store=None):
+        self.analyze = analyze
+        self.workers = max(1, workers)
+        self.store = store
+
+    def _submit(self, executor, func, *args):
+        # 요청의 contextvars(request id 등)를 작업 스레드로 넘깁니다.
+        return executor.submit(contextvars.copy_context().run, func, *args)
+
+    def _ingest(self, data):
+        with metrics.stage('image_ingest'):
+            ingested = ingest_image(BytesIO(data))
+        with metrics.stage('upload_store'):
+            return (self.store or get_upload_store()).put(ingested.data, ingested.extension)
+
+    def _prepare(self, items, images, executor):
+        """
+        항목을 검사하고 사진을 저장합니다.
+        반환: (분석할 항목 [(index, item, form, image_key, behaviors)], 오류 줄 목록, 처리한 사진 수)
+        같은 사진(원본 바이트 기준)은 한 번만 처리합니다.
+        """
+        errors, ready = [], []
+        image_jobs = {}   # 원본 SHA-256 -> future
+        pending = []
+        for index, item in enumerate(items):
+            if item.get('error'):
+                errors.append(self._line(index, item, error=item['error']))
+                continue
+            try:
+                form = _item_form(item)
+            except ValueError as e:
+                errors.append(self._line(index, item, error=f"나이/체중 값이 잘못되었습니다: {e}"))
+                continue
+            behaviors = item.get('behaviors') or []
+            behaviors = [behaviors] if isinstance(behaviors, str) else [b for b in behaviors if isinstance(b, str)]
+            name = item.get('image')
+            if not form.get('symptoms', '').strip() and not name:
+                errors.append(self._line(index, item, error="사진 또는 증상 중 하나는 반드시 입력해야 합니다."))
+                continue
+            if name and name not in images:
+                errors.append(self._line(index, item, error=f"사진 파일을 찾을 수 없습니다: {name}"))
+                continue
+            if not name:
+                ready.append((index, item, form, None, behaviors))
+                continue
+            try:
+                data = images[name]()
+            except Exception as e:
+                errors.append(self._line(index, item, error=f"사진을 읽을 수 없습니다: {e}"))
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            if digest not in image_jobs:
+                image_jobs[digest] = self._submit(executor, self._ingest, data)
+            pending.append((index, item, form, image_jobs[digest], behaviors))
+
+        for index, item, form, future, behaviors in pending:
+            try:
+                ready.append((index, item, form, future.result(), behaviors))
+            except Exception as e:
+                errors.append(self._line(index, item, error=f"이미지 파일을 처리할 수 없습니다: {e}"))
+        ready.sort(key=lambda entry: entry[0])
+        return ready, errors, len(image_jobs)
+
+    @staticmethod
+    def _line(index, item, result=None, error=None, cached=False, analysis_id=None):
+        line = {"index": index, "id": item.get('id', index)}
+        if error is not None:
+            line.update(status='error', error=error)
+        elif result.get('error'):
+            line.update(status='error', error=result['error'])
+        else:
+            line.update(status='fallback' if result.get('fallback') else 'ok', cached=cached,
+                        analysis_id=analysis_id or result.get('analysis_id'), result=result)
+        return line
+
+    def run(self, items, images=None):
+        """항목을 분석하고 끝나는 순서대로 결과 줄(dict)을 yield 합니다. 마지막 줄은 {"summary": ...}입니다."""
+        started = time.perf_counter()
+        images = images or {}
+        counts = {"items": len(items), "ok": 0, "fallback": 0, "error": 0, "cached": 0}
+
+        def emit(line):
+            counts[line['status']] += 1
+            counts['cached'] += bool(line.get('cached'))
+            return line
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='petai-bulk')
+        try:
+            ready, errors, image_count = self._prepare(items, images, executor)
+            for line in errors:
+                yield emit(line)
+
+            # 입력이 같은 항목을 묶고, 저장된 결과를 한 번의 쿼리로 찾습니다.
+            # no_cache 항목은 저장된 결과를 쓰지 않으므로 따로 묶습니다.
+            groups = {}
+            for entry in ready:
+                index, item, form, image_key, behaviors = entry
+                use_cache = form.get('no_cache', '').lower() not in ('1', 'true', 'on')
+                groups.setdefault((input_hash(form, image_key, behaviors), use_cache), []).append(entry)
+            cacheable = [digest for digest, use_cache in groups if use_cache]
+            try:
+                with metrics.stage('bulk_lookup'):
+                    stored = analyses.find_many(cacheable) if cacheable else {}
+            except Exception as e:
+                print(f"저장된 분석 결과 조회 중 오류 발생: {e}")
+                stored = {}
+            for digest, row in stored.items():
+                for index, item, *_ in groups.pop((digest, True)):
+                    yield emit(self._line(index, item, row['result'], cached=True, analysis_id=row['id']))
+
+            running = {}
+            for entries in groups.values():
+                _, _, form, image_key, behaviors = entries[0]
+                running[self._submit(executor, self.analyze, form, image_key, behaviors)] = entries
+            analyses_run = len(running)
+            while running:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    entries = running.pop(future)
+                    try:
+                        result, error = future.result(), None
+                    except Exception as e:
+                        result, error = None, f"분석 중 오류가 발생했습니다: {e}"
+                    for index, item, *_ in entries:
+                        yield emit(self._line(index, item, result, error=error))
+        finally:
+            # 클라이언트가 연결을 끊으면 시작하지 않은 분석은 취소합니다.
+            executor.shutdown(wait=False, cancel_futures=True)
+        yield {"summary": {**counts, "images": image_count, "analyses_run": analyses_run,
+                           "seconds": round(time.perf_counter() - started, 3)}}
+
+
+def ndjson(lines):
+    """dict를 NDJSON 줄로 바꿉니다."""
+    for line in lines:
+        yield json.dumps(line, ensure_ascii=False) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="병원 접수 파일 일괄 분석")
+    parser.add_argument('input', help="manifest.jsonl이 들어 있는 zip 파일 또는 JSONL 매니페스트")
+    parser.add_argument('--output', default='-', help="결과 NDJSON 파일 (기본값: 표준 출력)")
+    parser.add_argument('--workers', type=int, default=BULK_WORKERS, help="동시에 실행할 분석 수")
+    parser.add_argument('--model', choices=['fake', 'gemini'], default='fake',
+                        help="fake: 로컬 가짜 Gemini(benchmarks.fake_gemini), gemini: 실제 API (GEMINI_API_KEY 필요)")
+    parser.add_argument('--fake-latency', type=float, default=0.0, help="가짜 Gemini 응답 지연(초)")
+    args = parser.parse_args(argv)
+
+    import app as petai_app
+    if args.model == 'fake':
+        from benchmarks import fake_gemini
+        fake_gemini.install(petai_app, latency=args.fake_latency, jitter=0.0, seed=0)
+    petai_app.run_db_setup()
+
+    if zipfile.is_zipfile(args.input):
+        with open(args.input, 'rb') as f:
+            items, images = read_zip(BytesIO(f.read()))
+    else:
+        items, images = read_directory(args.input)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    summary = {}
+    try:
+        for line in BulkRunner(petai_app.run_analysis_task, workers=args.workers).run(items, images):
+            summary = line.get('summary', summary)
+            out.write(json.dumps(line, ensure_ascii=False) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"INFO: {summary.get('items', 0)}개 항목 분석 완료 (오류 {summary.get('error', 0)}개, "
+          f"저장된 결과 {summary.get('cached', 0)}개, {summary.get('seconds', 0)}초)", file=sys.stderr)
+    return summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+# petai_cache.py
+"""
+결과 캐시.
+TTL과 LRU 크기 제한을 지원하며, 저장소는 메모리 / SQLite 파일 / 기존 DB 테이블 중에서 고를 수 있습니다.
+
+- vision_cache: 같은 사진에 대한 Gemini Vision 결과 (키: 지각 해시 + 정규화된 픽셀의 SHA-256)
+- prompt_cache: 같은 진단 프롬프트에 대한 Gemini 응답 (키: 모델 이름 + 공백을 정규화한 프롬프트)
+
+get_or_compute()는 같은 키를 동시에 요청하면 한 번만 계산하고 결과를 나눠 씁니다 (single-flight).
+
+환경 변수 (접두사 VISION_CACHE / PROMPT_CACHE)
+    _BACKEND  memory(기본값) | sqlite | db
+    _TTL      초 단위 유효 시간 (기본값 86400)
+    _MAX      최대 항목 수 (기본값 1024)
+    _PATH     sqlite 백엔드의 파일 경로
+
+db 백엔드의 테이블(vision_cache, prompt_cache)은 웹 요청 중에 만들지 않고 마이그레이션(petai_migrations)이 만듭니다.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from petai_db import get_connection, placeholder
+
+
+class MemoryStore:
+    """프로세스 메모리의 LRU 저장소."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data.move_to_end(key)
+            return item
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def cache_table_ddl(table):
+    return f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            cache_key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at DOUBLE PRECISION NOT NULL,
+            accessed_at DOUBLE PRECISION NOT NULL
+        )
+    '''
+
+
+# db 백엔드가 앱 DB에 쓰는 테이블 (make_cache의 table 인자)
+DB_CACHE_TABLES = ('vision_cache', 'prompt_cache')
+
+
+def install_cache_tables(cur, postgres):
+    """db 백엔드 캐시 테이블을 만듭니다. (petai_migrations에서 호출)"""
+    for table in DB_CACHE_TABLES:
+        cur.execute(cache_table_ddl(table))
+
+
+class _SQLStore:
+    """SQL 테이블 저장소 공통 로직. 값은 JSON 문자열로 저장하고 accessed_at 순으로 LRU 제거합니다."""
+
+    def __init__(self, table, max_entries=1024):
+        self.table = table
+        self.max_entries = max_entries
+
+    def _ddl(self):
+        return cache_table_ddl(self.table)
+
+    def _get(self, cur, p, key):
+        cur.execute(f"SELECT value, expires_at FROM {self.table} WHERE cache_key = {p}", (key,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        cur.execute(f"UPDATE {self.table} SET accessed_at = {p} WHERE cache_key = {p}", (time.time(), key))
+        return (json.loads(row[0]), row[1])
+
+    def _set(self, cur, p, key, value, expires_at):
+        cur.execute(f'''
+            INSERT INTO {self.table} (cache_key, value, expires_at, accessed_at) VALUES ({p}, {p}, {p}, {p})
+            ON CONFLICT (cache_key) DO UPDATE
+            SET value = excluded.value, expires_at = excluded.expires_at, accessed_at = excluded.accessed_at
+        ''', (key, json.dumps(value, ensure_ascii=False), expires_at, time.time()))
+        cur.execute(f"SELECT COUNT(*) FROM {self.table}")
+        overflow = cur.fetchone()[0] - self.max_entries
+        if overflow > 0:
+            cur.execute(f'''
+                DELETE FROM {self.table} WHERE cache_key IN (
+                    SELECT cache_key FROM {self.table} ORDER BY accessed_at ASC LIMIT {int(overflow)}
+                )
+            ''')
+
+    def _delete(self, cur, p, key):
+        cur.execute(f"DELETE FROM {self.table} WHERE cache_key = {p}", (key,))
+
+
+_sqlite_stores = weakref.WeakSet()
+
+
+def _reset_sqlite_stores():
+    for store in list(_sqlite_stores):
+        store._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_sqlite_stores)
+
+
+class SQLiteStore(_SQLStore):
+    """
+    별도의 SQLite 파일에 저장합니다. 같은 서버의 워커 프로세스끼리 캐시를 공유할 수 있습니다.
+    연결은 처음 쓸 때 프로세스마다 엽니다. (gunicorn preload로 fork된 워커가 마스터의 연결을 함께 쓰지 않도록)
+    """
+
+    def __init__(self, path, table='cache_entries', max_entries=1024):
+        super().__init__(table, max_entries)
+        self.path = path
+        self._reset()
+        _sqlite_stores.add(self)
+
+    def _reset(self):
+        """fork된 자식 프로세스에서 부모의 연결과 잠금을 버립니다."""
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """이 프로세스의 연결. 잠금을 잡은 상태에서 호출합니다."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            with conn:
+                conn.execute(self._ddl())
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        with self._lock, self._connection() as conn:
+            return self._get(conn.cursor(), '?', key)
+
+    def set(self, key, value, expires_at):
+        with self._lock, self._connection() as conn:
+            self._set(conn.cursor(), '?', key, value, expires_at)
+
+    def delete(self, key):
+        with self._lock, self._connection() as conn:
+            self._delete(conn.cursor(), '?', key)
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class DBStore(_SQLStore):
+    """앱의 기본 DB(petai_db 풀)의 테이블에 저장합니다. 여러 서버가 캐시를 공유할 수 있습니다. (테이블은 마이그레이션이 만듭니다)"""
+
+    def get(self, key):
+        with get_connection() as conn:
+            return self._get(conn.cursor(), placeholder(), key)
+
+    def set(self, key, value, expires_at):
+        with get_connection() as conn:
+            self._set(conn.cursor(), placeholder(), key, value, expires_at)
+
+    def delete(self, key):
+        with get_connection() as conn:
+            self._delete(conn.cursor(), placeholder(), key)
+
+    def __len__(self):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT COUNT(*) FROM {self.table}")
+            return cur.fetchone()[0]
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """같은 키에 대한 동시 호출을 하나로 합칩니다. 나머지 호출은 첫 호출의 결과(또는 예외)를 기다립니다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """(결과, 공유 여부)를 반환합니다."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = func()
+            return call.value, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class ResultCache:
+    """TTL이 있는 캐시. 조회 적중/실패/동시 요청 합류 횟수를 기록합니다."""
+
+    def __init__(self, store, ttl=86400):
+        self.store = store
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, count=True):
+        """값을 반환합니다. 없거나 만료되었으면 None. count=False이면 적중/실패 횟수에 넣지 않습니다. (폴링용)"""
+        try:
+            item = self.store.get(key)
+            if item is not None and item[1] < time.time():
+                item = None
+                self.store.delete(key)
+        except Exception as e:
+            print(f"캐시 조회 중 오류 발생: {e}")
+            item = None
+        if count:
+            self._count(item is not None)
+        return item[0] if item is not None else None
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.store.set(key, value, time.time() + (self.ttl if ttl is None else ttl))
+        except Exception as e:
+            print(f"캐시 저장 중 오류 발생: {e}")
+
+    def get_or_compute(self, key, func, bypass=False):
+        """
+        캐시에 있으면 그 값을, 없으면 func()를 한 번만 실행해 저장하고 반환합니다.
+        bypass=True이면 캐시를 읽지 않고 새로 계산한 값으로 덮어씁니다.
+        """
+        def compute():
+            value = func()
+            if value is not None:
+                self.set(key, value)
+            return value
+
+        if bypass:
+            return compute()
+        value = self.get(key)
+        if value is not None:
+            return value
+        value, shared = self._flight.do(key, compute)
+        if shared:
+            with self._lock:
+                self.coalesced += 1
+        return value
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": type(self.store).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def make_cache(prefix, table, default_path):
+    """<prefix>_BACKEND/_TTL/_MAX/_PATH 환경 변수로 캐시를 만듭니다."""
+    backend = os.environ.get(f'{prefix}_BACKEND', 'memory').lower()
+    ttl = float(os.environ.get(f'{prefix}_TTL', 86400))
+    max_entries = int(os.environ.get(f'{prefix}_MAX', 1024))
+    if backend == 'sqlite':
+        store = SQLiteStore(os.environ.get(f'{prefix}_PATH', default_path), table=table, max_entries=max_entries)
+    elif backend == 'db':
+        store = DBStore(table, max_entries=max_entries)
+    else:
+        store = MemoryStore(max_entries=max_entries)
+    return ResultCache(store, ttl=ttl)
+
+
+# --- 이미지 키 ---
+def perceptual_hash(image):
+    """64비트 dHash (9x8 흑백 축소 후 이웃 픽셀 밝기 비교)를 16진수 문자열로 반환합니다."""
+    small = image.convert('L').resize((9, 8))
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def image_cache_key(image):
+    """
+    PIL 이미지의 캐시 키.
+    EXIF 회전을 반영하고 RGB로 변환한 픽셀에 대해 SHA-256을 계산하므로,
+    같은 사진을 다른 파일 이름/메타데이터로 다시 올려도 같은 키가 나옵니다.
+    """
+    from PIL import ImageOps
+    normalized = ImageOps.exif_transpose(image).convert('RGB')
+    digest = hashlib.sha256()
+    digest.update(f"{normalized.width}x{normalized.height}".encode())
+    digest.update(normalized.tobytes())
+    return f"{perceptual_hash(normalized)}-{digest.hexdigest()}"
+
+
+# --- 프롬프트 키 ---
+def normalize_prompt(prompt):
+    """줄마다 앞뒤 공백을 지우고 연속 공백을 하나로 합칩니다. (템플릿 들여쓰기 차이로 캐시가 갈리지 않도록)"""
+    lines = (" ".join(line.split()) for line in prompt.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def prompt_cache_key(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\n{normalize_prompt(prompt)}".encode('utf-8')).hexdigest()
+
+
+vision_cache = make_cache('VISION_CACHE', table='vision_cache', default_path='vision_cache.db')
+prompt_cache = make_cache('PROMPT_CACHE', table='prompt_cache', default_path='prompt_cache.db')
@@ -0,0 +1,282 @@
+# petai_db.py
+"""
+공용 DB 접근 계층.
+DATABASE_URL이 설정되어 있으면 psycopg2 ThreadedConnectionPool(PostgreSQL)을,
+없으면 스레드별 SQLite 연결을 사용합니다.
+
+    with get_connection() as conn:
+        cur = dict_cursor(conn)
+        cur.execute(f"SELECT * FROM diseases WHERE id = {placeholder()}", (1,))
+
+블록이 정상 종료되면 commit, 예외가 발생하면 rollback 후 연결을 풀에 반납합니다.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DB_FILE = os.environ.get('SQLITE_PATH', 'pet_health.db')
+
+
+class PoolTimeout(Exception):
+    """풀에서 제한 시간 내에 연결을 얻지 못했을 때 발생합니다."""
+
+
+class _PoolStats:
+    """연결 대기 시간과 사용률을 기록합니다."""
+
+    def __init__(self, max_size):
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.health_check_failures = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def checked_out(self, waited):
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "utilization": self.in_use / self.max_size if self.max_size else 0.0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "health_check_failures": self.health_check_failures,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+class PostgresPool:
+    """psycopg2 ThreadedConnectionPool 래퍼 (대기, 헬스 체크, 통계 포함)."""
+
+    is_postgres = True
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=10.0, health_check_interval=30.0):
+        import psycopg2.pool
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        self.dsn = dsn
+        # ThreadedConnectionPool은 고갈 시 대기하지 않고 PoolError를 던지므로 세마포어로 대기열을 만듭니다.
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.stats = _PoolStats(maxconn)
+
+    def _healthy(self, conn):
+        """오래 쉬었던 연결만 SELECT 1로 확인합니다."""
+        if conn.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0.0) < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if not self._healthy(conn):
+            self.stats.incr('health_check_failures')
+            self._pool.putconn(conn, close=True)
+            conn = self._pool.getconn()
+        return conn
+
+    @contextmanager
+    def connection(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats.incr('timeouts')
+            raise PoolTimeout(f"{self.timeout}초 안에 DB 연결을 얻지 못했습니다.")
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        self.stats.checked_out(time.monotonic() - started)
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            broken = conn.closed != 0
+            if not broken:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            raise
+        finally:
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=broken)
+            self.stats.checked_in()
+            self._slots.release()
+
+    def close(self):
+        self._pool.closeall()
+
+
+class SQLitePool:
+    """스레드마다 하나의 SQLite 연결을 재사용합니다."""
+
+    is_postgres = False
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+        self.stats = _PoolStats(0)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._all.append(conn)
+            self.stats.max_size = len(self._all)
+        return conn
+
+    def _thread_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            try:
+                conn.execute("SELECT 1")
+                return conn
+            except sqlite3.Error:
+                self.stats.incr('health_check_failures')
+                self._discard(conn)
+        conn = self._local.conn = self._open()
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            if conn in self._all:
+                self._all.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self._thread_connection()
+        self.stats.checked_out(0.0)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.stats.checked_in()
+
+    def close(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure(database_url=None, sqlite_path=None):
+    """전역 풀을 (재)생성합니다. 인자가 없으면 환경 변수를 따릅니다."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        database_url = database_url if database_url is not None else os.environ.get("DATABASE_URL")
+        if database_url:
+            _pool = PostgresPool(
+                database_url,
+                minconn=int(os.environ.get('DB_POOL_MIN', 1)),
+                maxconn=int(os.environ.get('DB_POOL_MAX', 10)),
+                timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            )
+        else:
+            _pool = SQLitePool(sqlite_path or DB_FILE)
+    return _pool
+
+
+def reset_pool():
+    """풀을 닫고 비웁니다. 다음 get_pool()에서 새로 만듭니다. (gunicorn 마스터가 마이그레이션 후 fork 전에 호출)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+
+def get_pool():
+    if _pool is None:
+        configure()
+    return _pool
+
+
+def get_connection():
+    """풀에서 연결을 빌려오는 컨텍스트 매니저를 반환합니다."""
+    return get_pool().connection()
+
+
+def is_postgres():
+    return get_pool().is_postgres
+
+
+def placeholder():
+    """현재 DB 드라이버의 파라미터 자리표시자 ('%s' 또는 '?')."""
+    return '%s' if is_postgres() else '?'
+
+
+def dict_cursor(conn):
+    """행을 dict처럼 다룰 수 있는 커서를 반환합니다."""
+    if isinstance(conn, sqlite3.Connection):
+        return conn.cursor()
+    import psycopg2.extras
+    return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+
+def health_check():
+    """SELECT 1로 DB 상태를 확인합니다."""
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        return True
+    except Exception as e:
+        print(f"DB 헬스 체크 실패: {e}")
+        return False
+
+
+def pool_stats():
+    """풀 대기 시간/사용률 통계를 반환합니다."""
+    pool = get_pool()
+    return {"backend": "postgres" if pool.is_postgres else "sqlite", **pool.stats.snapshot()}
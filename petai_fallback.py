@@ -0,0 +1,183 @@
+# petai_fallback.py
+"""
+Gemini 없이 만드는 로컬 진단.
+Gemini가 제한 시간을 넘기거나 실패하면, diseases 테이블의 증상(text_symptoms, image_labels)을
+보호자 관찰 내용, 사진 라벨, 선택한 이상행동과 맞춰 보고 점수가 높은 질병의 경고 단계와 조언으로 답변을 만듭니다.
+같은 입력에는 항상 같은 결과를 내며, 외부 호출 없이 메모리의 질병 인덱스만 사용합니다.
+
+    fallback = diagnose("눈곱이 끼고 재채기를 해요", behaviors=["식욕부진"])
+    fallback['matches'], fallback['markdown']
+
+환경 변수
+    FALLBACK_BUDGET          점수 계산 시간 한도(초, 기본값 0.2). 넘으면 그때까지 계산한 질병으로 답합니다.
+    FALLBACK_MAX_CANDIDATES  질병이 이보다 많으면 키워드/전문 검색으로 찾은 질병만 점수를 매깁니다. (기본값 2000)
+"""
+import os
+import time
+
+from petai_index import disease_index
+from petai_rules import normalize_korean
+from petai_search import bigrams
+from petai_utils import BEHAVIOR_DB
+
+FALLBACK_BUDGET = float(os.environ.get('FALLBACK_BUDGET', 0.2))
+MAX_CANDIDATES = int(os.environ.get('FALLBACK_MAX_CANDIDATES', 2000))
+DEFAULT_LIMIT = 3
+
+# 증거별 가중치: 보호자 관찰 내용과 사진 라벨은 1, 이상행동(이름과 의심 원인)은 0.5
+TEXT_WEIGHT, BEHAVIOR_WEIGHT = 1.0, 0.5
+# 질병 이름이 일치할 때의 점수(부분 일치는 절반), 전문 검색/키워드 검색에서 이미 찾은 질병에 더하는 점수
+NAME_BONUS, RELATED_BONUS = 1.0, 0.25
+# 부분 일치로 인정할 최소 바이그램 겹침 비율
+PARTIAL_OVERLAP = 0.5
+FAILED_IMAGE_LABEL = "이미지 분석 실패"
+
+NOTICES = {
+    'timeout': "AI 진단이 늦어지고 있어, 저장된 수의학 정보로 먼저 안내드립니다. AI 답변이 도착하면 이 내용이 바뀝니다.",
+    'error': "지금은 AI 진단을 사용할 수 없어, 저장된 수의학 정보로 안내드립니다.",
+}
+
+
+def warning_rank(warning_level):
+    """경고 단계를 정렬 순서로 바꿉니다. (경고 0, 주의 1, 그 외 2)"""
+    level = warning_level or ''
+    if level.startswith('경고'):
+        return 0
+    if level.startswith('주의'):
+        return 1
+    return 2
+
+
+class _Evidence:
+    """정규화한 문장과 그 바이그램 집합."""
+
+    def __init__(self, text, weight):
+        self.text = normalize_korean(text)
+        self.grams = set(bigrams(self.text))
+        self.weight = weight
+
+    def match(self, term):
+        """term이 그대로 있으면 weight, 바이그램이 PARTIAL_OVERLAP 이상 겹치면 절반, 아니면 0."""
+        if not term or not self.text:
+            return 0.0
+        if term in self.text:
+            return self.weight
+        grams = set(bigrams(term))
+        if len(grams) >= 3 and len(grams & self.grams) / len(grams) >= PARTIAL_OVERLAP:
+            return self.weight / 2
+        return 0.0
+
+
+def _terms(disease):
+    """질병의 증상/사진 라벨 목록 [(원래 표현, 정규화된 표현)]. 정규화 결과가 같은 표현은 한 번만."""
+    terms, seen = [], set()
+    for field in ('text_symptoms', 'image_labels'):
+        for term in (disease.get(field) or '').split(','):
+            normalized = normalize_korean(term.strip())
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                terms.append((term.strip(), normalized))
+    return terms
+
+
+def build_evidence(symptom_text='', image_label=None, behaviors=()):
+    """score_disease에 넘길 입력 목록. (보호자 관찰 내용, 사진 라벨, 이상행동과 의심 원인)"""
+    if image_label == FAILED_IMAGE_LABEL:
+        image_label = None
+    evidence = [_Evidence(text, TEXT_WEIGHT) for text in (symptom_text, image_label) if text]
+    for name in behaviors or ():
+        causes = BEHAVIOR_DB.get(name, {}).get('possible_causes', [])
+        evidence.append(_Evidence(' '.join([name, *causes]), BEHAVIOR_WEIGHT))
+    return evidence
+
+
+def score_disease(disease, evidence, related_ids=()):
+    """(점수, 일치한 증상 목록)."""
+    score, matched = 0.0, []
+    for term, normalized in _terms(disease):
+        best = max((e.match(normalized) for e in evidence), default=0.0)
+        if best:
+            score += best
+            matched.append(term)
+    name = normalize_korean((disease.get('disease_name') or '').split('(')[0])
+    score += NAME_BONUS * max((e.match(name) for e in evidence), default=0.0)
+    if score and disease.get('id') in related_ids:
+        score += RELATED_BONUS
+    return score, matched
+
+
+def _candidates(evidence_texts, related):
+    if len(disease_index) <= MAX_CANDIDATES:
+        return disease_index.all()
+    # 질병이 많으면 키워드 인덱스와 이미 검색된 질병만 봅니다.
+    found = {d['id']: d for d in related}
+    for text in evidence_texts:
+        for disease in disease_index.match(text):
+            found.setdefault(disease['id'], disease)
+    return [found[i] for i in sorted(found)]
+
+
+def rank_diseases(symptom_text='', image_label=None, behaviors=(), related=(), diseases=None,
+                  limit=DEFAULT_LIMIT, budget=FALLBACK_BUDGET):
+    """
+    관련 질병을 점수 순으로 최대 limit개 반환합니다. 각 dict에 fallback_score와 matched_symptoms가 들어 있습니다.
+    related: 전문 검색이나 사진 라벨 검색으로 이미 찾은 질병 목록 (점수를 조금 더합니다)
+    """
+    if image_label == FAILED_IMAGE_LABEL:
+        image_label = None
+    evidence = build_evidence(symptom_text, image_label, behaviors)
+    if not evidence:
+        return []
+    related = [d for d in related or () if d]
+    related_ids = {d.get('id') for d in related}
+    if diseases is None:
+        diseases = _candidates([t for t in (symptom_text, image_label) if t], related)
+
+    deadline = time.perf_counter() + budget
+    scored = []
+    for i, disease in enumerate(diseases):
+        if time.perf_counter() > deadline:
+            print(f"경고: 로컬 진단이 시간 한도({budget}초)를 넘어 {i}/{len(diseases)}개 질병만 비교했습니다.")
+            break
+        score, matched = score_disease(disease, evidence, related_ids)
+        if score > 0:
+            scored.append((score, len(matched), disease, matched))
+    scored.sort(key=lambda s: (-s[0], -s[1], warning_rank(s[2].get('warning_level')), s[2].get('id') or 0))
+    return [{**disease, "fallback_score": round(score, 3), "matched_symptoms": matched}
+            for score, _, disease, matched in scored[:limit]]
+
+
+def render_markdown(matches, reason='timeout', behavior_analysis=None):
+    """Gemini 진단과 같은 형식(핵심 요약 / 상세 설명 / 권장 조치)의 마크다운."""
+    lines = [f"> {NOTICES.get(reason, NOTICES['error'])}", "", "### 핵심 요약"]
+    if matches:
+        top = matches[0]
+        lines.append(f"입력하신 내용과 가장 비슷한 항목은 **{top['disease_name']}** ({top.get('warning_level') or '-'})입니다.")
+    else:
+        lines.append("입력하신 내용과 일치하는 질병 정보를 찾지 못했습니다.")
+
+    lines += ["", "### 상세 설명"]
+    for disease in matches:
+        matched = ', '.join(disease['matched_symptoms']) or '-'
+        lines.append(f"- **{disease['disease_name']}** ({disease.get('warning_level') or '-'}): 일치한 증상 {matched}")
+    urgent = [b['behavior'] for b in behavior_analysis or () if b.get('priority')]
+    if urgent:
+        lines.append(f"- 우선 확인이 필요한 이상행동: {', '.join(urgent)}")
+    if not matches and not urgent:
+        lines.append("- 저장된 정보만으로는 판단하기 어렵습니다.")
+
+    lines += ["", "### 권장 조치"]
+    if matches:
+        lines.append(matches[0].get('advice') or '')
+    if any(warning_rank(d.get('warning_level')) == 0 for d in matches):
+        lines.append("경고 단계 항목이 포함되어 있으니 가능한 한 빨리 동물병원을 방문하세요.")
+    else:
+        lines.append("증상이 계속되거나 심해지면 동물병원에서 진료를 받으세요.")
+    return '\n'.join(lines) + '\n'
+
+
+def diagnose(symptom_text='', image_label=None, behaviors=(), related=(), reason='timeout',
+             behavior_analysis=None, limit=DEFAULT_LIMIT):
+    """{'matches': rank_diseases 결과, 'markdown': 답변} 를 반환합니다."""
+    matches = rank_diseases(symptom_text, image_label, behaviors, related, limit=limit)
+    return {"matches": matches, "markdown": render_markdown(matches, reason, behavior_analysis)}
@@ -0,0 +1,165 @@
+# petai_fragments.py
+"""
+미리 렌더링한 HTML 조각과 압축해 둔 정적 응답.
+요청마다 내용이 같은 조각(강아지 BCS 가이드, 이상행동 코칭 카드, 분석 폼의 이상행동 체크박스)은 한 번만 HTML로 만들어
+템플릿에 그대로 넣고, 첫 화면과 static/style.css는 gzip 압축본과 내용 해시 ETag를 만들어 두어 재방문 시 304로 답합니다.
+
+    fragments.dog_bcs_guide             # Markup
+    fragments.behavior_card('식욕부진')  # Markup (BEHAVIOR_DB에 없는 행동은 None)
+    fragments.behavior_options          # Markup
+
+    page = cached_page('index', lambda: render_template('index.html'))
+    return page.response()              # If-None-Match가 맞으면 304, Accept-Encoding에 gzip이 있으면 압축본
+
+markdown은 조각이 처음 필요할 때 불러옵니다. (app.warm_up()에서 미리 만듭니다)
+
+환경 변수
+    ASSET_MAX_AGE  버전(?v=) 없이 요청한 정적 파일의 캐시 시간(초, 기본값 3600)
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, current_app, request, url_for
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
+
+from petai_utils import BEHAVIOR_DB, DOG_BCS_GUIDE
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+BEHAVIOR_NAMES = tuple(BEHAVIOR_DB)
+
+# 압축해 두는 정적 파일. 업로드 파일처럼 계속 바뀌는 파일은 Flask 기본 static 뷰가 처리합니다.
+COMPRESSED_ASSETS = ('style.css',)
+ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 3600))
+# asset_url()이 붙이는 ?v=<내용 해시> URL은 내용이 바뀌면 URL도 바뀌므로 1년 동안 캐시해도 됩니다.
+VERSIONED_MAX_AGE = 365 * 86400
+VERSION_LENGTH = 12
+
+
+class StaticPayload:
+    """내용이 바뀌지 않는 응답 본문. 원본, gzip 압축본, 강한 ETag(내용 해시)를 한 번만 만듭니다."""
+
+    def __init__(self, body, mimetype):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+    @property
+    def version(self):
+        return self.etag[:VERSION_LENGTH]
+
+    def response(self, max_age=0, immutable=False):
+        """현재 요청에 맞는 응답. max_age가 0이면 no-cache(매번 ETag로 재검증)입니다."""
+        use_gzip = request.accept_encodings['gzip'] > 0 and len(self.gzipped) < len(self.body)
+        # 압축본과 원본은 바이트가 다르므로 강한 ETag도 달라야 합니다.
+        etag = f"{self.etag}-gz" if use_gzip else self.etag
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.gzipped if use_gzip else self.body, mimetype=self.mimetype)
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if max_age:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            if immutable:
+                response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+
+def cached_page(name, render, mimetype='text/html'):
+    """render()로 만든 페이지를 앱마다 한 번만 렌더링해 StaticPayload로 보관합니다."""
+    pages = current_app.extensions.setdefault('petai_pages', {})
+    page = pages.get(name)
+    if page is None:
+        # 동시에 처음 요청되면 두 번 렌더링될 수 있지만 결과가 같으므로 잠그지 않습니다.
+        page = pages[name] = StaticPayload(render(), mimetype)
+    return page
+
+
+class Fragments:
+    """BEHAVIOR_DB와 강아지 BCS 가이드로 만든 HTML 조각. 처음 접근할 때 한 번만 렌더링합니다."""
+
+    def __init__(self, template_dir=TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self._built = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        if self._built is None:
+            with self._lock:
+                if self._built is None:
+                    self._built = self._render()
+        return self._built
+
+    def _render(self):
+        import markdown
+        env = Environment(loader=FileSystemLoader(self.template_dir), autoescape=True)
+        card = env.get_template('_behavior_card.html')
+        return {
+            "dog_bcs_guide": Markup(markdown.markdown(DOG_BCS_GUIDE)),
+            "behavior_cards": {name: Markup(card.render(behavior=name, info=info).strip())
+                               for name, info in BEHAVIOR_DB.items()},
+            "behavior_options": Markup(env.get_template('_behavior_options.html').render(behaviors=BEHAVIOR_NAMES)),
+        }
+
+    @property
+    def dog_bcs_guide(self):
+        return self.build()['dog_bcs_guide']
+
+    @property
+    def behavior_options(self):
+        return self.build()['behavior_options']
+
+    def behavior_card(self, name):
+        return self.build()['behavior_cards'].get(name)
+
+
+fragments = Fragments()
+
+
+class CompressedAssets:
+    """
+    COMPRESSED_ASSETS 파일을 시작할 때 읽어 압축해 두고 Flask의 static 뷰 앞에서 돌려줍니다.
+    템플릿에서는 asset_url('style.css')로 내용 해시가 붙은 URL을 만들어 오래 캐시되게 합니다.
+    """
+
+    def __init__(self, static_dir, names=COMPRESSED_ASSETS):
+        self.payloads = {}
+        for name in names:
+            try:
+                with open(os.path.join(static_dir, name), 'rb') as f:
+                    body = f.read()
+            except OSError as e:
+                print(f"경고: 정적 파일 {name}을 읽지 못했습니다: {e}")
+                continue
+            self.payloads[name] = StaticPayload(body, mimetypes.guess_type(name)[0] or 'application/octet-stream')
+
+    def url(self, filename):
+        payload = self.payloads.get(filename)
+        if payload is None:
+            return url_for('static', filename=filename)
+        return url_for('static', filename=filename, v=payload.version)
+
+    def wrap(self, static_view):
+        def view(filename):
+            payload = self.payloads.get(filename)
+            if payload is None:
+                return static_view(filename=filename)
+            versioned = request.args.get('v') == payload.version
+            return payload.response(max_age=VERSIONED_MAX_AGE if versioned else ASSET_MAX_AGE, immutable=versioned)
+        return view
+
+    def init_app(self, app):
+        app.view_functions['static'] = self.wrap(app.view_functions['static'])
+        app.jinja_env.globals['asset_url'] = self.url
@@ -0,0 +1,174 @@
+# petai_images.py
+"""
+업로드 이미지 처리.
+업로드된 사진을 한 번만 디코드해 긴 변을 IMAGE_MAX_EDGE 이하로 줄이고, JPEG/WebP로 한 번만 인코딩합니다.
+Gemini에는 이 바이트를 인라인으로 보내며, 인라인 한도를 넘는 경우에만 Files API를 사용합니다.
+PIL은 처음 이미지를 처리할 때 불러옵니다.
+
+디코드 전에 헤더만 읽어 형식과 가로/세로 크기를 확인하고, 지원하지 않는 형식이나 IMAGE_MAX_PIXELS를 넘는 사진
+(압축 폭탄 포함)은 바로 거절합니다(ImageRejected). JPEG는 draft()로 IMAGE_MAX_EDGE에 가까운 1/2, 1/4, 1/8 크기로
+디코드하므로 큰 사진도 원본 해상도만큼 메모리를 쓰지 않습니다. 업로드 본문은 Werkzeug/Starlette가 일정 크기부터
+임시 파일에 두므로, 파일 객체를 그대로 넘기면 본문 전체를 메모리에 올리지 않습니다.
+
+동시에 디코드 중인 이미지의 예상 메모리 합계는 워커마다 IMAGE_DECODE_BUDGET_MB로 제한합니다.
+자리가 날 때까지 IMAGE_DECODE_WAIT초 기다리고, 그래도 없으면 ImageBusy(503)로 답합니다.
+
+환경 변수
+    IMAGE_MAX_EDGE          긴 변 최대 픽셀 (기본값 1024)
+    IMAGE_FORMAT            JPEG(기본값) | WEBP
+    IMAGE_QUALITY           인코딩 품질 (기본값 85)
+    IMAGE_MAX_PIXELS        허용하는 원본 최대 픽셀 수 (기본값 64000000)
+    IMAGE_DECODE_BUDGET_MB  워커별 동시 디코드 메모리 한도(MB, 기본값 256)
+    IMAGE_DECODE_WAIT       디코드 자리를 기다리는 최대 시간(초, 기본값 10)
+"""
+import math
+import mimetypes
+import os
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+import petai_metrics as metrics
+
+MAX_EDGE = int(os.environ.get('IMAGE_MAX_EDGE', 1024))
+IMAGE_FORMAT = os.environ.get('IMAGE_FORMAT', 'JPEG').upper()
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 85))
+# Gemini 인라인 요청 한도(20MB)보다 여유 있게 잡습니다.
+INLINE_LIMIT_BYTES = 15 * 1024 * 1024
+MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 64_000_000))
+DECODE_BUDGET_BYTES = int(float(os.environ.get('IMAGE_DECODE_BUDGET_MB', 256)) * 1024 * 1024)
+DECODE_WAIT = float(os.environ.get('IMAGE_DECODE_WAIT', 10))
+# 업로드로 받는 형식 (MPO는 일부 카메라가 만드는 JPEG)
+ALLOWED_FORMATS = {'JPEG', 'MPO', 'PNG', 'WEBP', 'GIF', 'BMP'}
+
+_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+
+class ImageRejected(ValueError):
+    """디코드하지 않고 거절한 업로드 (형식, 해상도)."""
+
+
+class ImageBusy(RuntimeError):
+    """디코드 메모리 한도가 차 있어 지금은 처리할 수 없습니다. retry_after초 뒤에 다시 시도하면 됩니다."""
+
+    def __init__(self, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"지금은 사진을 처리하는 요청이 많습니다. {self.retry_after}초 후 다시 시도해주세요.")
+
+
+class DecodeBudget:
+    """워커 안에서 동시에 디코드 중인 이미지의 예상 메모리 합계를 max_bytes 이하로 유지합니다."""
+
+    def __init__(self, max_bytes=DECODE_BUDGET_BYTES, timeout=DECODE_WAIT):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        if nbytes > self.max_bytes:
+            raise ImageRejected(f"이미지가 너무 커서 처리할 수 없습니다. (디코드에 약 {nbytes // (1024 * 1024)}MB 필요)")
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_use + nbytes <= self.max_bytes, self.timeout):
+                raise ImageBusy(self.timeout)
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_use -= nbytes
+                self._cond.notify_all()
+
+
+decode_budget = DecodeBudget()
+
+
+class IngestedImage:
+    """축소/재인코딩이 끝난 이미지."""
+
+    def __init__(self, data, fmt, width, height):
+        self.data = data
+        self.format = fmt
+        self.width = width
+        self.height = height
+
+    @property
+    def extension(self):
+        return _EXTENSIONS.get(self.format, self.format.lower())
+
+    @property
+    def mime_type(self):
+        from PIL import Image
+        return Image.MIME.get(self.format, 'application/octet-stream')
+
+
+def open_image(stream, max_pixels=MAX_PIXELS):
+    """헤더만 읽어 형식과 크기를 확인한 PIL 이미지를 반환합니다. (픽셀은 아직 디코드하지 않음)"""
+    from PIL import Image, UnidentifiedImageError
+    try:
+        image = Image.open(stream)
+    except Image.DecompressionBombError:
+        raise ImageRejected("이미지 해상도가 너무 큽니다.")
+    except UnidentifiedImageError:
+        raise ImageRejected("이미지 파일을 인식할 수 없습니다.")
+    if image.format not in ALLOWED_FORMATS:
+        image.close()
+        raise ImageRejected(f"지원하지 않는 이미지 형식입니다: {image.format}")
+    width, height = image.size
+    if width * height > max_pixels:
+        image.close()
+        raise ImageRejected(f"이미지 해상도가 너무 큽니다 ({width}x{height}). {max_pixels // 1_000_000}MP 이하의 사진을 올려주세요.")
+    return image
+
+
+def decode_cost(image):
+    """디코드에 필요한 예상 메모리(바이트). 디코드한 픽셀과 회전/RGB 변환 사본 하나를 셉니다."""
+    width, height = image.size
+    return width * height * max(len(image.getbands()), 3) * 2
+
+
+def ingest_image(stream, max_edge=MAX_EDGE, fmt=IMAGE_FORMAT, quality=IMAGE_QUALITY, max_pixels=MAX_PIXELS,
+                 budget=None):
+    """업로드 스트림을 디코드해 EXIF 회전 반영, RGB 변환, 축소 후 fmt로 인코딩합니다."""
+    from PIL import Image, ImageOps
+    budget = budget or decode_budget
+    with open_image(stream, max_pixels) as image:
+        if image.format in ('JPEG', 'MPO'):
+            # JPEG는 가로/세로가 모두 max_edge 이상으로 남는 가장 작은 배율(1/2, 1/4, 1/8)로 디코드합니다.
+            image.draft('RGB', (max_edge, max_edge))
+        with budget.reserve(decode_cost(image)):
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            buf = BytesIO()
+            image.save(buf, fmt, quality=quality, optimize=True)
+            return IngestedImage(buf.getvalue(), fmt, image.width, image.height)
+
+
+def _decode_gauges():
+    yield 'petai_image_decode_bytes', '디코드 중인 이미지의 예상 메모리(바이트)', decode_budget.in_use
+
+
+metrics.REGISTRY.add_collector(_decode_gauges)
+
+
+def guess_mime_type(path):
+    return mimetypes.guess_type(path)[0] or 'image/jpeg'
+
+
+def wait_for_file_active(genai, file, timeout=30.0, initial_delay=0.25, max_delay=2.0):
+    """Files API에 올린 파일이 PROCESSING 상태를 벗어날 때까지 지수 백오프로 기다립니다."""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while file.state.name == "PROCESSING":
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"업로드한 파일이 {timeout}초 안에 준비되지 않았습니다: {file.name}")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        file = genai.get_file(file.name)
+    if file.state.name == "FAILED":
+        raise RuntimeError(f"업로드한 파일 처리에 실패했습니다: {file.name}")
+    return file
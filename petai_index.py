@@ -0,0 +1,185 @@
+# petai_index.py
+"""
+질병 키워드 인덱스.
+diseases.image_labels의 모든 키워드를 Aho-Corasick 오토마톤 하나로 컴파일해 두고,
+Gemini 라벨을 한 번만 훑어서 일치하는 질병을 찾습니다.
+diseases 테이블이 바뀌면 disease_version 값이 올라가고, 인덱스는 그때만 다시 만들어집니다.
+"""
+import threading
+import time
+from collections import deque
+
+from petai_db import get_connection, dict_cursor
+
+
+class KeywordMatcher:
+    """Aho-Corasick 오토마톤. 겹치는 키워드도 모두 찾아 연결된 값을 반환합니다."""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        self._built = False
+
+    def add(self, keyword, value):
+        if not keyword:
+            return
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            state = nxt
+        self._out[state].add(value)
+        self._built = False
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+        self._built = True
+        return self
+
+    def find(self, text):
+        """text 안에 등장하는 모든 키워드의 값 집합을 반환합니다."""
+        if not self._built:
+            self.build()
+        found = set()
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+def install_version_tracking(cur, postgres):
+    """diseases 변경 시 disease_version.version을 올리는 테이블과 트리거를 만듭니다."""
+    cur.execute("CREATE TABLE IF NOT EXISTS disease_version (id INTEGER PRIMARY KEY, version BIGINT NOT NULL)")
+    if postgres:
+        cur.execute("INSERT INTO disease_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION bump_disease_version() RETURNS trigger AS $$
+            BEGIN
+                UPDATE disease_version SET version = version + 1 WHERE id = 1;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cur.execute("DROP TRIGGER IF EXISTS diseases_version_bump ON diseases")
+        cur.execute('''
+            CREATE TRIGGER diseases_version_bump
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON diseases
+            FOR EACH STATEMENT EXECUTE PROCEDURE bump_disease_version()
+        ''')
+    else:
+        cur.execute("INSERT OR IGNORE INTO disease_version (id, version) VALUES (1, 0)")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cur.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS diseases_version_{event.lower()}
+                AFTER {event} ON diseases
+                BEGIN
+                    UPDATE disease_version SET version = version + 1 WHERE id = 1;
+                END
+            ''')
+
+
+def current_version():
+    """diseases 테이블의 현재 버전. 버전 테이블이 없으면 (행 수, 최대 id)로 대신합니다."""
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT version FROM disease_version WHERE id = 1")
+            row = cur.fetchone()
+            if row is not None:
+                return ('version', row[0])
+    except Exception:
+        pass
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), MAX(id) FROM diseases")
+        count, max_id = cur.fetchone()
+        return ('rows', count, max_id)
+
+
+def load_diseases():
+    with get_connection() as conn:
+        cur = dict_cursor(conn)
+        cur.execute("SELECT * FROM diseases ORDER BY id")
+        # PostgreSQL의 검색용 생성 컬럼(search_vector)은 빼고 질병 정보만 남깁니다.
+        return [{k: v for k, v in dict(row).items() if k != 'search_vector'} for row in cur.fetchall()]
+
+
+class DiseaseIndex:
+    """diseases 테이블을 메모리에 올려 두고 image_labels 키워드로 질병을 찾습니다."""
+
+    def __init__(self, recheck_seconds=5.0, version_func=current_version, loader=load_diseases):
+        self.recheck_seconds = recheck_seconds
+        self._version_func = version_func
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        # (질병 dict, 매처)를 한 튜플로 교체해 읽는 쪽이 항상 같은 세대를 보도록 합니다.
+        self._snapshot = ({}, KeywordMatcher().build())
+
+    def _rebuild(self, version):
+        diseases = {}
+        matcher = KeywordMatcher()
+        for disease in self._loader():
+            diseases[disease['id']] = disease
+            for keyword in (disease.get('image_labels') or '').split(','):
+                matcher.add(keyword.strip(), disease['id'])
+        self._snapshot = (diseases, matcher.build())
+        self._version = version
+        print(f"INFO: 질병 키워드 인덱스 재생성 완료 ({len(diseases)}개 질병, version={version})")
+
+    def refresh_due(self):
+        """버전을 다시 확인할 때가 되었는지. (비동기 모드는 이때만 스레드에서 refresh를 부릅니다)"""
+        return self._version is None or time.monotonic() - self._checked_at >= self.recheck_seconds
+
+    def refresh(self, force=False):
+        """recheck_seconds마다 한 번 버전을 확인하고, 바뀌었으면 인덱스를 다시 만듭니다."""
+        now = time.monotonic()
+        if not force and self._version is not None and now - self._checked_at < self.recheck_seconds:
+            return
+        with self._lock:
+            if not force and self._version is not None and now - self._checked_at < self.recheck_seconds:
+                return
+            version = self._version_func()
+            if force or version != self._version:
+                self._rebuild(version)
+            self._checked_at = now
+
+    def __len__(self):
+        self.refresh()
+        return len(self._snapshot[0])
+
+    def all(self):
+        """모든 질병 목록(id 순)."""
+        self.refresh()
+        diseases, _ = self._snapshot
+        return [dict(diseases[i]) for i in sorted(diseases)]
+
+    def match(self, label):
+        """label에 키워드가 포함된 질병 목록(id 순)을 반환합니다."""
+        self.refresh()
+        diseases, matcher = self._snapshot
+        return [dict(diseases[i]) for i in sorted(matcher.find(label or ''))]
+
+
+disease_index = DiseaseIndex()
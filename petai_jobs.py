@@ -0,0 +1,139 @@
+# petai_jobs.py
+"""
+분석 작업 큐.
+/analyze 요청은 작업을 큐에 넣고 job id만 돌려받으며, 실제 분석은 백엔드에서 수행됩니다.
+
+- ThreadJobBackend: 프로세스 내부 스레드 풀 (기본값, JOB_BACKEND=thread)
+- RQJobBackend: Redis + RQ 워커 (JOB_BACKEND=rq, Procfile의 `worker: rq worker`)
+
+주의: 스레드 백엔드의 작업 상태는 해당 프로세스 메모리에만 존재합니다.
+gunicorn 워커를 여러 개 띄우는 환경에서는 RQ 백엔드를 사용하세요.
+"""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = 'queued'
+JOB_STARTED = 'started'
+JOB_FINISHED = 'finished'
+JOB_FAILED = 'failed'
+
+
+class ThreadJobBackend:
+    """프로세스 내부 스레드 풀에서 작업을 실행하는 기본 백엔드."""
+
+    def __init__(self, max_workers=4, result_ttl=3600):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='petai-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.result_ttl = result_ttl
+
+    def enqueue(self, func, *args):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {"status": JOB_QUEUED, "result": None, "error": None, "updated_at": time.time()}
+        self._prune()
+        # 요청의 contextvars(request id 등)를 작업 스레드로 넘깁니다.
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, func, args)
+        return job_id
+
+    def _run(self, job_id, func, args):
+        self._update(job_id, status=JOB_STARTED)
+        try:
+            result = func(*args)
+        except Exception as e:
+            print(f"작업 {job_id} 실행 중 오류 발생: {e}")
+            self._update(job_id, status=JOB_FAILED, error=str(e))
+        else:
+            self._update(job_id, status=JOB_FINISHED, result=result)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def _prune(self):
+        """result_ttl이 지난 완료/실패 작업을 메모리에서 제거합니다."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in (JOB_FINISHED, JOB_FAILED) and job["updated_at"] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        """작업 상태를 {'status', 'result', 'error'} 형태로 반환합니다. 없으면 None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {"status": job["status"], "result": job["result"], "error": job["error"]}
+
+
+class RQJobBackend:
+    """Redis 큐에 작업을 넣고 별도의 `rq worker` 프로세스가 실행하는 백엔드."""
+
+    # RQ의 세부 상태를 이 모듈의 네 가지 상태로 단순화합니다.
+    _STATUS_MAP = {
+        'queued': JOB_QUEUED, 'deferred': JOB_QUEUED, 'scheduled': JOB_QUEUED,
+        'started': JOB_STARTED,
+        'finished': JOB_FINISHED,
+        'failed': JOB_FAILED, 'stopped': JOB_FAILED, 'canceled': JOB_FAILED,
+    }
+
+    def __init__(self, connection=None, queue_name='default', result_ttl=3600, job_timeout=300, is_async=True):
+        from rq import Queue
+        if connection is None:
+            from redis import Redis
+            connection = Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379'))
+        self.queue = Queue(queue_name, connection=connection, is_async=is_async)
+        self.result_ttl = result_ttl
+        self.job_timeout = job_timeout
+
+    def enqueue(self, func, *args):
+        job = self.queue.enqueue(func, *args, result_ttl=self.result_ttl,
+                                 failure_ttl=self.result_ttl, job_timeout=self.job_timeout)
+        return job.id
+
+    def get(self, job_id):
+        from rq.exceptions import NoSuchJobError
+        from rq.job import Job
+        try:
+            job = Job.fetch(job_id, connection=self.queue.connection)
+        except NoSuchJobError:
+            return None
+        status = self._STATUS_MAP.get(str(getattr(job.get_status(), 'value', job.get_status())), JOB_QUEUED)
+        result, error = None, None
+        if status == JOB_FINISHED:
+            result = job.return_value()
+        elif status == JOB_FAILED and job.exc_info:
+            error = job.exc_info.strip().splitlines()[-1]
+        return {"status": status, "result": result, "error": error}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """JOB_BACKEND 환경 변수에 따라 작업 백엔드를 한 번만 생성해 반환합니다."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                kind = os.environ.get('JOB_BACKEND', 'thread').lower()
+                if kind == 'rq':
+                    _backend = RQJobBackend()
+                else:
+                    _backend = ThreadJobBackend(max_workers=int(os.environ.get('JOB_WORKERS', 4)))
+    return _backend
+
+
+def set_backend(backend):
+    """테스트 등에서 백엔드를 직접 교체할 때 사용합니다."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,586 @@
+# petai_llm.py
+"""
+Gemini 호출 제한기.
+모든 generate_content/upload_file 호출은 GeminiLimiter를 거쳐 아래 순서로 실행됩니다.
+
+1. 서킷 브레이커: 재시도할 만한 오류(429/5xx)가 연속으로 쌓이면 reset_seconds 동안 호출하지 않고 바로 거절합니다.
+2. 동시 호출 수 제한: 프로세스당 max_inflight개까지만 동시에 호출하고, 대기열이 max_queue를 넘으면 바로 거절합니다.
+3. 토큰 버킷: 분당 호출 수(rpm)를 여러 프로세스가 함께 지킵니다. (Redis 또는 SQLite 파일)
+4. 재시도: 429/5xx와 연결 오류는 지수 백오프(full jitter)로 max_retries번까지 다시 시도합니다.
+
+거절되면 GeminiUnavailable(retry_after 초)을 던지며, 웹 요청은 503과 Retry-After 헤더로 응답합니다.
+
+    response = get_limiter().call(model.generate_content, prompt)
+
+환경 변수
+    GEMINI_RPM               분당 최대 호출 수 (기본값 600, 0이면 제한 없음)
+    GEMINI_BURST             한 번에 몰아 쓸 수 있는 호출 수 (기본값 20)
+    GEMINI_RATE_BACKEND      redis | sqlite | memory (기본값: REDIS_URL이 있으면 redis, 없으면 sqlite)
+    GEMINI_RATE_PATH         sqlite 버킷 파일 경로 (기본값: 임시 디렉터리의 petai_gemini_rate.db)
+    GEMINI_MAX_INFLIGHT      프로세스당 동시 호출 수 (기본값 8)
+    GEMINI_MAX_QUEUE         프로세스당 대기 호출 수 (기본값 32)
+    GEMINI_QUEUE_TIMEOUT     자리와 토큰을 기다리는 최대 시간(초, 기본값 10)
+    GEMINI_MAX_RETRIES       재시도 횟수 (기본값 3)
+    GEMINI_BREAKER_FAILURES  브레이커를 여는 연속 실패 수 (기본값 5)
+    GEMINI_BREAKER_RESET     브레이커가 열려 있는 시간(초, 기본값 30)
+    GEMINI_ASYNC_MAX_INFLIGHT / GEMINI_ASYNC_MAX_QUEUE   비동기 모드(asgi.py)의 동시 호출 수 / 대기 수 (기본값 64 / 512)
+
+동시 호출 수와 브레이커 상태는 프로세스(gunicorn 워커, RQ 워커)마다 따로 관리됩니다.
+"""
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import petai_metrics as metrics
+
+# 재시도할 HTTP 상태 코드 (google.api_core 예외의 code 속성)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+retries_total = metrics.REGISTRY.register(metrics.Counter(
+    'petai_gemini_retries_total', 'Gemini 호출 재시도 수', ('reason',)))
+rejected_total = metrics.REGISTRY.register(metrics.Counter(
+    'petai_gemini_rejected_total', '제한기가 거절한 Gemini 호출 수', ('reason',)))
+
+
+class GeminiUnavailable(RuntimeError):
+    """제한기가 호출을 거절했습니다. retry_after초 뒤에 다시 시도하면 됩니다."""
+
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Gemini 요청이 많아 처리할 수 없습니다 ({reason}). {self.retry_after}초 후 다시 시도해주세요.")
+
+
+def is_retryable(error):
+    """429/5xx 응답, 시간 초과, 연결 오류이면 True. (REST 전송의 requests Timeout/ConnectionError 포함)"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__module__.startswith('requests') and cls.__name__ in ('Timeout', 'ConnectionError')
+               for cls in type(error).__mro__)
+
+
+def _record_stream_error(breaker, error):
+    """스트리밍 응답을 읽는 도중 난 오류를 브레이커에 기록합니다. (재시도 대상 오류만 실패로 셉니다)"""
+    if is_retryable(error):
+        print(f"경고: Gemini 스트리밍 응답 도중 오류가 발생했습니다: {error}")
+        breaker.record_failure()
+    else:
+        breaker.release()
+
+
+class GuardedStream:
+    """
+    stream_in_slot()이 돌려주는 스트리밍 응답. 조각을 끝까지 읽으면 브레이커에 성공을,
+    도중에 429/5xx 등이 나면 실패를 기록합니다. 원래 응답(사용량 정보 등)은 response 속성에 있습니다.
+    """
+
+    def __init__(self, breaker, response):
+        self.breaker = breaker
+        self.response = response
+
+    def __iter__(self):
+        try:
+            yield from self.response
+        except GeneratorExit:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            _record_stream_error(self.breaker, e)
+            raise
+        self.breaker.record_success()
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.response:
+                yield chunk
+        except GeneratorExit:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            _record_stream_error(self.breaker, e)
+            raise
+        self.breaker.record_success()
+
+
+# --- 토큰 버킷 ---
+# try_acquire()는 토큰을 하나 얻었으면 0, 아니면 다음 토큰까지 기다려야 할 시간(초)을 반환합니다.
+def _refill(tokens, updated, now, rate, burst):
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryTokenBucket:
+    """프로세스 안에서만 공유되는 토큰 버킷 (테스트, 단일 프로세스용)."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            now = self._clock()
+            self._tokens = _refill(self._tokens, self._updated, now, self.rate, self.burst)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class SQLiteTokenBucket:
+    """SQLite 파일 하나를 같은 서버의 모든 프로세스가 함께 쓰는 토큰 버킷. BEGIN IMMEDIATE로 한 번에 하나만 갱신합니다."""
+
+    def __init__(self, path, rate, burst, name='gemini', clock=time.time):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self._clock = clock
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def try_acquire(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = self._clock()
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens = _refill(row[0], row[1], now, self.rate, self.burst) if row else float(self.burst)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute("INSERT OR REPLACE INTO rate_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                         (self.name, tokens, now))
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+class RedisTokenBucket:
+    """Redis 해시 하나를 여러 서버가 함께 쓰는 토큰 버킷. WATCH/MULTI로 갱신하고, 충돌하면 다시 시도합니다."""
+
+    def __init__(self, connection, rate, burst, key='petai:gemini:bucket'):
+        self.connection = connection
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+
+    def try_acquire(self):
+        from redis.exceptions import WatchError
+        while True:
+            with self.connection.pipeline() as pipe:
+                try:
+                    pipe.watch(self.key)
+                    seconds, micros = pipe.time()
+                    now = seconds + micros / 1e6
+                    state = pipe.hgetall(self.key)
+                    if state:
+                        tokens = _refill(float(state[b'tokens']), float(state[b'updated']), now, self.rate, self.burst)
+                    else:
+                        tokens = float(self.burst)
+                    wait = 0.0
+                    if tokens >= 1:
+                        tokens -= 1
+                    else:
+                        wait = (1 - tokens) / self.rate
+                    pipe.multi()
+                    pipe.hset(self.key, mapping={'tokens': tokens, 'updated': now})
+                    # 버킷이 가득 찰 시간이 지나면 키를 지웁니다. (없으면 가득 찬 버킷과 같음)
+                    pipe.expire(self.key, max(1, math.ceil(self.burst / self.rate)))
+                    pipe.execute()
+                    return wait
+                except WatchError:
+                    continue
+
+
+# --- 서킷 브레이커 ---
+class CircuitBreaker:
+    """
+    closed: 정상 호출. failure_threshold번 연속 실패하면 open.
+    open: reset_seconds 동안 모든 호출을 거절. 시간이 지나면 half_open.
+    half_open: 시험 호출 한 개만 허용. 성공하면 closed, 실패하면 다시 open.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def retry_after(self):
+        """지금 호출하면 거절될 경우 기다려야 할 시간(초), 호출할 수 있으면 0."""
+        with self._lock:
+            if self.state == self.OPEN:
+                return max(0.0, self._opened_at + self.reset_seconds - self._clock())
+            if self.state == self.HALF_OPEN and self._trial_running:
+                return 1.0
+            return 0.0
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_seconds - self._clock()
+                if remaining > 0:
+                    raise GeminiUnavailable('circuit_open', remaining)
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._trial_running:
+                    raise GeminiUnavailable('circuit_half_open', 1.0)
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"경고: Gemini 오류가 {self._failures}번 연속 발생해 {self.reset_seconds}초 동안 호출을 멈춥니다.")
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+            self._trial_running = False
+
+    def release(self):
+        """재시도 대상이 아닌 오류로 끝난 시험 호출의 자리를 돌려놓습니다."""
+        with self._lock:
+            self._trial_running = False
+
+
+# --- 제한기 ---
+class GeminiLimiter:
+    def __init__(self, bucket=None, max_inflight=8, max_queue=32, queue_timeout=10.0, max_retries=3,
+                 backoff_base=0.5, backoff_cap=8.0, breaker=None, sleep=time.sleep):
+        self.bucket = bucket
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.waiting = 0
+
+    def _reject(self, reason, retry_after):
+        rejected_total.inc(reason=reason)
+        return GeminiUnavailable(reason, retry_after)
+
+    def check_admission(self):
+        """새 분석을 받아도 되는지 미리 확인합니다. 브레이커가 열려 있거나 대기열이 가득 차면 GeminiUnavailable."""
+        wait = self.breaker.retry_after()
+        if wait > 0:
+            raise self._reject('circuit_open', wait)
+        with self._lock:
+            if self.inflight >= self.max_inflight and self.waiting >= self.max_queue:
+                raise self._reject('queue_full', self.queue_timeout)
+
+    @contextmanager
+    def slot(self):
+        """동시 호출 자리 하나를 잡습니다. 스트리밍 응답처럼 호출 뒤에도 연결을 쓰는 동안 자리를 유지할 때 씁니다."""
+        with self._lock:
+            if self.inflight >= self.max_inflight and self.waiting >= self.max_queue:
+                raise self._reject('queue_full', self.queue_timeout)
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            raise self._reject('queue_timeout', self.queue_timeout)
+        with self._lock:
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+            self._slots.release()
+
+    def _take_token(self, deadline):
+        if self.bucket is None:
+            return
+        while True:
+            wait = self.bucket.try_acquire()
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise self._reject('rate_limited', wait)
+            self._sleep(wait)
+
+    def backoff(self, attempt):
+        """attempt번째 재시도 전 대기 시간 (full jitter)."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def call_in_slot(self, func, *args, **kwargs):
+        """이미 slot()을 잡은 상태에서 브레이커, 토큰 버킷, 재시도를 거쳐 func를 호출합니다."""
+        return self._call_in_slot(func, args, kwargs)
+
+    def stream_in_slot(self, func, *args, **kwargs):
+        """
+        call_in_slot의 스트리밍 버전. 응답을 GuardedStream으로 감싸, 조각을 읽는 도중의 오류도 브레이커에 기록합니다.
+        브레이커의 성공은 응답을 끝까지 읽었을 때 기록됩니다.
+        """
+        return GuardedStream(self.breaker, self._call_in_slot(func, args, kwargs, defer_success=True))
+
+    def _call_in_slot(self, func, args, kwargs, defer_success=False):
+        deadline = time.monotonic() + self.queue_timeout
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.breaker.before_call()
+            except GeminiUnavailable as e:
+                rejected_total.inc(reason=e.reason)
+                raise
+            try:
+                self._take_token(deadline)
+                result = func(*args, **kwargs)
+            except GeminiUnavailable:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                retries_total.inc(reason=str(getattr(e, 'code', None) or type(e).__name__))
+                delay = self.backoff(attempt)
+                print(f"경고: Gemini 호출 실패 ({e}), {delay:.2f}초 후 다시 시도합니다. ({attempt + 1}/{self.max_retries})")
+                self._sleep(delay)
+                deadline = max(deadline, time.monotonic() + self.queue_timeout)
+            else:
+                if not defer_success:
+                    self.breaker.record_success()
+                return result
+
+    def call(self, func, *args, **kwargs):
+        """func(*args, **kwargs)를 제한 안에서 호출합니다."""
+        with self.slot():
+            return self.call_in_slot(func, *args, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {"inflight": self.inflight, "waiting": self.waiting, "breaker": self.breaker.state}
+
+
+class AsyncGeminiLimiter:
+    """
+    비동기 서빙 모드(asgi.py)용 제한기. 자리를 기다리는 동안 스레드를 잡지 않으므로 동시 호출 수를 크게 잡을 수 있습니다.
+    토큰 버킷과 서킷 브레이커는 sync 제한기(shared)의 것을 함께 써서, 분당 호출 수와 장애 판단이 두 모드에 공통입니다.
+    """
+
+    def __init__(self, shared, max_inflight=64, max_queue=512):
+        self.shared = shared
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self._slots = None
+        self.inflight = 0
+        self.waiting = 0
+
+    def _semaphore(self):
+        # asyncio.Semaphore는 처음 쓴 이벤트 루프에 묶이므로 루프마다 하나씩 만듭니다.
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.max_inflight))
+        return self._slots[1]
+
+    def check_admission(self):
+        wait = self.shared.breaker.retry_after()
+        if wait > 0:
+            raise self.shared._reject('circuit_open', wait)
+        if self.inflight >= self.max_inflight and self.waiting >= self.max_queue:
+            raise self.shared._reject('queue_full', self.shared.queue_timeout)
+
+    @asynccontextmanager
+    async def slot(self):
+        import asyncio
+        self.check_admission()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore().acquire(), self.shared.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self.shared._reject('queue_timeout', self.shared.queue_timeout)
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._semaphore().release()
+
+    async def _take_token(self, deadline):
+        import asyncio
+        bucket = self.shared.bucket
+        if bucket is None:
+            return
+        while True:
+            # SQLite/Redis 버킷은 짧은 I/O이지만 이벤트 루프를 막지 않도록 스레드에서 확인합니다.
+            wait = bucket.try_acquire() if isinstance(bucket, MemoryTokenBucket) else \
+                await asyncio.to_thread(bucket.try_acquire)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise self.shared._reject('rate_limited', wait)
+            await asyncio.sleep(wait)
+
+    async def call_in_slot(self, func, *args, **kwargs):
+        """GeminiLimiter.call_in_slot의 비동기 버전. func는 코루틴 함수입니다."""
+        return await self._call_in_slot(func, args, kwargs)
+
+    async def stream_in_slot(self, func, *args, **kwargs):
+        """GeminiLimiter.stream_in_slot의 비동기 버전. 돌려받은 GuardedStream은 async for로 읽습니다."""
+        return GuardedStream(self.shared.breaker, await self._call_in_slot(func, args, kwargs, defer_success=True))
+
+    async def _call_in_slot(self, func, args, kwargs, defer_success=False):
+        import asyncio
+        breaker = self.shared.breaker
+        deadline = time.monotonic() + self.shared.queue_timeout
+        for attempt in range(self.shared.max_retries + 1):
+            try:
+                breaker.before_call()
+            except GeminiUnavailable as e:
+                rejected_total.inc(reason=e.reason)
+                raise
+            try:
+                await self._take_token(deadline)
+                result = await func(*args, **kwargs)
+            except GeminiUnavailable:
+                breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if attempt == self.shared.max_retries:
+                    raise
+                retries_total.inc(reason=str(getattr(e, 'code', None) or type(e).__name__))
+                delay = self.shared.backoff(attempt)
+                print(f"경고: Gemini 호출 실패 ({e}), {delay:.2f}초 후 다시 시도합니다. ({attempt + 1}/{self.shared.max_retries})")
+                await asyncio.sleep(delay)
+                deadline = max(deadline, time.monotonic() + self.shared.queue_timeout)
+            else:
+                if not defer_success:
+                    breaker.record_success()
+                return result
+
+    async def call(self, func, *args, **kwargs):
+        async with self.slot():
+            return await self.call_in_slot(func, *args, **kwargs)
+
+    def stats(self):
+        return {"inflight": self.inflight, "waiting": self.waiting, "breaker": self.shared.breaker.state}
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def make_bucket(rpm, burst):
+    """GEMINI_RATE_BACKEND에 따라 토큰 버킷을 만듭니다. rpm이 0이면 None(제한 없음)."""
+    if rpm <= 0:
+        return None
+    rate = rpm / 60.0
+    kind = os.environ.get('GEMINI_RATE_BACKEND') or ('redis' if os.environ.get('REDIS_URL') else 'sqlite')
+    if kind == 'redis':
+        from redis import Redis
+        return RedisTokenBucket(Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379')), rate, burst)
+    if kind == 'sqlite':
+        path = os.environ.get('GEMINI_RATE_PATH') or os.path.join(tempfile.gettempdir(), 'petai_gemini_rate.db')
+        return SQLiteTokenBucket(path, rate, burst)
+    return MemoryTokenBucket(rate, burst)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """환경 변수 설정으로 제한기를 한 번만 만들어 반환합니다."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = GeminiLimiter(
+                    bucket=make_bucket(_env_float('GEMINI_RPM', 600), _env_float('GEMINI_BURST', 20)),
+                    max_inflight=int(os.environ.get('GEMINI_MAX_INFLIGHT', 8)),
+                    max_queue=int(os.environ.get('GEMINI_MAX_QUEUE', 32)),
+                    queue_timeout=_env_float('GEMINI_QUEUE_TIMEOUT', 10),
+                    max_retries=int(os.environ.get('GEMINI_MAX_RETRIES', 3)),
+                    breaker=CircuitBreaker(int(os.environ.get('GEMINI_BREAKER_FAILURES', 5)),
+                                           _env_float('GEMINI_BREAKER_RESET', 30)),
+                )
+    return _limiter
+
+
+def set_limiter(limiter):
+    """테스트 등에서 제한기를 직접 교체할 때 사용합니다. None이면 다음 호출 때 환경 변수로 다시 만듭니다."""
+    global _limiter, _async_limiter
+    _limiter = limiter
+    _async_limiter = None
+
+
+_async_limiter = None
+
+
+def get_async_limiter():
+    """
+    비동기 모드 제한기 (GEMINI_ASYNC_MAX_INFLIGHT 기본값 64, GEMINI_ASYNC_MAX_QUEUE 기본값 512).
+    토큰 버킷과 브레이커는 get_limiter()의 것을 함께 씁니다.
+    """
+    global _async_limiter
+    if _async_limiter is None or _async_limiter.shared is not get_limiter():
+        _async_limiter = AsyncGeminiLimiter(
+            get_limiter(),
+            max_inflight=int(os.environ.get('GEMINI_ASYNC_MAX_INFLIGHT', 64)),
+            max_queue=int(os.environ.get('GEMINI_ASYNC_MAX_QUEUE', 512)),
+        )
+    return _async_limiter
+
+
+def _limiter_gauges():
+    if _limiter is None:
+        return
+    stats = _limiter.stats()
+    yield 'petai_gemini_inflight', '진행 중인 Gemini 호출 수', stats['inflight']
+    yield 'petai_gemini_waiting', '자리를 기다리는 Gemini 호출 수', stats['waiting']
+    yield 'petai_gemini_circuit_open', 'Gemini 서킷 브레이커가 열려 있으면 1', int(stats['breaker'] != CircuitBreaker.CLOSED)
+
+
+metrics.REGISTRY.add_collector(_limiter_gauges)
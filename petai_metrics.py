@@ -0,0 +1,258 @@
+# petai_metrics.py
+"""
+지연 시간 계측과 Prometheus 지표.
+단계별 히스토그램, Gemini 토큰 수, 오류 카운터를 프로세스 메모리에 모으고 /metrics에서 Prometheus 텍스트 형식으로 내보냅니다.
+요청마다 request id를 붙여 JSON 한 줄 로그를 남기며, 파이프라인/작업 스레드에도 같은 id가 전달됩니다.
+기록 한 번은 잠금 한 번과 이진 탐색 한 번이므로 운영 환경에서 켜 두어도 부담이 거의 없습니다.
+
+    with metrics.stage('gemini_vision'):
+        response = model.generate_content(...)
+    metrics.record_gemini_usage(model_name, response)
+
+환경 변수
+    LOG_JSON   1(기본값)이면 요청마다 JSON 접근 로그를 출력합니다. 0이면 끕니다.
+
+gunicorn 워커가 여러 개라면 지표는 워커별로 따로 모입니다.
+"""
+import bisect
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+request_id_var = contextvars.ContextVar('petai_request_id', default=None)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(n, '')) for n in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [버킷별 개수..., 합계, 개수]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(tuple(str(labels.get(n, '')) for n in self.labelnames))
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, func):
+        """render()할 때마다 func()가 (이름, 설명, 값) 목록을 반환하면 gauge로 내보냅니다."""
+        self._collectors.append(func)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for func in self._collectors:
+            try:
+                for name, documentation, value in func():
+                    lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+            except Exception as e:
+                print(f"지표 수집 중 오류 발생: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+stage_seconds = REGISTRY.register(Histogram(
+    'petai_stage_seconds', '분석 단계별 소요 시간(초)', ('stage', 'status')))
+request_seconds = REGISTRY.register(Histogram(
+    'petai_http_request_seconds', 'HTTP 요청 처리 시간(초)', ('method', 'endpoint', 'status')))
+errors_total = REGISTRY.register(Counter(
+    'petai_errors_total', '단계별 오류 수', ('stage', 'kind')))
+gemini_tokens_total = REGISTRY.register(Counter(
+    'petai_gemini_tokens_total', 'Gemini 사용 토큰 수', ('model', 'kind')))
+gemini_requests_total = REGISTRY.register(Counter(
+    'petai_gemini_requests_total', 'Gemini 호출 수', ('model', 'status')))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def render():
+    return REGISTRY.render()
+
+
+@contextmanager
+def stage(name):
+    """블록의 소요 시간을 stage 라벨로 기록합니다. 예외가 나면 status=error로 기록하고 오류 수를 늘린 뒤 다시 던집니다."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        stage_seconds.observe(time.perf_counter() - started, stage=name, status='error')
+        errors_total.inc(stage=name, kind=type(e).__name__)
+        raise
+    stage_seconds.observe(time.perf_counter() - started, stage=name, status='ok')
+
+
+def observe_pipeline_stage(name, seconds, status):
+    """petai_pipeline.add_stage_observer에 등록하는 관찰자."""
+    stage_seconds.observe(seconds, stage=name, status=status)
+    if status != 'ok':
+        errors_total.inc(stage=name, kind=status)
+
+
+def record_error(stage_name, error):
+    errors_total.inc(stage=stage_name, kind=type(error).__name__)
+    log_event('error', stage=stage_name, error=str(error))
+
+
+def record_gemini_usage(model, response, status='ok'):
+    """Gemini 응답의 usage_metadata에서 입력/출력 토큰 수를 더합니다. (스트리밍 응답은 다 읽은 뒤 호출)"""
+    gemini_requests_total.inc(model=model, status=status)
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for kind, attr in (('prompt', 'prompt_token_count'), ('candidates', 'candidates_token_count')):
+        count = getattr(usage, attr, 0) or 0
+        if count:
+            gemini_tokens_total.inc(count, model=model, kind=kind)
+
+
+# --- 요청 id와 JSON 로그 ---
+LOG_JSON = os.environ.get('LOG_JSON', '1').lower() not in ('0', 'false', 'off')
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+def log_event(event, **fields):
+    """{"ts", "event", "request_id", ...} 형태의 JSON 한 줄을 출력합니다."""
+    if not LOG_JSON:
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "request_id": request_id_var.get()}
+    record.update(fields)
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    sys.stdout.flush()
+
+
+def init_app(app):
+    """Flask 앱에 request id 부여, 요청 시간 측정, JSON 접근 로그를 연결합니다."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.petai_request_started = time.perf_counter()
+        g.petai_request_id = request.headers.get('X-Request-ID') or new_request_id()
+        g.petai_request_token = request_id_var.set(g.petai_request_id)
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('petai_request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_seconds.observe(elapsed, method=request.method, endpoint=endpoint, status=response.status_code)
+        response.headers['X-Request-ID'] = g.petai_request_id
+        if endpoint != '/metrics':
+            log_event('request', method=request.method, path=request.path, status=response.status_code,
+                      duration_ms=round(elapsed * 1000, 3))
+        return response
+
+    @app.teardown_request
+    def _reset_request_id(exc=None):
+        token = g.pop('petai_request_token', None)
+        if token is not None:
+            try:
+                request_id_var.reset(token)
+            except ValueError:
+                # 스트리밍 응답처럼 다른 컨텍스트에서 정리되는 경우
+                pass
@@ -0,0 +1,153 @@
+# petai_migrations.py
+"""
+버전 관리되는 스키마 마이그레이션.
+웹 워커는 DDL을 실행하지 않으며, 배포마다 한 번 아래 중 하나로 실행합니다.
+
+- gunicorn.conf.py의 on_starting 훅 (워커를 띄우기 전 마스터 프로세스에서 한 번)
+- Procfile의 `release: python setup_db.py`
+- 로컬: `python setup_db.py` 또는 `python app.py`
+
+적용된 버전은 schema_migrations 테이블에 기록되고, 이미 적용된 마이그레이션은 건너뜁니다.
+여러 프로세스가 동시에 실행해도 PostgreSQL은 advisory lock, SQLite는 BEGIN IMMEDIATE로 한 번에 하나만 적용합니다.
+"""
+from petai_db import get_connection, is_postgres, placeholder
+from petai_index import install_version_tracking
+from petai_search import install_search
+from petai_analyses import install_analyses, install_image_keys
+from petai_cache import install_cache_tables
+
+# pg_advisory_xact_lock 키 (임의의 고정값)
+ADVISORY_LOCK_KEY = 7_142_025_001
+
+# 초기 질병 데이터 (app.py와 setup_db.py가 함께 사용하는 유일한 정의)
+SEED_DISEASES = [
+    (
+        "알레르기성 피부염 (의심)",
+        "피부 발진,붉은 반점,탈모",
+        "가려움,핥음,비빔,발적",
+        "주의 🟡",
+        "사진과 증상으로 볼 때 '알레르기성 피부염'이 의심됩니다. 원인(사료, 간식, 집먼지 등)을 찾아보고, 증상이 지속되면 병원을 방문해 정확한 알레르기 원인을 찾는 것이 좋습니다."
+    ),
+    (
+        "백내장 (초기 의심)",
+        "흐릿한 눈,하얀 동공",
+        "눈을 잘 못 마주침,밤에 잘 부딪힘,눈이 뿌옇게 보임",
+        "경고 🔴",
+        "사진상 동공이 뿌옇게 보이는 것은 '백내장'의 초기 징후일 수 있습니다. 방치하면 시력을 잃을 수 있으니 즉시 안과 전문 동물병원을 방문하여 검사를 받으세요."
+    ),
+    (
+        "결막염 (의심)",
+        "붉은 눈,눈곱,눈물",
+        "눈을 찡그림,눈 주변을 비빔",
+        "주의 🟡",
+        "눈이 붉어지고 눈곱이 끼는 증상은 '결막염'일 수 있습니다. 세균 감염이나 알레르기 때문일 수 있으니, 병원에서 안약을 처방받아 치료하는 것이 좋습니다."
+    ),
+    (
+        "정상 피부",
+        "정상 피부",
+        "특별한 증상 없음",
+        "안전 🟢",
+        "사진과 증상으로는 특별한 이상 징후가 보이지 않습니다. 건강한 상태로 보입니다. 하지만 평소와 다른 행동을 보인다면 주의 깊게 관찰해주세요."
+    ),
+    (
+        "고양이 허피스 바이러스 (상부 호흡기 감염)",
+        "눈곱,콧물,재채기,눈 부음",
+        "재채기,콧물,눈물,식욕부진",
+        "주의 🟡",
+        "고양이 허피스 바이러스는 상부 호흡기 감염(고양이 감기)의 주요 원인입니다. 전염성이 매우 강하므로 다른 고양이와 격리하고, 습도를 높여주어 호흡을 편안하게 해주세요. 증상이 심하거나 2-3일 내에 개선되지 않으면 즉시 병원을 방문하여 항바이러스 치료를 받는 것이 중요합니다."
+    ),
+    (
+        "슬개골 탈구 (강아지)",
+        "다리를 절음,깽깽이걸음,다리를 들고 뜀",
+        "깽깽이걸음,다리를 절음,무릎에서 소리가 남",
+        "경고 🔴",
+        "깽깽이걸음이나 다리를 저는 증상은 슬개골 탈구의 대표적인 증상입니다. 특히 소형견에게 흔하게 발생합니다. 방치할 경우 관절염으로 악화될 수 있으니, 정형외과 전문 동물병원에서 정확한 단계를 진단받고 수술 여부를 상담하는 것이 좋습니다."
+    ),
+]
+
+INSERT_DISEASE = "INSERT INTO diseases (disease_name, image_labels, text_symptoms, warning_level, advice) VALUES ({p},{p},{p},{p},{p})"
+
+
+def _create_diseases(cur, postgres):
+    id_column = "id SERIAL PRIMARY KEY" if postgres else "id INTEGER PRIMARY KEY AUTOINCREMENT"
+    cur.execute(f'''
+        CREATE TABLE IF NOT EXISTS diseases (
+            {id_column},
+            disease_name TEXT NOT NULL,
+            image_labels TEXT,
+            text_symptoms TEXT,
+            warning_level TEXT,
+            advice TEXT
+        )
+    ''')
+
+
+def _seed_diseases(cur, postgres):
+    """이름이 같은 질병이 없는 초기 데이터만 넣습니다. (예전 setup_db.py로 만든 4개짜리 DB도 나머지를 채웁니다)"""
+    cur.execute("SELECT disease_name FROM diseases")
+    existing = {row[0] for row in cur.fetchall()}
+    missing = [row for row in SEED_DISEASES if row[0] not in existing]
+    if missing:
+        cur.executemany(INSERT_DISEASE.format(p=placeholder()), missing)
+
+
+# (버전, 이름, 함수(cur, postgres)) - 한 번 배포된 항목은 수정하지 말고 새 버전을 추가하세요.
+MIGRATIONS = [
+    (1, 'create_diseases', _create_diseases),
+    (2, 'disease_version_tracking', install_version_tracking),
+    (3, 'seed_diseases', _seed_diseases),
+    (4, 'symptom_search', install_search),
+    (5, 'analyses', install_analyses),
+    (6, 'analysis_image_keys', install_image_keys),
+    (7, 'cache_tables', install_cache_tables),
+]
+
+
+def _lock(cur, postgres):
+    if postgres:
+        # 트랜잭션이 끝나면(commit/rollback) 자동으로 풀립니다.
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (ADVISORY_LOCK_KEY,))
+    else:
+        cur.execute("BEGIN IMMEDIATE")
+
+
+def applied_versions(cur):
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def migrate(migrations=MIGRATIONS):
+    """적용되지 않은 마이그레이션을 순서대로 한 트랜잭션 안에서 적용하고, 새로 적용한 버전 목록을 반환합니다."""
+    postgres = is_postgres()
+    p = placeholder()
+    applied = []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        _lock(cur, postgres)
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        done = applied_versions(cur)
+        for version, name, func in sorted(migrations, key=lambda m: m[0]):
+            if version in done:
+                continue
+            func(cur, postgres)
+            cur.execute(f"INSERT INTO schema_migrations (version, name) VALUES ({p}, {p})", (version, name))
+            applied.append(version)
+            print(f"INFO: 마이그레이션 {version} ({name}) 적용 완료")
+    if not applied:
+        print("INFO: 적용할 마이그레이션이 없습니다.")
+    return applied
+
+
+def reset_seed_data():
+    """diseases를 비우고 초기 데이터만 다시 넣습니다. (setup_db.py --reset)"""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM diseases")
+        cur.executemany(INSERT_DISEASE.format(p=placeholder()), SEED_DISEASES)
+    print(f"INFO: {len(SEED_DISEASES)}개의 초기 질병 데이터로 다시 채웠습니다.")
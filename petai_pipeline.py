@@ -0,0 +1,244 @@
+# petai_pipeline.py
+"""
+분석 단계 의존성 그래프 실행기.
+의존 관계가 없는 단계는 스레드 풀에서 동시에 실행하고, 단계마다 제한 시간을 둡니다.
+제한 시간을 넘기거나 실패한 단계는 default 값으로 대체되어, 뒤의 단계는 부분 결과로 계속 진행합니다.
+
+    pipeline = Pipeline([
+        Stage('vision', lambda: analyze_image(path), timeout=30, default="이미지 분석 실패"),
+        Stage('db', search_db_by_image_label, deps=['vision']),
+        Stage('local', lambda: local_analysis(params, behaviors)),
+    ])
+    run = pipeline.run()
+    run.results['db'], run.errors, run.timings
+
+run(deadline=초)를 주면 전체 실행이 그 시간을 넘지 않습니다. 남은 단계는 모두 제한 시간 초과로 처리됩니다.
+await pipeline.run_async(deadline=초)는 같은 그래프를 이벤트 루프에서 실행합니다. 단계 함수가 코루틴을 반환하면 기다리고,
+결과/오류/단계 관찰자는 run()과 같습니다. (petai_aio)
+
+단계의 제한 시간은 스레드 풀에서 실제로 실행되기 시작한 때부터 잽니다. (풀이 밀려 기다린 시간은 전체 deadline에만 포함)
+제한 시간을 넘긴 단계의 스레드는 멈출 수 없으므로, Gemini 호출 단계(pool='gemini')와 DB/로컬 단계(pool='default')는
+서로 다른 스레드 풀에서 실행해 Gemini가 멈춰도 DB 검색이 자리를 기다리지 않게 합니다.
+
+환경 변수
+    PIPELINE_WORKERS         DB 검색/로컬 분석 단계 스레드 수 (기본값 8)
+    PIPELINE_GEMINI_WORKERS  Gemini 호출 단계 스레드 수 (기본값 GEMINI_MAX_INFLIGHT + GEMINI_MAX_QUEUE, 즉 40)
+"""
+import asyncio
+import contextvars
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class StageTimeout(Exception):
+    """단계가 제한 시간 안에 끝나지 않았을 때 errors에 기록됩니다."""
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), timeout=None, default=None, pool='default'):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.default = default
+        self.pool = pool
+
+
+class PipelineRun:
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+        self.timings = {}
+
+    def ok(self, name):
+        return name in self.results and name not in self.errors
+
+
+_observers = []
+
+
+def add_stage_observer(callback):
+    """단계가 끝날 때마다 callback(stage_name, seconds, status)를 호출합니다. status: ok | error | timeout"""
+    _observers.append(callback)
+
+
+def _notify(name, seconds, status):
+    for callback in list(_observers):
+        try:
+            callback(name, seconds, status)
+        except Exception as e:
+            print(f"단계 관찰자 호출 중 오류 발생: {e}")
+
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def _pool_size(pool):
+    if pool == 'gemini':
+        # 제한기가 받아 주는 호출(진행 중 + 대기열)마다 스레드가 하나씩 있으면, 그보다 많은 호출은 제한기가 바로 거절합니다.
+        default = int(os.environ.get('GEMINI_MAX_INFLIGHT', 8)) + int(os.environ.get('GEMINI_MAX_QUEUE', 32))
+        return int(os.environ.get('PIPELINE_GEMINI_WORKERS', default))
+    return int(os.environ.get('PIPELINE_WORKERS', 8))
+
+
+def get_executor(pool='default'):
+    """모든 파이프라인이 공유하는 스레드 풀. pool: default(DB 검색, 로컬 분석) | gemini(Gemini 호출)"""
+    executor = _executors.get(pool)
+    if executor is None:
+        with _executor_lock:
+            executor = _executors.get(pool)
+            if executor is None:
+                executor = _executors[pool] = ThreadPoolExecutor(max_workers=_pool_size(pool),
+                                                                 thread_name_prefix=f'petai-{pool}')
+    return executor
+
+
+class _Task:
+    """제출한 단계. 스레드에서 실행이 시작되면 started에 시각을 기록합니다."""
+
+    def __init__(self, stage, submitted):
+        self.stage = stage
+        self.submitted = submitted
+        self.started = None
+
+    def __call__(self, *args):
+        self.started = time.monotonic()
+        return self.stage.func(*args)
+
+    def since(self):
+        return self.started if self.started is not None else self.submitted
+
+
+# 아직 시작하지 않은 단계가 있으면 시작 시각을 확인하려고 이 간격마다 깨어납니다.
+_START_POLL = 0.05
+
+
+class Pipeline:
+    def __init__(self, stages, executor=None):
+        self.stages = list(stages)
+        names = {stage.name for stage in self.stages}
+        for stage in self.stages:
+            missing = [d for d in stage.deps if d not in names]
+            if missing:
+                raise ValueError(f"'{stage.name}' 단계의 의존 단계가 없습니다: {missing}")
+        self.executor = executor
+
+    def _executor(self, stage):
+        """executor를 주었으면 모든 단계에 그것을, 아니면 단계의 pool에 맞는 공유 풀을 씁니다."""
+        if self.executor is None:
+            return get_executor(stage.pool)
+        if isinstance(self.executor, dict):
+            return self.executor.get(stage.pool) or get_executor(stage.pool)
+        return self.executor
+
+    def _finish(self, run, stage, started, value=None, error=None, status='ok'):
+        elapsed = time.monotonic() - started
+        run.timings[stage.name] = elapsed
+        if error is not None:
+            run.results[stage.name] = stage.default
+            run.errors[stage.name] = error
+            print(f"'{stage.name}' 단계 {status}: {error}")
+        else:
+            run.results[stage.name] = value
+        _notify(stage.name, elapsed, status)
+
+    def run(self, deadline=None):
+        run = PipelineRun()
+        pending = list(self.stages)
+        running = {}
+        ends_at = time.monotonic() + deadline if deadline is not None else None
+
+        while pending or running:
+            # 의존 단계가 모두 끝난(성공이든 대체값이든) 단계를 제출합니다.
+            for stage in [s for s in pending if all(d in run.results for d in s.deps)]:
+                pending.remove(stage)
+                args = [run.results[d] for d in stage.deps]
+                task = _Task(stage, time.monotonic())
+                # request id 등 contextvars를 단계 스레드에도 전달합니다.
+                context = contextvars.copy_context()
+                running[self._executor(stage).submit(context.run, task, *args)] = task
+            if not running:
+                raise ValueError(f"순환 의존성으로 실행할 수 없는 단계가 있습니다: {[s.name for s in pending]}")
+
+            deadlines = [task.started + task.stage.timeout for task in running.values()
+                         if task.stage.timeout is not None and task.started is not None]
+            if ends_at is not None:
+                deadlines.append(ends_at)
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            if any(task.started is None and task.stage.timeout is not None for task in running.values()):
+                wait_for = _START_POLL if wait_for is None else min(wait_for, _START_POLL)
+            done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                task = running.pop(future)
+                try:
+                    self._finish(run, task.stage, task.since(), value=future.result())
+                except Exception as e:
+                    self._finish(run, task.stage, task.since(), error=e, status='error')
+
+            now = time.monotonic()
+            for future, task in list(running.items()):
+                stage = task.stage
+                if stage.timeout is not None and task.started is not None and now - task.started >= stage.timeout:
+                    # 스레드는 강제로 멈출 수 없으므로 결과만 버리고 다음 단계로 넘어갑니다.
+                    running.pop(future)
+                    future.cancel()
+                    self._finish(run, stage, task.started, error=StageTimeout(f"{stage.timeout}초 초과"), status='timeout')
+
+            if ends_at is not None and now >= ends_at:
+                for future, task in list(running.items()):
+                    future.cancel()
+                    self._finish(run, task.stage, task.since(), error=StageTimeout(f"전체 {deadline}초 초과"),
+                                 status='timeout')
+                for stage in pending:
+                    self._finish(run, stage, now, error=StageTimeout(f"전체 {deadline}초 초과"), status='timeout')
+                break
+        return run
+
+    @staticmethod
+    async def _call_async(stage, args):
+        value = stage.func(*args)
+        if inspect.isawaitable(value):
+            value = await asyncio.wait_for(value, stage.timeout)
+        return value
+
+    async def run_async(self, deadline=None):
+        """run()의 asyncio 버전. 스레드 풀을 쓰지 않으므로 단계의 제한 시간은 제출한 때부터 잽니다."""
+        run = PipelineRun()
+        pending = list(self.stages)
+        running = {}
+        ends_at = time.monotonic() + deadline if deadline is not None else None
+
+        while pending or running:
+            for stage in [s for s in pending if all(d in run.results for d in s.deps)]:
+                pending.remove(stage)
+                args = [run.results[d] for d in stage.deps]
+                running[asyncio.ensure_future(self._call_async(stage, args))] = (stage, time.monotonic())
+            if not running:
+                raise ValueError(f"순환 의존성으로 실행할 수 없는 단계가 있습니다: {[s.name for s in pending]}")
+
+            wait_for = max(0.0, ends_at - time.monotonic()) if ends_at is not None else None
+            done, _ = await asyncio.wait(list(running), timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                stage, started = running.pop(task)
+                try:
+                    self._finish(run, stage, started, value=task.result())
+                except asyncio.TimeoutError:
+                    self._finish(run, stage, started, error=StageTimeout(f"{stage.timeout}초 초과"), status='timeout')
+                except Exception as e:
+                    self._finish(run, stage, started, error=e, status='error')
+
+            now = time.monotonic()
+            if ends_at is not None and now >= ends_at:
+                for task, (stage, started) in list(running.items()):
+                    task.cancel()
+                    self._finish(run, stage, started, error=StageTimeout(f"전체 {deadline}초 초과"), status='timeout')
+                for stage in pending:
+                    self._finish(run, stage, now, error=StageTimeout(f"전체 {deadline}초 초과"), status='timeout')
+                break
+        return run
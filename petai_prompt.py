@@ -0,0 +1,146 @@
+# petai_prompt.py
+"""
+진단 프롬프트 조립.
+DB 검색으로 찾은 질병을 dict repr 대신 한 줄씩 간결하게 적고, 입력(보호자 관찰 내용, 사진 라벨)과
+겹치는 증상이 많은 질병부터 PROMPT_CONTEXT_TOKENS 예산 안에서만 넣습니다. 예산이 모자라면 조언을 빼고
+이름/경고 단계/증상만 적으며, 그래도 넘치는 질병은 생략합니다. 질병 표가 커져도 프롬프트 길이(입력 토큰)가 일정합니다.
+
+    prompt = build_prompt('고양이', '눈곱이 껴요', True, '눈곱', db_results, symptom_results)
+
+토큰 수는 추정치입니다. (ASCII 4글자당 1토큰, 한글 등 그 외 문자는 1글자당 1토큰으로 넉넉하게 셉니다)
+요청마다 추정한 프롬프트 토큰 수를 petai_prompt_tokens 히스토그램과 JSON 로그(prompt 이벤트)에 남기며,
+Gemini가 센 실제 입력 토큰 수는 petai_gemini_tokens_total{kind="prompt"}에 더해집니다.
+
+환경 변수
+    PROMPT_CONTEXT_TOKENS   DB 검색 결과에 쓸 토큰 예산 (기본값 800)
+"""
+import math
+import os
+
+import petai_metrics as metrics
+from petai_fallback import build_evidence, score_disease
+
+CONTEXT_TOKENS = int(os.environ.get('PROMPT_CONTEXT_TOKENS', 800))
+
+prompt_tokens = metrics.REGISTRY.register(metrics.Histogram(
+    'petai_prompt_tokens', '진단 프롬프트의 추정 토큰 수', (),
+    buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000)))
+context_dropped_total = metrics.REGISTRY.register(metrics.Counter(
+    'petai_prompt_context_dropped_total', '토큰 예산을 넘어 프롬프트에서 생략한 질병 수'))
+
+
+def estimate_tokens(text):
+    """토큰 수 추정치."""
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return math.ceil(ascii_chars / 4) + len(text) - ascii_chars
+
+
+def format_disease(disease, advice=True):
+    """질병 한 줄. advice=False이면 조언을 뺀 짧은 형태."""
+    parts = [f"- {disease.get('disease_name') or '-'} ({disease.get('warning_level') or '-'})"]
+    if disease.get('image_labels'):
+        parts.append(f"사진 징후: {disease['image_labels']}")
+    if disease.get('text_symptoms'):
+        parts.append(f"증상: {disease['text_symptoms']}")
+    if advice and disease.get('advice'):
+        parts.append(f"조언: {' '.join(disease['advice'].split())}")
+    return ' | '.join(parts)
+
+
+def rank_matches(diseases, evidence):
+    """입력과 겹치는 증상이 많은 순으로 정렬합니다. 점수가 같으면 검색 결과 순서를 그대로 둡니다."""
+    scored = [(score_disease(d, evidence)[0], i, d) for i, d in enumerate(diseases)]
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    return [d for _, _, d in scored]
+
+
+def select_context(sections, budget=CONTEXT_TOKENS):
+    """
+    sections: [(제목, 정렬된 질병 목록)]. 같은 질병은 앞 섹션에만 넣습니다.
+    모든 섹션에서 순위가 높은 질병부터 번갈아 budget 안에 넣고 {제목: [줄]}과 생략한 질병 수를 반환합니다.
+    """
+    seen, queues = set(), []
+    for title, diseases in sections:
+        unique = []
+        for disease in diseases or ():
+            key = disease.get('id', disease.get('disease_name'))
+            if key not in seen:
+                seen.add(key)
+                unique.append(disease)
+        queues.append((title, unique))
+
+    lines = {title: [] for title, _ in sections}
+    used, dropped = 0, 0
+    for rank in range(max((len(q) for _, q in queues), default=0)):
+        for title, queue in queues:
+            if rank >= len(queue):
+                continue
+            for line in (format_disease(queue[rank]), format_disease(queue[rank], advice=False)):
+                cost = estimate_tokens(line) + 1
+                if used + cost <= budget:
+                    lines[title].append(line)
+                    used += cost
+                    break
+            else:
+                dropped += 1
+    return lines, dropped
+
+
+def _mission(symptom_text, has_image):
+    if symptom_text and has_image:
+        return "위의 [사진 분석과 관련된 수의학 지식]을 바탕으로, [보호자 관찰 내용]과 [사진 분석 결과 라벨]을 종합하여"
+    if has_image:
+        return "위의 [사진 분석과 관련된 수의학 지식]과 [사진 분석 결과 라벨]을 바탕으로,"
+    return "[보호자 관찰 내용]을 바탕으로,"
+
+
+IMAGE_SECTION = "[사진 분석과 관련된 수의학 지식 (DB 검색 결과)]"
+SYMPTOM_SECTION = "[보호자 관찰 내용과 관련된 수의학 지식 (DB 검색 결과)]"
+
+INSTRUCTIONS = """---
+[임무]
+{mission} 보호자에게 가장 가능성이 높은 질병과 경고, 조언을 생성해주세요.
+만약 [사진 분석과 관련된 수의학 지식]이나 [보호자 관찰 내용과 관련된 수의학 지식]이 제공되었다면, 해당 내용을 우선적으로 참고하여 답변을 구성하세요.
+증상만으로 판단이 어려울 경우, 여러 가능성을 제시하고 사진 등의 추가 정보를 요청할 수 있습니다.
+답변은 반드시 아래 [출력 형식]을 따라야 합니다.
+
+[출력 형식]
+### 핵심 요약
+(모든 내용을 한두 문장으로 요약)
+### 상세 설명
+(의심되는 점과 그 이유를 자세히 설명)
+### 권장 조치
+(보호자가 해야 할 일, 예를 들어 병원 방문 권유 등)"""
+
+
+def build_prompt(pet_type, symptom_text, has_image, image_label=None, db_results=None, symptom_results=None,
+                 budget=CONTEXT_TOKENS):
+    """진단용 Gemini 프롬프트를 만들고, 추정 토큰 수를 지표와 로그에 남깁니다."""
+    evidence = build_evidence(symptom_text, image_label)
+    sections = []
+    if has_image:
+        sections.append((IMAGE_SECTION, rank_matches(db_results or [], evidence)))
+    if symptom_text and symptom_results:
+        sections.append((SYMPTOM_SECTION, rank_matches(symptom_results, evidence)))
+    lines, dropped = select_context(sections, budget)
+
+    blocks = [f"당신은 전문 {pet_type} 수의사 AI 조수입니다."]
+    if has_image:
+        blocks.append('\n'.join([IMAGE_SECTION, *(lines[IMAGE_SECTION] or ["일치하는 정보를 찾지 못했습니다."])]))
+    if symptom_text:
+        blocks.append(f"[보호자 관찰 내용]\n{symptom_text}")
+        if lines.get(SYMPTOM_SECTION):
+            blocks.append('\n'.join([SYMPTOM_SECTION, *lines[SYMPTOM_SECTION]]))
+    if dropped:
+        blocks.append(f"(관련도가 낮은 질병 {dropped}개는 생략했습니다.)")
+    if image_label is not None:
+        blocks.append(f"[사진 분석 결과 라벨]\n{image_label}")
+    blocks.append(INSTRUCTIONS.format(mission=_mission(symptom_text, has_image)))
+    prompt = '\n\n'.join(blocks)
+
+    tokens = estimate_tokens(prompt)
+    prompt_tokens.observe(tokens)
+    if dropped:
+        context_dropped_total.inc(dropped)
+    metrics.log_event('prompt', tokens=tokens, diseases=sum(len(v) for v in lines.values()), dropped=dropped)
+    return prompt
@@ -0,0 +1,131 @@
+# petai_rules.py
+"""
+이상행동 우선순위 규칙.
+규칙은 behavior_rules.json(BEHAVIOR_RULES_PATH)에 (키워드 목록 -> 이상행동 목록 -> 우선순위)로 정의합니다.
+
+    {"priority_levels": ["높음", "보통"],
+     "rules": [{"name": "피부 증상", "keywords": ["피부", "발진"], "behaviors": ["과도한 핥기"], "priority": "높음"}]}
+
+모든 규칙의 키워드는 Aho-Corasick 매처(petai_index.KeywordMatcher) 하나로 컴파일되므로,
+증상 문장을 한 번만 훑으며 규칙 수가 늘어도 매칭 비용은 거의 그대로입니다.
+키워드와 문장은 같은 한국어 정규화(자모 결합, 소문자, 조사 제거, 공백 제거)를 거칩니다.
+파일이 바뀌면 recheck_seconds 안에 다시 읽으며, 잘못된 파일이면 이전 규칙을 계속 사용합니다.
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+
+from petai_index import KeywordMatcher
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'behavior_rules.json')
+
+# 단어 끝에서 떼어 낼 조사 (긴 것부터 확인)
+PARTICLES = sorted(['이', '가', '을', '를', '은', '는', '에', '에서', '에게', '의', '도', '과', '와', '으로', '로', '만', '까지',
+                    '부터', '이랑', '랑', '하고', '처럼', '보다'], key=len, reverse=True)
+_WORDS = re.compile(r'\S+')
+
+
+def _strip_particle(word):
+    for particle in PARTICLES:
+        # 조사를 떼고도 두 글자 이상 남는 경우만 (예: '피부에' -> '피부', '이' 같은 한 글자 단어는 그대로)
+        if word.endswith(particle) and len(word) - len(particle) >= 2:
+            return word[:-len(particle)]
+    return word
+
+
+@lru_cache(maxsize=8192)
+def normalize_korean(text):
+    """NFKC(분리된 자모를 음절로 결합), 소문자화, 단어 끝 조사 제거, 공백 제거."""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ''.join(_strip_particle(word) for word in _WORDS.findall(text))
+
+
+class RuleSet:
+    """컴파일된 규칙 묶음. 한 번 만들면 바뀌지 않으며, 다시 읽을 때는 새 RuleSet으로 교체합니다."""
+
+    def __init__(self, data):
+        self.levels = list(data.get('priority_levels') or ['높음'])
+        self.rules = list(data.get('rules') or [])
+        self._matcher = KeywordMatcher()
+        # 규칙 번호 -> (행동 집합, 우선순위 순위)
+        self._targets = []
+        for index, rule in enumerate(self.rules):
+            priority = rule.get('priority', self.levels[0])
+            if priority not in self.levels:
+                raise ValueError(f"규칙 '{rule.get('name', index)}'의 우선순위 '{priority}'가 priority_levels에 없습니다.")
+            behaviors = rule.get('behaviors')
+            if not behaviors or not rule.get('keywords'):
+                raise ValueError(f"규칙 '{rule.get('name', index)}'에 keywords와 behaviors가 필요합니다.")
+            self._targets.append((frozenset(behaviors), self.levels.index(priority)))
+            for keyword in rule['keywords']:
+                self._matcher.add(normalize_korean(keyword), index)
+        self._matcher.build()
+        self.priorities = lru_cache(maxsize=4096)(self._priorities)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def behavior_priorities(self, normalized_text):
+        """정규화된 문장에서 걸린 규칙들을 행동 -> 가장 높은 우선순위 이름 dict로 반환합니다."""
+        best = {}
+        for index in self._matcher.find(normalized_text):
+            behaviors, rank = self._targets[index]
+            for behavior in behaviors:
+                if behavior not in best or rank < best[behavior]:
+                    best[behavior] = rank
+        return {behavior: self.levels[rank] for behavior, rank in best.items()}
+
+    def _priorities(self, behaviors, normalized_text):
+        """(행동 튜플, 정규화된 문장) -> 행동별 우선순위 튜플 (없으면 None). 결과는 캐시됩니다."""
+        matched = self.behavior_priorities(normalized_text)
+        return tuple(matched.get(behavior) for behavior in behaviors)
+
+
+class BehaviorRules:
+    """규칙 파일을 감시하다가 바뀌면 다시 컴파일합니다."""
+
+    def __init__(self, path=None, recheck_seconds=2.0):
+        self.path = path or os.environ.get('BEHAVIOR_RULES_PATH', DEFAULT_RULES_PATH)
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._ruleset = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self):
+        """현재 규칙. recheck_seconds마다 파일 수정 시각을 확인하고 바뀌었으면 다시 읽습니다."""
+        now = time.monotonic()
+        if self._ruleset is not None and now - self._checked_at < self.recheck_seconds:
+            return self._ruleset
+        with self._lock:
+            if self._ruleset is None or now - self._checked_at >= self.recheck_seconds:
+                mtime = self._file_mtime()
+                if self._ruleset is None or mtime != self._mtime:
+                    self._reload(mtime)
+                self._checked_at = now
+        return self._ruleset
+
+    def _reload(self, mtime):
+        try:
+            self._ruleset = RuleSet.from_file(self.path)
+            print(f"INFO: 이상행동 규칙 {len(self._ruleset.rules)}개를 불러왔습니다. ({self.path})")
+        except Exception as e:
+            print(f"이상행동 규칙을 불러오는 중 오류 발생: {e}")
+            if self._ruleset is None:
+                self._ruleset = RuleSet({})
+        self._mtime = mtime
+
+
+behavior_rules = BehaviorRules()
@@ -0,0 +1,206 @@
+# petai_search.py
+"""
+증상 전문 검색.
+diseases의 disease_name, image_labels, text_symptoms를 글자 2-gram(바이그램)으로 색인해
+"눈곱이 껴요"처럼 조사나 어미가 붙은 표현도 "눈곱"과 일치하도록 하고, 일치 정도로 순위를 매깁니다.
+
+- PostgreSQL: diseases.search_vector (바이그램 tsvector 생성 컬럼) + GIN 인덱스, pg_trgm GIN 인덱스로 오타 보정
+- SQLite: FTS5 가상 테이블 disease_search. diseases가 바뀌면(disease_version) 다음 검색 때 다시 채웁니다.
+
+색인 덕분에 diseases가 수만 행으로 늘어도 검색 시간은 거의 일정합니다.
+
+    symptom_search.search("눈곱이 껴요", limit=5)  # 순위순 질병 dict 목록
+"""
+import re
+import threading
+import time
+
+from petai_db import get_connection, dict_cursor, is_postgres
+from petai_index import current_version
+
+DEFAULT_LIMIT = 5
+# 공백과 ASCII 구두점에서 단어를 나눕니다. (PostgreSQL 함수 petai_bigrams와 같은 규칙)
+_SPLIT = re.compile(r'[\s!-/:-@\[-`{-~]+')
+
+
+def bigrams(text):
+    """소문자로 바꾼 뒤 단어마다 겹치는 두 글자 조각을 만듭니다. 한 글자 단어는 그대로 둡니다."""
+    grams = []
+    for word in _SPLIT.split((text or '').lower()):
+        if len(word) == 1:
+            grams.append(word)
+        grams.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return grams
+
+
+def _query_terms(text):
+    """검색어 조각. 중복과 글자/숫자가 아닌 문자가 섞인 조각은 뺍니다. (FTS5/tsquery 문법 문자가 들어가지 않도록)"""
+    seen = []
+    for gram in bigrams(text):
+        if gram.isalnum() and gram not in seen:
+            seen.append(gram)
+    return seen
+
+
+def fts_match(terms):
+    """FTS5 MATCH 식 (조각 중 하나라도 일치)."""
+    return ' OR '.join(f'"{term}"' for term in terms)
+
+
+def install_search(cur, postgres):
+    """검색 색인을 만듭니다. (petai_migrations에서 호출)"""
+    if postgres:
+        cur.execute(r'''
+            CREATE OR REPLACE FUNCTION petai_bigrams(t text) RETURNS text AS $$
+                SELECT coalesce(string_agg(substr(w, i, 2), ' '), '')
+                FROM regexp_split_to_table(lower(coalesce(t, '')), '[[:space:][:punct:]]+') AS w,
+                     generate_series(1, greatest(length(w) - 1, 1)) AS i
+                WHERE w <> ''
+            $$ LANGUAGE sql IMMUTABLE
+        ''')
+        cur.execute('''
+            ALTER TABLE diseases ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', petai_bigrams(disease_name)), 'A') ||
+                setweight(to_tsvector('simple', petai_bigrams(image_labels)), 'B') ||
+                setweight(to_tsvector('simple', petai_bigrams(text_symptoms)), 'B')
+            ) STORED
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS diseases_search_vector_idx ON diseases USING GIN (search_vector)")
+        # pg_trgm은 권한이 없으면 만들 수 없으므로, 실패하면 오타 보정 없이 진행합니다.
+        cur.execute("SAVEPOINT petai_trgm")
+        try:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS diseases_symptoms_trgm_idx ON diseases
+                USING GIN ((coalesce(image_labels, '') || ' ' || coalesce(text_symptoms, '')) gin_trgm_ops)
+            ''')
+            cur.execute("RELEASE SAVEPOINT petai_trgm")
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT petai_trgm")
+            print(f"경고: pg_trgm을 사용할 수 없어 오타 보정 검색을 건너뜁니다: {e}")
+    else:
+        cur.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS disease_search
+            USING fts5(name_grams, label_grams, symptom_grams, tokenize = 'unicode61 remove_diacritics 0')
+        ''')
+        cur.execute("CREATE TABLE IF NOT EXISTS disease_search_state (id INTEGER PRIMARY KEY, version TEXT)")
+
+
+# 검색 쿼리. 비동기 서빙 모드(petai_aio)도 같은 쿼리를 씁니다.
+# bm25는 작을수록 관련도가 높습니다. 이름 조각에 가중치를 더 줍니다.
+SQLITE_SEARCH_SQL = '''
+    SELECT d.id, d.disease_name, d.image_labels, d.text_symptoms, d.warning_level, d.advice,
+           -bm25(disease_search, 2.0, 1.0, 1.0) AS search_score
+    FROM disease_search JOIN diseases d ON d.id = disease_search.rowid
+    WHERE disease_search MATCH ?
+    ORDER BY bm25(disease_search, 2.0, 1.0, 1.0), d.id
+    LIMIT ?
+'''
+POSTGRES_TRGM_SEARCH_SQL = '''
+    SELECT id, disease_name, image_labels, text_symptoms, warning_level, advice,
+           ts_rank(search_vector, q) + word_similarity(%s, coalesce(image_labels, '') || ' ' || coalesce(text_symptoms, '')) AS search_score
+    FROM diseases, to_tsquery('simple', %s) AS q
+    WHERE search_vector @@ q
+       OR %s <%% (coalesce(image_labels, '') || ' ' || coalesce(text_symptoms, ''))
+    ORDER BY search_score DESC, id
+    LIMIT %s
+'''
+POSTGRES_SEARCH_SQL = '''
+    SELECT id, disease_name, image_labels, text_symptoms, warning_level, advice,
+           ts_rank(search_vector, q) AS search_score
+    FROM diseases, to_tsquery('simple', %s) AS q
+    WHERE search_vector @@ q
+    ORDER BY search_score DESC, id
+    LIMIT %s
+'''
+HAS_TRGM_SQL = "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+
+
+def _has_trgm(cur):
+    cur.execute(HAS_TRGM_SQL)
+    return cur.fetchone() is not None
+
+
+class SymptomSearch:
+    """질병 전문 검색. SQLite에서는 FTS5 색인이 diseases와 같은 버전인지 recheck_seconds마다 확인합니다."""
+
+    def __init__(self, recheck_seconds=5.0, version_func=current_version):
+        self.recheck_seconds = recheck_seconds
+        self._version_func = version_func
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._trgm = None
+
+    # --- SQLite FTS5 ---
+    def sync_due(self):
+        """FTS5 색인 버전을 다시 확인할 때가 되었는지. (비동기 모드는 이때만 스레드에서 sync()를 부릅니다)"""
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.recheck_seconds
+
+    def sync(self):
+        """SQLite FTS5 색인을 diseases와 같은 버전으로 맞춥니다. (PostgreSQL은 생성 컬럼이라 할 일 없음)"""
+        if not is_postgres():
+            self._sync_sqlite()
+
+    def _sync_sqlite(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.recheck_seconds:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.recheck_seconds:
+                return
+            version = repr(self._version_func())
+            with get_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT version FROM disease_search_state WHERE id = 1")
+                row = cur.fetchone()
+                if row is None or row[0] != version:
+                    # 다른 프로세스와 동시에 다시 채우지 않도록 쓰기 잠금을 잡은 뒤 한 번 더 확인합니다.
+                    cur.execute("BEGIN IMMEDIATE")
+                    cur.execute("SELECT version FROM disease_search_state WHERE id = 1")
+                    row = cur.fetchone()
+                    if row is None or row[0] != version:
+                        self._rebuild_sqlite(cur, version)
+            self._checked_at = now
+
+    @staticmethod
+    def _rebuild_sqlite(cur, version):
+        cur.execute("SELECT id, disease_name, image_labels, text_symptoms FROM diseases")
+        rows = [(i, ' '.join(bigrams(name)), ' '.join(bigrams(labels)), ' '.join(bigrams(symptoms)))
+                for i, name, labels, symptoms in cur.fetchall()]
+        cur.execute("DELETE FROM disease_search")
+        cur.executemany("INSERT INTO disease_search (rowid, name_grams, label_grams, symptom_grams) VALUES (?, ?, ?, ?)",
+                        rows)
+        cur.execute("INSERT OR REPLACE INTO disease_search_state (id, version) VALUES (1, ?)", (version,))
+        print(f"INFO: 증상 검색 색인 재생성 완료 ({len(rows)}개 질병)")
+
+    def _search_sqlite(self, terms, limit):
+        self._sync_sqlite()
+        with get_connection() as conn:
+            cur = dict_cursor(conn)
+            cur.execute(SQLITE_SEARCH_SQL, (fts_match(terms), limit))
+            return [dict(row) for row in cur.fetchall()]
+
+    # --- PostgreSQL ---
+    def _search_postgres(self, text, terms, limit):
+        query = ' | '.join(terms)
+        with get_connection() as conn:
+            cur = dict_cursor(conn)
+            if self._trgm is None:
+                self._trgm = _has_trgm(cur)
+            if self._trgm:
+                cur.execute(POSTGRES_TRGM_SEARCH_SQL, (text, query, text, limit))
+            else:
+                cur.execute(POSTGRES_SEARCH_SQL, (query, limit))
+            return [dict(row) for row in cur.fetchall()]
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        """text와 관련된 질병을 관련도 순으로 최대 limit개 반환합니다. 각 dict에는 search_score가 들어 있습니다."""
+        terms = _query_terms(text)
+        if not terms:
+            return []
+        if is_postgres():
+            return self._search_postgres(text, terms, limit)
+        return self._search_sqlite(terms, limit)
+
+
+symptom_search = SymptomSearch()
@@ -0,0 +1,244 @@
+# petai_storage.py
+"""
+업로드 저장소.
+파일 이름은 내용의 SHA-256이므로 같은 사진은 한 번만 저장되고, 이름이 같은 다른 사진끼리 덮어쓰지 않습니다.
+키는 'ab/cd/<sha256>.jpg' 형태로 두 단계 샤딩해 디렉터리 하나에 파일이 몰리지 않게 합니다.
+백그라운드 스위퍼가 보관 기간(UPLOAD_MAX_AGE)과 총 용량(UPLOAD_MAX_BYTES)을 넘는 파일을 오래된 순으로 지웁니다.
+저장된 분석 결과(petai_analyses)가 가리키는 사진은 결과의 보관 기간(ANALYSIS_TTL_DAYS) 동안 지우지 않습니다.
+
+환경 변수
+    UPLOAD_BACKEND         local(기본값, static/uploads) | s3
+    UPLOAD_MAX_BYTES       총 용량 한도 (기본값 1GB)
+    UPLOAD_MAX_AGE         보관 기간(초, 기본값 7일)
+    UPLOAD_SWEEP_INTERVAL  스위퍼 실행 간격(초, 기본값 600)
+    S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL   s3 백엔드 설정 (MinIO 등 S3 호환 서버는 S3_ENDPOINT_URL 지정)
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+
+def content_key(data, extension):
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def _evict(entries, max_bytes, max_age, now, delete, keep=()):
+    """
+    entries: (key, size, mtime) 목록. 기간이 지난 것과 용량을 넘는 오래된 것부터 지우고 지운 개수를 반환합니다.
+    keep에 있는 키는 지우지 않습니다. (용량에는 포함되므로 그만큼 다른 파일이 먼저 지워집니다)
+    keep의 파일만으로 용량을 넘으면 다른 파일을 모두 지워도 한도 안에 들어오지 못하므로, 용량 기준으로는 지우지 않습니다.
+    (대기 중인 분석 작업의 사진까지 지우지 않도록. 기간 기준 삭제는 그대로 합니다)
+    """
+    entries = sorted(entries, key=lambda e: e[2])
+    total = sum(size for _, size, _ in entries)
+    kept = sum(size for key, size, _ in entries if key in keep)
+    if max_bytes is not None and kept and kept >= max_bytes:
+        print(f"INFO: 저장된 분석 결과의 사진({kept}바이트)이 업로드 용량 한도를 넘어 용량 기준 정리를 건너뜁니다.")
+        max_bytes = None
+    removed = 0
+    for key, size, mtime in entries:
+        if key in keep:
+            continue
+        if (max_age is not None and now - mtime > max_age) or (max_bytes is not None and total > max_bytes):
+            delete(key)
+            total -= size
+            removed += 1
+    return removed
+
+
+class LocalUploadStore:
+    """static 폴더 아래 로컬 디렉터리에 저장합니다."""
+
+    def __init__(self, root='static/uploads', static_root='static'):
+        self.root = root
+        self.static_root = static_root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, data, extension):
+        key = content_key(data, extension)
+        path = self.path(key)
+        if os.path.exists(path):
+            # 이미 있는 사진이면 다시 쓰지 않고 최근 사용 시각만 갱신합니다.
+            os.utime(path)
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return key
+
+    def read(self, key):
+        with open(self.path(key), 'rb') as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def static_filename(self, key):
+        """url_for('static', filename=...)에 넘길 경로."""
+        return os.path.relpath(self.path(key), self.static_root).replace('\\', '/')
+
+    def entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):  # 아직 쓰는 중인 파일 (put의 임시 파일)
+                    continue
+                full = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(full, self.root).replace('\\', '/')
+                if key.count('/') == 2:  # 샤딩된 업로드 파일만 관리합니다.
+                    yield key, stat.st_size, stat.st_mtime
+
+    def sweep(self, max_bytes=None, max_age=None, keep=()):
+        return _evict(list(self.entries()), max_bytes, max_age, time.time(), self.delete, keep)
+
+
+class S3UploadStore:
+    """S3 호환 API(AWS S3, MinIO 등)에 저장합니다."""
+
+    def __init__(self, bucket, prefix='uploads/', endpoint_url=None, client=None, url_expires=3600):
+        if client is None:
+            import boto3
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_expires = url_expires
+
+    def _object_key(self, key):
+        return f"{self.prefix}{key}"
+
+    def put(self, data, extension):
+        from petai_images import guess_mime_type
+        key = content_key(data, extension)
+        # S3는 mtime을 갱신할 수 없으므로 같은 내용이라도 다시 올려 LastModified를 최근으로 맞춥니다.
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data,
+                               ContentType=guess_mime_type(key))
+        return key
+
+    def read(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body'].read()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def url(self, key):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self._object_key(key)}, ExpiresIn=self.url_expires)
+
+    def entries(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'][len(self.prefix):], obj['Size'], obj['LastModified'].timestamp()
+
+    def sweep(self, max_bytes=None, max_age=None, keep=()):
+        return _evict(list(self.entries()), max_bytes, max_age, time.time(), self.delete, keep)
+
+
+class UploadSweeper:
+    """
+    interval초마다 store.sweep()을 실행하는 데몬 스레드.
+    pinned()가 돌려주는 키는 지우지 않으며, pinned()가 실패하면 그 회차는 아무것도 지우지 않고 건너뜁니다.
+    """
+
+    def __init__(self, store, interval, max_bytes, max_age, pinned=None):
+        self.store = store
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.pinned = pinned
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='petai-upload-sweeper', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep_once()
+            except Exception as e:
+                print(f"업로드 정리 중 오류 발생: {e}")
+
+    def sweep_once(self):
+        keep = self.pinned() if self.pinned is not None else ()
+        removed = self.store.sweep(self.max_bytes, self.max_age, keep=keep)
+        if removed:
+            print(f"INFO: 업로드 스위퍼가 파일 {removed}개를 삭제했습니다.")
+        return removed
+
+
+def pinned_uploads():
+    """저장된 분석 결과가 가리키는 업로드 키. (petai_analyses)"""
+    from petai_analyses import analyses
+    return analyses.pinned_uploads()
+
+
+_store = None
+_sweeper = None
+_sweep_enabled = True
+_store_lock = threading.Lock()
+
+
+def get_upload_store(start_sweeper=True):
+    """UPLOAD_BACKEND에 맞는 저장소를 한 번만 만들고, 처음 호출한 프로세스에서 스위퍼를 시작합니다."""
+    global _store, _sweeper
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if os.environ.get('UPLOAD_BACKEND', 'local').lower() == 's3':
+                    _store = S3UploadStore(os.environ['S3_BUCKET'], prefix=os.environ.get('S3_PREFIX', 'uploads/'),
+                                           endpoint_url=os.environ.get('S3_ENDPOINT_URL'))
+                else:
+                    _store = LocalUploadStore()
+    if start_sweeper and _sweep_enabled and _sweeper is None:
+        with _store_lock:
+            if _sweeper is None:
+                _sweeper = UploadSweeper(
+                    _store,
+                    interval=float(os.environ.get('UPLOAD_SWEEP_INTERVAL', 600)),
+                    max_bytes=int(os.environ.get('UPLOAD_MAX_BYTES', 1024 ** 3)),
+                    max_age=float(os.environ.get('UPLOAD_MAX_AGE', 7 * 24 * 3600)),
+                    pinned=pinned_uploads,
+                ).start()
+    return _store
+
+
+def set_upload_store(store, sweep=False):
+    """
+    테스트 등에서 저장소를 직접 교체할 때 사용합니다. sweep=False이면 이 저장소에는 스위퍼를 띄우지 않습니다.
+    None이면 실행 중인 스위퍼를 멈추고, 다음 호출 때 환경 변수로 다시 만듭니다.
+    """
+    global _store, _sweeper, _sweep_enabled
+    with _store_lock:
+        if _sweeper is not None:
+            _sweeper.stop()
+        _store, _sweeper = store, None
+        _sweep_enabled = sweep or store is None
+
+
+def upload_url(key):
+    """템플릿에서 업로드 이미지를 표시할 URL."""
+    store = get_upload_store(start_sweeper=False)
+    if hasattr(store, 'url'):
+        return store.url(key)
+    from flask import url_for
+    return url_for('static', filename=store.static_filename(key))
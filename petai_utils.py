@@ -1,6 +1,4 @@
-import base64
-from io import BytesIO
-from PIL import Image
+from petai_rules import behavior_rules, normalize_korean
 
 # --- 이상행동 DB 및 분석 함수 ---
 BEHAVIOR_DB = {
@@ -48,7 +46,10 @@ BEHAVIOR_DB = {
 
 
 def analyze_behaviors(selected_behaviors, symptom_text):
-    """선택된 이상행동 목록과 보호자 관찰 문장을 받아 간단한 코칭 및 의심 원인을 리턴합니다."""
+    """
+    선택된 이상행동 목록과 보호자 관찰 문장을 받아 간단한 코칭 및 의심 원인을 리턴합니다.
+    우선순위는 behavior_rules.json의 규칙(키워드 -> 행동 -> 우선순위)으로 정합니다. (petai_rules)
+    """
     results = []
     for b in selected_behaviors:
         info = BEHAVIOR_DB.get(b)
@@ -60,12 +61,13 @@ def analyze_behaviors(selected_behaviors, symptom_text):
                 "possible_causes": info["possible_causes"],
                 "coaching": info["coaching"]
             })
-    # 간단한 텍스트 기반 보강: 증상 텍스트에 특정 키워드가 있으면 우선순위 표시
-    if symptom_text:
-        low = symptom_text.lower()
-        for r in results:
-            if any(k in low for k in ["피부", "발진", "탈모"]) and "피부" in r["behavior"]:
-                r["priority"] = "높음"
+    # 텍스트 기반 보강: 증상 텍스트가 규칙의 키워드와 맞으면 해당 행동에 우선순위 표시
+    if symptom_text and results:
+        priorities = behavior_rules.get().priorities(
+            tuple(r["behavior"] for r in results), normalize_korean(symptom_text))
+        for r, priority in zip(results, priorities):
+            if priority:
+                r["priority"] = priority
     return results
 
 
@@ -90,6 +92,37 @@ def assess_cat_obesity(age_years, weight_kg):
         return {"assessable": True, "status": "비만", "ideal_kg": ideal, "message": "비만으로 판단됩니다. 식이관리와 운동, 수의사와의 상담을 권장합니다."}
 
 
+# 강아지 BCS 자가 평가 가이드 (마크다운). 내용이 항상 같으므로 모듈 상수로 두고, HTML은 petai_fragments가 한 번만 렌더링합니다.
+DOG_BCS_GUIDE = """\
+**강아지 신체 상태 점수(BCS) 자가 평가 가이드**
+
+강아지의 비만도는 체중계 숫자보다 몸 상태를 직접 확인하는 것이 더 정확합니다. 아래 가이드를 따라 반려견의 신체 상태를 평가해보세요.
+
+**1. 갈비뼈 확인:**
+
+- **이상적:** 갈비뼈가 눈으로는 보이지 않지만, 가슴 옆을 부드럽게 만졌을 때 쉽게 느껴져야 합니다. 얇은 담요 위로 손가락을 스치는 느낌과 비슷합니다.
+- **마름:** 갈비뼈, 등뼈, 골반뼈가 멀리서도 쉽게 보입니다.
+- **과체중/비만:** 두꺼운 지방층에 덮여 갈비뼈가 잘 만져지지 않습니다.
+
+**2. 허리 라인 확인:**
+
+- **이상적:** 위에서 내려다봤을 때, 가슴 뒤쪽으로 허리 라인이 잘록하게 들어가 보여야 합니다.
+- **마름:** 허리 라인이 매우 심하게 들어가 있습니다.
+- **과체중/비만:** 허리 라인이 없거나, 오히려 옆으로 불룩 튀어나와 보입니다.
+
+**3. 복부 라인 확인:**
+
+- **이상적:** 옆에서 봤을 때, 가슴에서부터 뒷다리 쪽으로 복부가 완만하게 위로 올라가는 곡선이 보여야 합니다.
+- **마름:** 복부 라인이 급격하게 위로 치솟아 있습니다.
+- **과체중/비만:** 복부 라인이 수평이거나 아래로 처져 있습니다.
+
+**평가:**
+
+- **이상적인 상태**라면 건강한 체중입니다.
+- **과체중/비만**에 해당된다면, 식사량을 조절하고 활동량을 늘리는 것이 좋습니다. 정확한 진단과 관리 계획을 위해 수의사와 상담하는 것을 강력히 권장합니다.
+"""
+
+
 def assess_dog_obesity(age_years, weight_kg):
     """
     강아지 비만도(BCS) 평가 가이드.
@@ -98,32 +131,7 @@ def assess_dog_obesity(age_years, weight_kg):
     """
     if age_years < 1.0:
         return {"assessable": False, "message": "1세 미만의 강아지는 성장 단계로 체중만으로 비만 판정이 어렵습니다."}
-
-    guide = """
-    **강아지 신체 상태 점수(BCS) 자가 평가 가이드**
-
-    강아지의 비만도는 체중계 숫자보다 몸 상태를 직접 확인하는 것이 더 정확합니다. 아래 가이드를 따라 반려견의 신체 상태를 평가해보세요.
-
-    **1. 갈비뼈 확인:**
-       - **이상적:** 갈비뼈가 눈으로는 보이지 않지만, 가슴 옆을 부드럽게 만졌을 때 쉽게 느껴져야 합니다. 얇은 담요 위로 손가락을 스치는 느낌과 비슷합니다.
-       - **마름:** 갈비뼈, 등뼈, 골반뼈가 멀리서도 쉽게 보입니다.
-       - **과체중/비만:** 두꺼운 지방층에 덮여 갈비뼈가 잘 만져지지 않습니다.
-
-    **2. 허리 라인 확인:**
-       - **이상적:** 위에서 내려다봤을 때, 가슴 뒤쪽으로 허리 라인이 잘록하게 들어가 보여야 합니다.
-       - **마름:** 허리 라인이 매우 심하게 들어가 있습니다.
-       - **과체중/비만:** 허리 라인이 없거나, 오히려 옆으로 불룩 튀어나와 보입니다.
-
-    **3. 복부 라인 확인:**
-       - **이상적:** 옆에서 봤을 때, 가슴에서부터 뒷다리 쪽으로 복부가 완만하게 위로 올라가는 곡선이 보여야 합니다.
-       - **마름:** 복부 라인이 급격하게 위로 치솟아 있습니다.
-       - **과체중/비만:** 복부 라인이 수평이거나 아래로 처져 있습니다.
-
-    **평가:**
-    - **이상적인 상태**라면 건강한 체중입니다.
-    - **과체중/비만**에 해당된다면, 식사량을 조절하고 활동량을 늘리는 것이 좋습니다. 정확한 진단과 관리 계획을 위해 수의사와 상담하는 것을 강력히 권장합니다.
-    """
-    return {"assessable": True, "status": "평가 가이드", "message": guide}
+    return {"assessable": True, "status": "평가 가이드", "message": DOG_BCS_GUIDE}
 
 
 def analyze_image(image_obj):
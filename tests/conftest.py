@@ -0,0 +1,44 @@
+from io import BytesIO
+
+import pytest
+
+import petai_db
+import petai_storage
+from petai_migrations import migrate
+
+
+def jpeg_bytes(color, size=(64, 48)):
+    from PIL import Image
+    buf = BytesIO()
+    Image.new('RGB', size, color).save(buf, 'JPEG')
+    return buf.getvalue()
+
+
+@pytest.fixture
+def jpeg():
+    """색으로 작은 JPEG 바이트를 만드는 함수. jpeg('red')"""
+    return jpeg_bytes
+
+
+@pytest.fixture
+def empty_db(tmp_path):
+    """테스트마다 새 SQLite 파일을 쓰는 앱 DB (마이그레이션 전)."""
+    petai_db.configure(database_url='', sqlite_path=str(tmp_path / 'test.db'))
+    yield
+    petai_db.get_pool().close()
+
+
+@pytest.fixture
+def migrated_db(empty_db):
+    """마이그레이션(초기 질병 데이터 포함)을 적용한 앱 DB."""
+    migrate()
+
+
+@pytest.fixture
+def upload_store(tmp_path):
+    """tmp_path/static/uploads에 저장하는 업로드 저장소. 스위퍼는 띄우지 않습니다."""
+    store = petai_storage.LocalUploadStore(root=str(tmp_path / 'static' / 'uploads'),
+                                           static_root=str(tmp_path / 'static'))
+    petai_storage.set_upload_store(store)
+    yield store
+    petai_storage.set_upload_store(None)
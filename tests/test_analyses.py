@@ -0,0 +1,107 @@
+import json
+import os
+import time
+
+import pytest
+
+import petai_analyses
+import petai_db
+from petai_analyses import AnalysisRepository, input_hash
+
+
+@pytest.fixture
+def repo(migrated_db):
+    return AnalysisRepository(prune_interval=3600)
+
+
+def test_input_hash_ignores_formatting_and_run_options():
+    form = {'pet_type': '고양이', 'symptoms': '눈곱이  껴요', 'age': '3', 'weight': '4.0'}
+    same = dict(form, symptoms=' 눈곱이 껴요 ', age='3.0', weight='4', no_cache='1', stream='1')
+    assert input_hash(form, None, ['설사', '구토 빈발']) == input_hash(same, None, ['구토 빈발', '설사'])
+    assert input_hash(form, None, []) != input_hash(form, 'abc.jpg', [])
+    assert input_hash(form, None, []) != input_hash(dict(form, pet_type='강아지'), None, [])
+
+
+def test_save_dedupes_identical_inputs(repo):
+    first = repo.save('h1', {"gemini_response": "<p>결막염</p>"}, "<div>조각</div>")
+    assert repo.save('h1', {"gemini_response": "<p>다른 답</p>"}, "<div>다른 조각</div>") == first
+    row = repo.get(first)
+    assert row['result'] == {"gemini_response": "<p>결막염</p>"} and row['html'] == "<div>조각</div>"
+    assert repo.find_id('h1') == first and repo.find_id('h2') is None and repo.get('unknown') is None
+
+
+def test_prune_deletes_old_rows_in_batches(repo):
+    with petai_db.get_connection() as conn:
+        conn.cursor().executemany(
+            "INSERT INTO analyses (id, input_hash, result_json, html, created_at) VALUES (?, ?, '{}', '', ?)",
+            [(f"old{i}", f"old{i}", time.time() - 40 * 86400) for i in range(25)])
+    keep = repo.save('new', {}, '')
+    assert repo.prune_expired(max_age=30 * 86400, batch_size=10) == 25
+    assert repo.get(keep) is not None and repo.get('old0') is None
+
+
+@pytest.fixture
+def client(repo, monkeypatch):
+    import app as petai_app
+    from benchmarks.fake_gemini import FakeGenai
+    from petai_llm import GeminiLimiter, set_limiter
+    monkeypatch.setattr(petai_app, 'genai', FakeGenai(latency=0, jitter=0))
+    set_limiter(GeminiLimiter())
+    yield petai_app, petai_app.create_app({'SECRET_KEY': 'test'}).test_client()
+    set_limiter(None)
+
+
+def test_stored_result_is_served_with_cache_headers_and_dedupes(client):
+    petai_app, http = client
+    form = {'pet_type': '고양이', 'symptoms': f"눈곱이 껴요 {time.time()}", 'age': '3', 'weight': '4'}
+    result = petai_app.run_analysis_task(form, None, [])
+    analysis_id = result['analysis_id']
+
+    response = http.get(f'/results/{analysis_id}')
+    assert response.status_code == 200
+    assert "결막염" in response.get_data(as_text=True)
+    assert response.headers['ETag'] and response.headers['Last-Modified']
+    assert 'public' in response.headers['Cache-Control']
+    assert http.get(f'/results/{analysis_id}', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert http.get(f'/results/{analysis_id}',
+                    headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+    assert http.get('/results/unknown').status_code == 404
+
+    again = http.post('/analyze', data=form)
+    assert again.status_code == 303 and again.headers['Location'].endswith(f'/results/{analysis_id}')
+
+
+def test_sweeper_keeps_uploads_of_stored_results(client, upload_store, jpeg):
+    import petai_storage
+    petai_app, http = client
+    store = upload_store
+    kept, orphan = store.put(jpeg('red'), 'jpg'), store.put(b"orphan", 'jpg')
+    result = petai_app.run_analysis_task({'symptoms': f"눈곱 {time.time()}"}, kept, [])
+
+    # 보관 기간(UPLOAD_MAX_AGE)이 지난 상태로 스위퍼를 돌려도 저장된 결과의 사진은 남습니다.
+    sweeper = petai_storage.UploadSweeper(store, interval=3600, max_bytes=None, max_age=-1,
+                                          pinned=petai_storage.pinned_uploads)
+    assert sweeper.sweep_once() == 1
+    assert store.read(kept) and not os.path.exists(store.path(orphan))
+    page = http.get(f"/results/{result['analysis_id']}").get_data(as_text=True)
+    assert store.static_filename(kept) in page
+
+    # 결과의 보관 기간이 지나면 사진도 지울 수 있습니다.
+    assert petai_analyses.analyses.prune_expired(max_age=-1) == 1
+    assert sweeper.sweep_once() == 1
+
+
+def test_stored_results_escape_raw_html_from_the_model(client, monkeypatch):
+    petai_app, http = client
+    answer = "**결막염**이 의심됩니다. <script>alert(1)</script>"
+    monkeypatch.setattr(petai_app, 'generate_diagnosis', lambda prompt, use_cache=True: answer)
+    monkeypatch.setattr(petai_app, 'stream_diagnosis', lambda prompt, use_cache=True: iter([answer[:10], answer[10:]]))
+
+    result = petai_app.run_analysis_task({'symptoms': f"눈곱 {time.time()}"}, None, [])
+    with petai_app.create_app({'SECRET_KEY': 'test'}).test_request_context():
+        events = list(petai_app.stream_analysis_events({'symptoms': f"재채기 {time.time()}"}, None, []))
+    streamed_url = json.loads(events[-1].split('data: ', 1)[1])['url']
+
+    for url in (f"/results/{result['analysis_id']}", streamed_url):
+        page = http.get(url).get_data(as_text=True)
+        assert "<strong>결막염</strong>" in page and "<script>alert(1)" not in page
@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_app_does_not_load_heavy_dependencies(tmp_path):
+    code = ("import sys, json, app; print(json.dumps([m for m in "
+            "('google.generativeai', 'PIL', 'markdown', 'psycopg2') if m in sys.modules]))")
+    env = dict(os.environ, SQLITE_PATH=str(tmp_path / 'factory.db'))
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, env=env, text=True)
+    assert json.loads(out.strip().splitlines()[-1]) == []
+    # 앱을 불러오기만 해서는 DB 파일이 만들어지지 않습니다. (DDL은 마이그레이션 단계에서만)
+    assert not (tmp_path / 'factory.db').exists()
+
+
+def test_create_app_builds_independent_apps():
+    import app as petai_app
+    first = petai_app.create_app({'SECRET_KEY': 'a'})
+    second = petai_app.create_app({'SECRET_KEY': 'b'})
+    assert first is not second
+    assert {r.rule for r in first.url_map.iter_rules()} >= {'/', '/analyze', '/jobs/<job_id>', '/metrics'}
+    assert first.test_client().get('/jobs/unknown').status_code == 404
+
+
+def test_metrics_exports_db_pool_stats(empty_db):
+    import app as petai_app
+    import petai_db
+    with petai_db.get_connection():
+        pass
+    text = petai_app.create_app({'SECRET_KEY': 'a'}).test_client().get('/metrics').get_data(as_text=True)
+    assert 'petai_db_pool_utilization 0' in text
+    assert 'petai_db_pool_checkouts 1' in text and 'petai_db_pool_wait_seconds_max' in text
+
+
+def test_sqlite_cache_connection_is_opened_per_process(tmp_path):
+    # gunicorn preload처럼 마스터에서 app을 불러오고 캐시를 쓴 뒤 fork 해도, 워커는 자기 연결을 새로 엽니다.
+    code = ("import os, sys, app; from petai_cache import vision_cache; store = vision_cache.store; "
+            "assert store._conn is None; vision_cache.set('k', '눈곱'); parent = store._conn; pid = os.fork()\n"
+            "if pid == 0:\n"
+            "    ok = store._conn is None and vision_cache.get('k') == '눈곱' and store._conn is not parent\n"
+            "    os._exit(0 if ok else 1)\n"
+            "print(os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]))")
+    env = dict(os.environ, SQLITE_PATH=str(tmp_path / 'factory.db'), VISION_CACHE_BACKEND='sqlite',
+               VISION_CACHE_PATH=str(tmp_path / 'vision.db'))
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, env=env, text=True)
+    assert out.strip().splitlines()[-1] == '0'
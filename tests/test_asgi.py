@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('aiosqlite')
+pytest.importorskip('aiofiles')
+pytest.importorskip('a2wsgi')
+pytest.importorskip('httpx')
+
+from benchmarks.fake_gemini import FakeGenai
+from petai_llm import GeminiLimiter, set_limiter
+
+
+@pytest.fixture
+def aio_env(migrated_db, upload_store, monkeypatch):
+    import app as petai_app
+    import petai_aio
+    monkeypatch.setattr(petai_app, 'genai', FakeGenai(latency=0.2, jitter=0))
+    monkeypatch.setattr(petai_aio, 'db', petai_aio.AsyncDatabase())
+    set_limiter(GeminiLimiter(max_inflight=4, max_queue=200))
+    yield petai_aio
+    set_limiter(None)
+
+
+def test_asyncpg_sql_numbers_placeholders():
+    from petai_aio import asyncpg_sql
+    assert asyncpg_sql("SELECT %s, '%%x' WHERE a = %s") == "SELECT $1, '%x' WHERE a = $2"
+
+
+def test_async_search_matches_sync_search(aio_env):
+    import app as petai_app
+
+    async def run():
+        try:
+            return await aio_env.search_symptoms('눈곱 결막염'), await aio_env.search_db_by_image_label('결막염')
+        finally:
+            await aio_env.db.close()
+
+    symptoms, by_label = asyncio.run(run())
+    assert symptoms == petai_app.search_symptoms('눈곱 결막염')
+    assert by_label == petai_app.search_db_by_image_label('결막염')
+
+
+def test_concurrent_analyses_share_one_thread(aio_env):
+    # 동시 호출 수(GEMINI_ASYNC_MAX_INFLIGHT)만큼 Gemini 대기가 겹치므로 100개 분석이 순차 실행보다 훨씬 빨리 끝납니다.
+    async def run():
+        try:
+            return await asyncio.gather(*(aio_env.run_analysis({"symptoms": f"기침 {i}"}, None, [])
+                                          for i in range(100)))
+        finally:
+            await aio_env.db.close()
+
+    started = time.monotonic()
+    results = asyncio.run(run())
+    assert time.monotonic() - started < 5
+    assert all(r.get('analysis_id') and not r.get('fallback') for r in results)
+
+
+def test_asgi_app_serves_async_and_flask_routes(aio_env, jpeg):
+    from starlette.testclient import TestClient
+    import asgi
+    with TestClient(asgi.create_asgi_app()) as client:
+        assert client.get('/').status_code == 200
+        assert client.post('/analyze', data={'symptoms': ''}).status_code == 400
+
+        form = {'symptoms': f'눈곱이 껴요 {time.time()}', 'behaviors': ['과도한 그루밍']}
+        files = {'image': ('cat.jpg', jpeg('red'), 'image/jpeg')}
+        response = client.post('/analyze', data=form, files=files, follow_redirects=False)
+        assert response.status_code == 303 and response.headers['location'].startswith('/results/')
+        assert client.get(response.headers['location']).status_code == 200
+        # 같은 입력은 저장된 결과로 바로 보냅니다.
+        again = client.post('/analyze', data=form, files=files, follow_redirects=False)
+        assert again.headers['location'] == response.headers['location']
+
+        page = client.post('/analyze', data={'symptoms': f'재채기 {time.time()}', 'stream': '1'})
+        token = page.text.split('const streamToken = "')[1].split('"')[0]
+        events = client.get('/analyze/stream', params={'token': token}).text
+        assert 'event: context' in events and 'event: done' in events
+        assert client.get('/analyze/stream', params={'token': 'bad'}).status_code == 400
+
+
+def test_async_analysis_runs_the_shared_stages(aio_env, upload_store, jpeg, monkeypatch):
+    import app as petai_app
+    from petai_fallback import NOTICES
+    from petai_pipeline import add_stage_observer
+    import threading
+    seen, fallback_threads = [], []
+    add_stage_observer(lambda name, seconds, status: seen.append((name, status)))
+    monkeypatch.setattr(petai_app, 'ANALYSIS_DEADLINE', 0.1)
+    fallback_diagnosis = petai_app.fallback_diagnosis
+
+    def record_thread(*args):
+        fallback_threads.append(threading.get_ident())
+        return fallback_diagnosis(*args)
+
+    monkeypatch.setattr(petai_app, 'fallback_diagnosis', record_thread)
+    image_key = upload_store.put(jpeg((201, 7, 88)), 'jpg')
+    form = {'symptoms': f'눈곱 {time.time()}'}
+
+    async def run():
+        try:
+            result = await aio_env.run_analysis(form, image_key, [])
+            return result, [event async for event in aio_env.stream_analysis_events(form, image_key, [])]
+        finally:
+            await aio_env.db.close()
+
+    result, events = asyncio.run(run())
+    # 동기 경로와 같은 단계(관찰자 포함)와 같은 대체 진단 판단을 씁니다.
+    assert ('vision', 'timeout') in seen and ('symptoms', 'ok') in seen
+    assert result['fallback'] and 'diagnosis_key' not in result
+    assert NOTICES['timeout'] in result['gemini_response']
+    assert [e.split('\n')[0] for e in events[:3]] == ['event: context', 'event: context', 'event: chunk']
+    assert '"fallback": true' in events[2] and events[-1].startswith('event: done')
+    # 대체 진단(질병 인덱스를 DB에서 읽을 수 있음)은 이벤트 루프 스레드에서 실행하지 않습니다.
+    assert len(fallback_threads) == 2 and threading.get_ident() not in fallback_threads
@@ -0,0 +1,80 @@
+import csv
+import random
+
+import numpy as np
+import pytest
+
+from petai_batch import (BEHAVIOR_NAMES, behavior_records, main, score_behaviors, score_obesity)
+from petai_utils import analyze_behaviors, assess_cat_obesity, assess_dog_obesity
+
+
+def random_cohort(n, seed=0):
+    rnd = random.Random(seed)
+    species = [rnd.choice(['고양이', '강아지', '햄스터']) for _ in range(n)]
+    ages = [rnd.choice([0.5, 0.99, 1.0, 3.0, 12.0]) for _ in range(n)]
+    # 경계값(4.5 * 1.2, 4.5 * 1.3)을 포함합니다.
+    weights = [rnd.choice([4.5, 4.5 * 1.2, 5.5, 4.5 * 1.3, 5.9, 7.0, rnd.uniform(2, 9)]) for _ in range(n)]
+    return species, ages, weights
+
+
+def scalar_obesity(species, age, weight):
+    if species == '고양이':
+        return assess_cat_obesity(age, weight)
+    if species == '강아지':
+        return assess_dog_obesity(age, weight)
+    return None
+
+
+def test_score_obesity_matches_scalar_functions():
+    species, ages, weights = random_cohort(2000)
+    scores = score_obesity(species, np.array(ages), np.array(weights))
+    for i, (s, a, w) in enumerate(zip(species, ages, weights)):
+        expected = scalar_obesity(s, a, w)
+        if expected is None:
+            assert not scores['assessable'][i] and scores['status'][i] == ''
+            continue
+        assert scores['assessable'][i] == expected['assessable']
+        assert scores['status'][i] == expected.get('status', '')
+        if 'ideal_kg' in expected:
+            assert scores['ideal_kg'][i] == expected['ideal_kg']
+
+
+def test_score_behaviors_matches_analyze_behaviors():
+    rnd = random.Random(1)
+    texts = [rnd.choice(["피부에 발진이 있어요", "탈모", "밥을 안 먹어요", "피 부가 빨개요", "", None]) for _ in range(500)]
+    flags = np.array([[rnd.random() < 0.3 for _ in BEHAVIOR_NAMES] for _ in range(500)])
+    scores = score_behaviors(flags, texts)
+    for i, text in enumerate(texts):
+        selected = [name for name, on in zip(BEHAVIOR_NAMES, flags[i]) if on]
+        assert behavior_records(flags[i], scores['priority'][i], scores['levels']) == analyze_behaviors(selected, text)
+        assert scores['count'][i] == len(selected)
+
+
+def test_cli_streams_csv_in_chunks(tmp_path):
+    source = tmp_path / 'cohort.csv'
+    species, ages, weights = random_cohort(1001, seed=2)
+    with open(source, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['pet_id', 'species', 'age', 'weight', 'symptoms', '설사'])
+        for i, row in enumerate(zip(species, ages, weights)):
+            writer.writerow([i, *row, '구토', i % 2])
+    target = tmp_path / 'scored.csv'
+    assert main([str(source), str(target), '--chunk-size', '100']) == 1001
+
+    with open(target, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1001
+    for row, s, a, w in zip(rows, species, ages, weights):
+        expected = scalar_obesity(s, a, w)
+        assert row['obesity_status'] == ((expected or {}).get('status') or '')
+        assert row['behavior_count'] == str(int(row['pet_id']) % 2)
+
+
+def test_cli_parquet_roundtrip(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = pa.table({'species': ['고양이', '강아지'], 'age': [3.0, 0.5], 'weight': [7.0, 5.0]})
+    pq.write_table(table, tmp_path / 'in.parquet')
+    assert main([str(tmp_path / 'in.parquet'), str(tmp_path / 'out.parquet'), '--chunk-size', '1']) == 2
+    out = pq.read_table(tmp_path / 'out.parquet').to_pydict()
+    assert out['obesity_status'] == ['비만', '']
@@ -0,0 +1,115 @@
+import pytest
+
+from benchmarks.bench_pipeline import percentile, summarize, _multipart
+from benchmarks.fake_gemini import FakeGenai, DIAGNOSIS_TEXT, VISION_LABEL
+
+
+def test_percentile_interpolates():
+    values = [0.1, 0.2, 0.3, 0.4]
+    assert percentile(values, 0.0) == 0.1
+    assert percentile(values, 1.0) == 0.4
+    assert abs(percentile(values, 0.5) - 0.25) < 1e-9
+
+
+def test_summarize_reports_milliseconds_and_rps():
+    report = summarize([0.1, 0.2, 0.3], wall_seconds=1.5)
+    assert report['count'] == 3
+    assert report['p50_ms'] == 200.0
+    assert report['rps'] == 2.0
+
+
+def test_fake_gemini_answers_vision_and_streamed_diagnosis():
+    fake = FakeGenai(latency=0, jitter=0, seed=0)
+    model = fake.GenerativeModel('gemini-1.5-flash')
+    assert model.generate_content(["프롬프트", {"mime_type": "image/jpeg", "data": b""}]).text == VISION_LABEL
+    chunks = model.generate_content("진단 프롬프트", stream=True)
+    assert "".join(chunk.text for chunk in chunks) == DIAGNOSIS_TEXT
+    assert fake.calls == 2
+
+
+def test_multipart_body_contains_fields_and_image():
+    body, content_type = _multipart({"pet_type": "고양이", "behaviors": ["a", "b"]}, b"PNGDATA")
+    boundary = content_type.split('boundary=')[1]
+    assert body.count(f'--{boundary}'.encode()) == 5
+    assert 'name="pet_type"\r\n\r\n고양이'.encode() in body
+    assert b'filename="bench.png"' in body and b'PNGDATA' in body
+
+
+def _post_json(url, body):
+    import json
+    import urllib.error
+    import urllib.request
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def test_mock_gemini_server_answers_and_injects_errors():
+    import json
+    import urllib.request
+    from benchmarks.mock_gemini_server import MockGemini, MockGeminiServer, Script
+
+    server = MockGeminiServer(mock=MockGemini(Script(latency=0, jitter=0), seed=0)).start()
+    try:
+        url = f'{server.base_url}/v1beta/models/gemini-1.5-flash:generateContent'
+        status, body = _post_json(url, {"contents": [{"parts": [{"text": "진단"}]}]})
+        assert status == 200 and body['candidates'][0]['content']['parts'][0]['text'] == DIAGNOSIS_TEXT
+        image = {"contents": [{"parts": [{"text": "라벨"}, {"inlineData": {"mimeType": "image/jpeg", "data": ""}}]}]}
+        assert _post_json(url, image)[1]['candidates'][0]['content']['parts'][0]['text'] == VISION_LABEL
+
+        server.mock.script = Script(latency=0, jitter=0, error_rate=1.0, error_status=429)
+        assert _post_json(url, image)[0] == 429
+        with urllib.request.urlopen(f'{server.base_url}/stats', timeout=5) as response:
+            stats = json.loads(response.read())
+        assert stats['requests']['diagnosis'] == 1 and stats['requests']['vision'] == 2
+        assert stats['errors']['vision'] == 1
+    finally:
+        server.stop()
+
+
+def test_mock_script_phases_override_previous_phase():
+    from benchmarks.mock_gemini_server import Script
+    script = Script([{"at": 0, "diagnosis": {"latency": 3.0}},
+                     {"at": 30, "diagnosis": {"error_rate": 0.5}}], latency=1.0)
+    assert script.behavior('diagnosis', 10)['latency'] == 3.0
+    assert script.behavior('diagnosis', 10)['error_rate'] == 0.0
+    assert script.behavior('diagnosis', 45) == {**script.behavior('diagnosis', 10), "error_rate": 0.5}
+    assert script.behavior('vision', 45)['latency'] == 1.0
+
+
+def test_scenarios_build_expected_forms():
+    import random
+    from benchmarks.load_scenarios import SCENARIOS, parse_mix
+    rnd, names = random.Random(0), [f"행동{i}" for i in range(10)]
+    form, image = SCENARIOS['behavior'].build(1, rnd, [b'img'], names)
+    assert image is None and 3 <= len(form['behaviors']) <= 6 and form['no_cache'] == '1'
+    assert SCENARIOS['image_symptom'].build(2, rnd, [b'img'], names)[1] == b'img'
+    assert 'behaviors' not in SCENARIOS['symptom'].build(3, rnd, [b'img'], names)[0]
+    assert [(s.name, w) for s, w in parse_mix('symptom=0.7,behavior=0.3')] == [('symptom', 0.7), ('behavior', 0.3)]
+    with pytest.raises(ValueError):
+        parse_mix('unknown=1')
+
+
+def _step(users, rps, p95=100.0, error_rate=0.0, rss=100.0):
+    return {"users": users, "rps": rps, "latency": {"p95_ms": p95}, "error_rate": error_rate,
+            "memory": {"worker_rss_mb_max": rss}}
+
+
+def test_find_saturation_reports_first_breached_step():
+    from benchmarks.load_scenarios import capacity, find_saturation
+    steps = [_step(2, 4.0), _step(4, 7.5), _step(8, 8.0), _step(16, 8.1, error_rate=0.2)]
+    saturation = find_saturation(steps)
+    assert saturation == {"users": 8, "reasons": ['throughput_plateau'], "last_good_users": 4}
+    assert capacity(steps, saturation)['users'] == 4
+    assert find_saturation(steps[:2], slo_p95_ms=50)['reasons'] == ['p95']
+    assert find_saturation(steps[:2]) is None
+
+
+def test_compare_flags_capacity_and_memory_regressions():
+    from benchmarks.load_scenarios import compare
+    baseline = {"capacity": {"rps": 10.0, "worker_rss_mb_max": 100.0}}
+    assert compare({"capacity": {"rps": 9.5, "worker_rss_mb_max": 105.0}}, baseline) == []
+    assert len(compare({"capacity": {"rps": 8.0, "worker_rss_mb_max": 130.0}}, baseline)) == 2
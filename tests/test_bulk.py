@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from petai_analyses import analyses, input_hash
+from petai_bulk import BulkError, BulkRunner, parse_manifest, read_zip
+
+
+@pytest.fixture
+def bulk_env(migrated_db, upload_store):
+    return upload_store
+
+
+class CountingAnalyze:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, form, image_key, behaviors):
+        with self._lock:
+            self.calls.append((form.get('symptoms'), image_key, tuple(behaviors)))
+        time.sleep(0.01)
+        return {"gemini_response": f"<p>{form.get('symptoms')}</p>", "image_path": image_key}
+
+
+def test_parse_manifest_reports_bad_lines_and_limits(monkeypatch):
+    items = parse_manifest([b'{"symptoms": "a"}', b'', b'not json', b'[1]', '{"symptoms": "눈곱"}'.encode('cp949')])
+    assert items[0] == {"symptoms": "a"} and all('error' in item for item in items[1:])
+    assert items[3]['error'].startswith("5번째 줄")
+    monkeypatch.setattr('petai_bulk.MAX_ITEMS', 1)
+    with pytest.raises(BulkError):
+        parse_manifest([b'{}', b'{}'])
+
+
+def test_runner_dedupes_images_and_inputs(bulk_env, jpeg):
+    photo = jpeg('red')
+    images = {'a.jpg': lambda: photo, 'b.jpg': lambda: photo, 'c.jpg': lambda: jpeg('blue')}
+    items = [
+        {"id": "1", "symptoms": "눈곱", "image": "a.jpg"},
+        {"id": "2", "symptoms": "눈곱", "image": "b.jpg"},     # 같은 사진, 같은 입력
+        {"id": "3", "symptoms": "눈곱", "image": "c.jpg"},
+        {"id": "4", "symptoms": "설사", "age": "많음"},
+        {"id": "5"},
+        {"id": "6", "symptoms": "구토", "image": "missing.jpg"},
+    ]
+    analyze = CountingAnalyze()
+    lines = list(BulkRunner(analyze, workers=2).run(items, images))
+    summary = lines.pop()['summary']
+    by_id = {line['id']: line for line in lines}
+    assert len(analyze.calls) == 2 and summary['analyses_run'] == 2 and summary['images'] == 2
+    assert by_id['1']['status'] == by_id['2']['status'] == 'ok'
+    assert by_id['1']['result'] == by_id['2']['result'] != by_id['3']['result']
+    assert {by_id[i]['status'] for i in ('4', '5', '6')} == {'error'}
+    assert summary['ok'] == 3 and summary['error'] == 3
+
+
+def test_runner_returns_stored_results_without_analyzing(bulk_env):
+    form = {"symptoms": "재채기", "pet_type": "고양이"}
+    analysis_id = analyses.save(input_hash(form, None, []), {"gemini_response": "<p>저장됨</p>"}, "")
+    analyze = CountingAnalyze()
+    items = [{"id": "s", **form}, {"id": "n", **form, "no_cache": 1}]
+    lines = list(BulkRunner(analyze).run(items))
+    stored = next(line for line in lines if line.get('id') == 's')
+    assert stored['cached'] and stored['analysis_id'] == analysis_id
+    assert len(analyze.calls) == 1 and lines[-1]['summary']['cached'] == 1
+
+
+def test_bulk_endpoint_streams_ndjson(bulk_env, jpeg, monkeypatch):
+    import app as petai_app
+    from benchmarks.fake_gemini import FakeGenai
+    from petai_llm import GeminiLimiter, set_limiter
+    monkeypatch.setattr(petai_app, 'genai', FakeGenai(latency=0, jitter=0))
+    set_limiter(GeminiLimiter())
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, 'w') as archive:
+        manifest = [{"id": "x", "symptoms": f"눈곱이 껴요 {time.time()}", "image": "photos/x.jpg"},
+                    {"id": "y", "pet_type": "강아지", "symptoms": f"기침 {time.time()}", "age": 5, "weight": 10}]
+        archive.writestr('manifest.jsonl', '\n'.join(json.dumps(m, ensure_ascii=False) for m in manifest))
+        archive.writestr('photos/x.jpg', jpeg('green'))
+    client = petai_app.create_app({'SECRET_KEY': 'x'}).test_client()
+    response = client.post('/analyze/bulk', data={'archive': (BytesIO(buf.getvalue()), 'intake.zip')})
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[-1]['summary']['ok'] == 2
+    assert all(line['url'].startswith('/results/') for line in lines[:-1])
+    assert client.post('/analyze/bulk', data={'manifest': ''}).status_code == 400
+    bad = client.post('/analyze/bulk', data={'manifest': (BytesIO('{"symptoms": "기침"}'.encode('cp949')), 'm.jsonl')})
+    assert bad.status_code == 200 and 'error' in json.loads(bad.get_data(as_text=True).splitlines()[0])
+
+
+def test_read_zip_requires_manifest():
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, 'w') as archive:
+        archive.writestr('x.jpg', b'')
+    with pytest.raises(BulkError):
+        read_zip(buf)
@@ -0,0 +1,95 @@
+import time
+
+from PIL import Image
+
+from petai_cache import MemoryStore, SQLiteStore, DBStore, ResultCache, image_cache_key
+
+
+def test_memory_store_lru_bound():
+    cache = ResultCache(MemoryStore(max_entries=2))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1      # a를 최근 사용으로 갱신
+    cache.set("c", 3)               # b가 밀려남
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_expiry():
+    cache = ResultCache(MemoryStore(), ttl=0.01)
+    cache.set("k", "v")
+    time.sleep(0.02)
+    assert cache.get("k") is None
+
+
+def test_sqlite_store_roundtrip_and_eviction(tmp_path):
+    cache = ResultCache(SQLiteStore(str(tmp_path / 'c.db'), max_entries=2))
+    cache.set("a", {"label": "눈곱"})
+    cache.set("b", "x")
+    cache.set("c", "y")
+    assert len(cache.store) == 2
+    assert cache.get("c") == "y"
+
+
+def test_db_store_uses_app_database(migrated_db):
+    cache = ResultCache(DBStore('vision_cache'))
+    cache.set("k", "피부 발진")
+    assert cache.get("k") == "피부 발진"
+
+
+def test_expired_entry_delete_failure_is_a_miss():
+    class FailingDelete(MemoryStore):
+        def delete(self, key):
+            raise RuntimeError("DB 연결 끊김")
+
+    cache = ResultCache(FailingDelete())
+    cache.set("k", "값", ttl=-1)
+    assert cache.get("k") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_image_cache_key_ignores_container_format(tmp_path):
+    image = Image.new('RGB', (40, 30), (200, 10, 10))
+    image.putpixel((5, 5), (0, 0, 0))
+    image.save(tmp_path / 'a.png')
+    image.save(tmp_path / 'b.bmp')
+    with Image.open(tmp_path / 'a.png') as a, Image.open(tmp_path / 'b.bmp') as b:
+        assert image_cache_key(a) == image_cache_key(b)
+    assert image_cache_key(image) != image_cache_key(Image.new('RGB', (40, 30)))
+
+
+def test_get_or_compute_coalesces_concurrent_calls():
+    import threading
+    cache = ResultCache(MemoryStore())
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(1)
+        return "진단"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == ["진단"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+
+    assert cache.get_or_compute("k", lambda: "새 응답", bypass=True) == "새 응답"
+    assert cache.get("k") == "새 응답"
+
+
+def test_prompt_key_ignores_template_whitespace():
+    from petai_cache import prompt_cache_key
+    a = "\n        당신은   수의사입니다.\n\n        [보호자 관찰 내용]\n구토\n"
+    b = "당신은 수의사입니다.\n[보호자 관찰 내용]\n    구토"
+    assert prompt_cache_key("m", a) == prompt_cache_key("m", b)
+    assert prompt_cache_key("m", a) != prompt_cache_key("m", "설사")
@@ -0,0 +1,63 @@
+import os
+import threading
+
+import pytest
+import petai_db
+
+
+@pytest.fixture
+def sqlite_db(empty_db):
+    with petai_db.get_connection() as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+
+
+def test_commit_and_dict_rows(sqlite_db):
+    with petai_db.get_connection() as conn:
+        conn.execute(f"INSERT INTO items (name) VALUES ({petai_db.placeholder()})", ("눈곱",))
+    with petai_db.get_connection() as conn:
+        cur = petai_db.dict_cursor(conn)
+        cur.execute("SELECT * FROM items")
+        assert dict(cur.fetchone()) == {"id": 1, "name": "눈곱"}
+
+
+def test_rollback_on_error(sqlite_db):
+    with pytest.raises(RuntimeError):
+        with petai_db.get_connection() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('x')")
+            raise RuntimeError("중단")
+    with petai_db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
+
+def test_connection_per_thread_and_stats(sqlite_db):
+    seen = []
+
+    def worker():
+        with petai_db.get_connection() as conn:
+            seen.append(id(conn))
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(seen)) == 3
+    stats = petai_db.pool_stats()
+    assert stats["backend"] == "sqlite"
+    assert stats["in_use"] == 0
+    assert stats["checkouts"] >= 4
+    assert petai_db.health_check() is True
+
+
+@pytest.mark.skipif(not os.environ.get('TEST_DATABASE_URL'), reason="TEST_DATABASE_URL이 필요합니다.")
+def test_postgres_pool_waits_and_reuses():
+    pool = petai_db.PostgresPool(os.environ['TEST_DATABASE_URL'], minconn=1, maxconn=1, timeout=0.2)
+    with pool.connection() as conn:
+        first = id(conn)
+        with pytest.raises(petai_db.PoolTimeout):
+            with pool.connection():
+                pass
+    with pool.connection() as conn:
+        assert id(conn) == first
+    assert pool.stats.snapshot()["timeouts"] == 1
+    pool.close()
@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from petai_fallback import diagnose, rank_diseases, render_markdown
+from petai_migrations import SEED_DISEASES
+
+DISEASES = [dict(zip(('disease_name', 'image_labels', 'text_symptoms', 'warning_level', 'advice'), row), id=i)
+            for i, row in enumerate(SEED_DISEASES, start=1)]
+
+
+def names(matches):
+    return [d['disease_name'] for d in matches]
+
+
+def test_ranks_diseases_from_inflected_symptom_text():
+    matches = rank_diseases("눈곱이 끼고 콧물이랑 재채기를 해요", diseases=DISEASES)
+    assert names(matches)[0] == "고양이 허피스 바이러스 (상부 호흡기 감염)"
+    assert set(matches[0]['matched_symptoms']) >= {"눈곱", "콧물", "재채기"}
+    assert names(rank_diseases("깽깽이걸음을 하고 다리를 절음", diseases=DISEASES))[0] == "슬개골 탈구 (강아지)"
+
+
+def test_ranking_is_deterministic_and_uses_behaviours_and_related():
+    first = rank_diseases("눈이 붉고 눈곱", diseases=DISEASES)
+    assert first == rank_diseases("눈이 붉고 눈곱", diseases=DISEASES)
+    # 이상행동의 의심 원인(피부 알레르기)만으로도 후보가 나옵니다.
+    assert "알레르기성 피부염 (의심)" in names(rank_diseases("", behaviors=["과도한 핥기"], diseases=DISEASES))
+    related = rank_diseases("눈물", related=[DISEASES[2]], diseases=DISEASES)
+    assert names(related)[0] == "결막염 (의심)"
+    assert rank_diseases("", diseases=DISEASES) == []
+    assert rank_diseases("오늘 날씨가 좋아요", diseases=DISEASES) == []
+
+
+def test_markdown_has_the_diagnosis_sections():
+    text = render_markdown(rank_diseases("흐릿한 눈, 하얀 동공", diseases=DISEASES), reason='timeout',
+                           behavior_analysis=[{"behavior": "과도한 핥기", "priority": "높음"}])
+    for heading in ("### 핵심 요약", "### 상세 설명", "### 권장 조치"):
+        assert heading in text
+    assert "백내장" in text and "경고 단계" in text and "과도한 핥기" in text
+    assert "찾지 못했습니다" in render_markdown([], reason='error')
+
+
+def test_diagnose_ranks_the_app_disease_table(migrated_db):
+    from petai_fallback import NOTICES
+    result = diagnose("눈곱이 끼고 재채기를 해요", behaviors=["과도한 핥기"], reason='error')
+    assert names(result['matches'])[0] == "고양이 허피스 바이러스 (상부 호흡기 감염)"
+    assert "### 핵심 요약" in result['markdown'] and NOTICES['error'] in result['markdown']
+    assert diagnose("오늘 날씨가 좋아요")['matches'] == []
+
+
+def test_large_disease_table_stays_within_budget():
+    many = [dict(DISEASES[i % len(DISEASES)], id=i, disease_name=f"질병 {i}") for i in range(20000)]
+    started = time.perf_counter()
+    matches = rank_diseases("눈곱이 끼고 재채기를 해요", diseases=many, budget=0.05)
+    assert time.perf_counter() - started < 0.2
+    assert matches
+
+
+@pytest.fixture
+def slow_gemini(migrated_db, monkeypatch):
+    import app as petai_app
+    from benchmarks.fake_gemini import FakeGenai
+    from petai_llm import GeminiLimiter, set_limiter
+    monkeypatch.setattr(petai_app, 'genai', FakeGenai(latency=0.6, jitter=0, seed=1))
+    monkeypatch.setattr(petai_app, 'ANALYSIS_DEADLINE', 0.2)
+    set_limiter(GeminiLimiter())
+    yield petai_app
+    set_limiter(None)
+
+
+def test_slow_gemini_falls_back_then_late_answer_is_served(slow_gemini):
+    form = {'pet_type': '고양이', 'symptoms': f"눈곱이 껴요 {time.time()}", 'age': '3', 'weight': '4'}
+    started = time.perf_counter()
+    result = slow_gemini.run_analysis_task(form, None, ["식욕부진"])
+    assert time.perf_counter() - started < 0.5
+    assert result['fallback'] and 'error' not in result
+    assert "핵심 요약" in result['gemini_response'] and result['behavior_analysis']
+
+    client = slow_gemini.create_app({'SECRET_KEY': 'test'}).test_client()
+    assert client.get(f"/diagnosis/{result['diagnosis_key']}").status_code == 202
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        response = client.get(f"/diagnosis/{result['diagnosis_key']}")
+        if response.status_code == 200:
+            assert "결막염" in response.get_json()['html']
+            break
+        time.sleep(0.05)
+    else:
+        raise AssertionError("늦게 도착한 Gemini 답변을 받지 못했습니다.")
+
+
+def test_stream_sends_fallback_before_slow_gemini(slow_gemini):
+    form = {'pet_type': '고양이', 'symptoms': f"재채기를 해요 {time.time()}"}
+    with slow_gemini.create_app({'SECRET_KEY': 'test'}).test_request_context():
+        events = list(slow_gemini.stream_analysis_events(form, None, []))
+    chunks = [e for e in events if e.startswith('event: chunk')]
+    assert '"fallback": true' in chunks[0]
+    assert '"fallback"' not in chunks[-1] and events[-1].startswith('event: done')
+
+
+def test_deadline_while_gathering_context_is_a_timeout(slow_gemini, upload_store, jpeg):
+    from petai_fallback import NOTICES
+    # 사진 분석(0.6초)이 전체 제한 시간(0.2초)에 걸려 프롬프트를 만들기 전에 끝나도 '시간 초과' 안내입니다.
+    image_key = upload_store.put(jpeg((31, 97, 13)), 'jpg')
+    result = slow_gemini.run_analysis_task({'symptoms': f"눈곱 {time.time()}"}, image_key, [])
+    assert result['fallback'] and 'diagnosis_key' not in result
+    assert NOTICES['timeout'] in result['gemini_response']
+
+    # 스트리밍도 사진 분석을 제한 시간 안에서 끊고 로컬 진단을 먼저 보냅니다.
+    started = time.perf_counter()
+    with slow_gemini.create_app({'SECRET_KEY': 'test'}).test_request_context():
+        events = slow_gemini.stream_analysis_events({'symptoms': f"눈곱 {time.time()}"}, image_key, [])
+        context = [next(events), next(events)]
+        fallback = next(events)
+        events.close()
+    assert time.perf_counter() - started < 0.5
+    assert context[1].startswith('event: context') and '"fallback": true' in fallback
+
+
+def test_late_diagnosis_escapes_raw_html(migrated_db):
+    import app as petai_app
+    from petai_cache import prompt_cache
+    key = f"late-{time.time()}"
+    prompt_cache.set(key, "**결막염**입니다. <script>alert(1)</script>")
+    html = petai_app.create_app({'SECRET_KEY': 'test'}).test_client().get(f'/diagnosis/{key}').get_json()['html']
+    assert "<strong>결막염</strong>" in html and "<script>" not in html and "&lt;script&gt;" in html
@@ -0,0 +1,70 @@
+import gzip
+import os
+
+from petai_fragments import Fragments, StaticPayload, BEHAVIOR_NAMES
+from petai_utils import BEHAVIOR_DB, assess_dog_obesity
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_fragments_render_once():
+    fragments = Fragments()
+    built = fragments.build()
+    assert fragments.build() is built
+    assert '<ul>' in fragments.dog_bcs_guide and '갈비뼈 확인' in fragments.dog_bcs_guide
+    name = BEHAVIOR_NAMES[0]
+    card = fragments.behavior_card(name)
+    assert name in card and BEHAVIOR_DB[name]['coaching'] in card
+    assert fragments.behavior_card('없는 행동') is None
+    assert fragments.behavior_options.count('type="checkbox"') == len(BEHAVIOR_DB)
+
+
+def test_dog_guide_is_shared_constant():
+    result = assess_dog_obesity(3, 10)
+    assert result['status'] == '평가 가이드' and result['message'].startswith('**강아지 신체 상태 점수')
+
+
+def test_static_payload_precompresses_with_strong_etag():
+    import app as petai_app
+    payload = StaticPayload('<p>' + 'x' * 2000 + '</p>', 'text/html')
+    with petai_app.app.test_request_context('/', headers={'Accept-Encoding': 'gzip, deflate'}):
+        response = payload.response()
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.get_data()) == payload.body
+        assert response.get_etag() == (payload.etag + '-gz', False)
+        assert 'no-cache' in response.headers['Cache-Control']
+    with petai_app.app.test_request_context('/', headers={'If-None-Match': f'"{payload.etag}"'}):
+        response = payload.response(max_age=60)
+        assert response.status_code == 304 and 'Content-Encoding' not in response.headers
+
+
+def test_index_and_style_are_served_with_etags():
+    import app as petai_app
+    client = petai_app.create_app({'SECRET_KEY': 'x'}).test_client()
+    first = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200 and first.headers['Content-Encoding'] == 'gzip'
+    html = gzip.decompress(first.get_data()).decode('utf-8')
+    assert BEHAVIOR_NAMES[-1] in html
+    etag = first.headers['ETag']
+    assert not etag.startswith('W/')
+    repeat = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert repeat.status_code == 304
+
+    # 첫 화면의 CSS 링크에는 내용 해시가 붙어 오래 캐시됩니다.
+    css_url = '/static/style.css?v=' + html.split('/static/style.css?v=')[1].split('"')[0]
+    css = client.get(css_url, headers={'Accept-Encoding': 'gzip'})
+    assert 'immutable' in css.headers['Cache-Control'] and css.mimetype == 'text/css'
+    with open(os.path.join(ROOT, 'static', 'style.css'), 'rb') as f:
+        assert gzip.decompress(css.get_data()) == f.read()
+    revalidate = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip', 'If-None-Match': css.headers['ETag']})
+    assert revalidate.status_code == 304
+    css.close()
+
+
+def test_error_page_renders_fresh():
+    import app as petai_app
+    client = petai_app.create_app({'SECRET_KEY': 'x'}).test_client()
+    response = client.post('/analyze', data={'symptoms': ''})
+    assert response.status_code == 400
+    body = response.get_data(as_text=True)
+    assert '반드시 입력해야 합니다' in body and BEHAVIOR_NAMES[0] in body
@@ -0,0 +1,116 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from petai_images import (DecodeBudget, ImageBusy, ImageRejected, decode_cost, ingest_image, open_image,
+                          wait_for_file_active)
+
+
+def png_bytes(size, mode='RGB'):
+    buf = BytesIO()
+    Image.new(mode, size).save(buf, 'PNG')
+    buf.seek(0)
+    return buf
+
+
+def test_ingest_downscales_and_reencodes():
+    ingested = ingest_image(png_bytes((4000, 3000)), max_edge=800)
+    assert (ingested.width, ingested.height) == (800, 600)
+    assert ingested.mime_type == 'image/jpeg'
+    assert ingested.extension == 'jpg'
+    with Image.open(BytesIO(ingested.data)) as image:
+        assert image.format == 'JPEG'
+        assert image.size == (800, 600)
+
+
+def test_ingest_keeps_small_images_and_converts_alpha():
+    ingested = ingest_image(png_bytes((300, 200), mode='RGBA'), max_edge=800, fmt='WEBP')
+    assert (ingested.width, ingested.height) == (300, 200)
+    assert ingested.mime_type == 'image/webp'
+
+
+def test_oversized_dimensions_are_rejected_from_header():
+    # 1비트 PNG는 작지만 픽셀 수가 많습니다. 디코드 전에 헤더만 보고 거절해야 합니다.
+    buf = BytesIO()
+    Image.new('1', (6000, 6000)).save(buf, 'PNG')
+    buf.seek(0)
+    budget = DecodeBudget(max_bytes=1)
+    with pytest.raises(ImageRejected):
+        ingest_image(buf, max_pixels=10_000_000, budget=budget)
+    assert budget.in_use == 0
+
+
+def test_unsupported_and_unreadable_uploads_are_rejected():
+    buf = BytesIO()
+    Image.new('RGB', (10, 10)).save(buf, 'TIFF')
+    buf.seek(0)
+    with pytest.raises(ImageRejected):
+        ingest_image(buf)
+    with pytest.raises(ImageRejected):
+        ingest_image(BytesIO(b'not an image'))
+
+
+def test_jpeg_is_decoded_at_reduced_scale():
+    buf = BytesIO()
+    Image.new('RGB', (4000, 3000), 'red').save(buf, 'JPEG')
+    buf.seek(0)
+
+    class RecordingBudget(DecodeBudget):
+        def reserve(self, nbytes):
+            self.reserved = nbytes
+            return super().reserve(nbytes)
+
+    budget = RecordingBudget()
+    ingested = ingest_image(buf, max_edge=800, budget=budget)
+    assert (ingested.width, ingested.height) == (800, 600)
+    # 두 변이 모두 800 이상인 1/2 배율(2000x1500)로 디코드하므로 원본 크기만큼 예약하지 않습니다.
+    assert budget.reserved == 2000 * 1500 * 3 * 2
+    with open_image(BytesIO(buf.getvalue())) as image:
+        assert decode_cost(image) == 4000 * 3000 * 3 * 2
+
+
+def test_decode_budget_waits_then_reports_busy():
+    budget = DecodeBudget(max_bytes=100, timeout=0.05)
+    with budget.reserve(80):
+        with pytest.raises(ImageBusy):
+            with budget.reserve(40):
+                pass
+    with budget.reserve(100):
+        assert budget.in_use == 100
+    with pytest.raises(ImageRejected):
+        with budget.reserve(101):
+            pass
+
+
+class _State:
+    def __init__(self, name):
+        self.name = name
+
+
+class _File:
+    def __init__(self, state):
+        self.name = 'files/abc'
+        self.state = _State(state)
+
+
+class _FakeGenai:
+    def __init__(self, states):
+        self.states = list(states)
+        self.calls = 0
+
+    def get_file(self, name):
+        self.calls += 1
+        return _File(self.states.pop(0))
+
+
+def test_wait_for_file_active_polls_with_backoff():
+    genai = _FakeGenai(['PROCESSING', 'ACTIVE'])
+    file = wait_for_file_active(genai, _File('PROCESSING'), timeout=1.0, initial_delay=0.01)
+    assert file.state.name == 'ACTIVE'
+    assert genai.calls == 2
+
+
+def test_wait_for_file_active_times_out():
+    genai = _FakeGenai(['PROCESSING'] * 100)
+    with pytest.raises(TimeoutError):
+        wait_for_file_active(genai, _File('PROCESSING'), timeout=0.05, initial_delay=0.02)
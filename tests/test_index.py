@@ -0,0 +1,35 @@
+import pytest
+import petai_db
+from petai_index import KeywordMatcher, DiseaseIndex, install_version_tracking, current_version
+
+
+def test_keyword_matcher_finds_overlapping_keywords():
+    m = KeywordMatcher()
+    m.add("붉은 눈", 1)
+    m.add("눈곱", 2)
+    m.add("곱", 3)
+    m.add("탈모", 4)
+    assert m.find("붉은 눈곱이 보임") == {1, 2, 3}
+    assert m.find("특이 소견 없음") == set()
+
+
+@pytest.fixture
+def disease_db(empty_db):
+    with petai_db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("CREATE TABLE diseases (id INTEGER PRIMARY KEY AUTOINCREMENT, disease_name TEXT, image_labels TEXT)")
+        install_version_tracking(cur, postgres=False)
+        cur.executemany("INSERT INTO diseases (disease_name, image_labels) VALUES (?, ?)",
+                        [("결막염", "붉은 눈,눈곱,눈물"), ("피부염", "피부 발진, 탈모")])
+
+
+def test_disease_index_matches_and_invalidates(disease_db):
+    index = DiseaseIndex(recheck_seconds=0)
+    assert [d['disease_name'] for d in index.match("왼쪽 눈에 눈곱과 탈모")] == ["결막염", "피부염"]
+    assert index.match("외관상 특이 소견 없음") == []
+
+    version = current_version()
+    with petai_db.get_connection() as conn:
+        conn.execute("INSERT INTO diseases (disease_name, image_labels) VALUES ('백내장', '하얀 동공')")
+    assert current_version() != version
+    assert [d['disease_name'] for d in index.match("하얀 동공")] == ["백내장"]
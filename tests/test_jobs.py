@@ -0,0 +1,47 @@
+import time
+
+import pytest
+from petai_jobs import ThreadJobBackend, RQJobBackend, JOB_FINISHED, JOB_FAILED
+
+
+def add(a, b):
+    return a + b
+
+
+def boom():
+    raise ValueError("실패")
+
+
+def wait_for(backend, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = backend.get(job_id)
+        if job['status'] in (JOB_FINISHED, JOB_FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("작업이 제한 시간 내에 끝나지 않았습니다.")
+
+
+def test_thread_backend_runs_job():
+    backend = ThreadJobBackend(max_workers=1)
+    job = wait_for(backend, backend.enqueue(add, 1, 2))
+    assert job['status'] == JOB_FINISHED
+    assert job['result'] == 3
+
+
+def test_thread_backend_reports_failure():
+    backend = ThreadJobBackend(max_workers=1)
+    job = wait_for(backend, backend.enqueue(boom))
+    assert job['status'] == JOB_FAILED
+    assert '실패' in job['error']
+    assert backend.get('unknown') is None
+
+
+def test_rq_backend_with_fakeredis():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('rq')
+    backend = RQJobBackend(connection=fakeredis.FakeStrictRedis(), is_async=False)
+    job = backend.get(backend.enqueue(add, 2, 3))
+    assert job['status'] == JOB_FINISHED
+    assert job['result'] == 5
+    assert backend.get('unknown') is None
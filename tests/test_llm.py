@@ -0,0 +1,184 @@
+import threading
+
+import pytest
+
+from petai_llm import (CircuitBreaker, GeminiLimiter, GeminiUnavailable, MemoryTokenBucket, RedisTokenBucket,
+                       SQLiteTokenBucket, is_retryable, set_limiter)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ApiError(Exception):
+    """google.api_core 예외처럼 HTTP 상태 코드를 code 속성에 담습니다."""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def test_memory_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    bucket = MemoryTokenBucket(rate=2.0, burst=3, clock=clock)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0.0
+
+
+def test_sqlite_bucket_is_shared_between_instances(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / 'rate.db')
+    first = SQLiteTokenBucket(path, rate=1.0, burst=2, clock=clock)
+    second = SQLiteTokenBucket(path, rate=1.0, burst=2, clock=clock)
+    assert first.try_acquire() == 0.0
+    assert second.try_acquire() == 0.0
+    assert first.try_acquire() == pytest.approx(1.0)
+
+
+def test_redis_bucket_with_fakeredis():
+    fakeredis = pytest.importorskip('fakeredis')
+    connection = fakeredis.FakeStrictRedis()
+    first = RedisTokenBucket(connection, rate=0.01, burst=2)
+    second = RedisTokenBucket(connection, rate=0.01, burst=2)
+    assert first.try_acquire() == 0.0
+    assert second.try_acquire() == 0.0
+    assert first.try_acquire() > 0
+
+
+def test_is_retryable():
+    assert is_retryable(ApiError(429)) and is_retryable(ApiError(503)) and is_retryable(TimeoutError())
+    assert not is_retryable(ApiError(400)) and not is_retryable(ValueError())
+
+
+def test_retries_transient_errors_with_backoff():
+    sleeps = []
+    limiter = GeminiLimiter(max_retries=3, sleep=sleeps.append)
+    outcomes = [ApiError(429), ApiError(503), "ok"]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call(flaky) == "ok"
+    assert len(sleeps) == 2 and all(0 <= s <= limiter.backoff_cap for s in sleeps)
+    assert limiter.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_retryable_error_is_raised_immediately():
+    calls = []
+
+    def bad():
+        calls.append(1)
+        raise ApiError(400)
+
+    with pytest.raises(ApiError):
+        GeminiLimiter(sleep=lambda s: None).call(bad)
+    assert len(calls) == 1
+
+
+def test_breaker_opens_and_recovers_after_reset():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=clock)
+    limiter = GeminiLimiter(max_retries=5, breaker=breaker, sleep=lambda s: None)
+
+    def down():
+        raise ApiError(503)
+
+    with pytest.raises(GeminiUnavailable) as rejected:
+        limiter.call(down)
+    assert rejected.value.reason == 'circuit_open' and rejected.value.retry_after == 30
+    with pytest.raises(GeminiUnavailable):
+        limiter.check_admission()
+
+    clock.now += 31
+    limiter.check_admission()
+    assert limiter.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_mid_stream_errors_open_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=FakeClock())
+    limiter = GeminiLimiter(breaker=breaker, sleep=lambda s: None)
+
+    def failing_stream():
+        # 첫 응답은 성공하고, 조각을 읽는 도중에 503이 납니다.
+        def chunks():
+            yield "첫 조각"
+            raise ApiError(503)
+        return chunks()
+
+    for _ in range(2):
+        with limiter.slot():
+            stream = limiter.stream_in_slot(failing_stream)
+            with pytest.raises(ApiError):
+                list(stream)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(GeminiUnavailable):
+        limiter.check_admission()
+
+
+def test_completed_stream_records_success():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30, clock=clock)
+    limiter = GeminiLimiter(breaker=breaker, sleep=lambda s: None)
+    breaker.record_failure()
+    clock.now += 31
+    with limiter.slot():
+        assert list(limiter.stream_in_slot(lambda: iter(["a", "b"]))) == ["a", "b"]
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_full_queue_is_rejected_without_waiting():
+    limiter = GeminiLimiter(max_inflight=1, max_queue=1, queue_timeout=5)
+    release = threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    holder = threading.Thread(target=limiter.call, args=(hold,))
+    holder.start()
+    started.wait(5)
+    waiter = threading.Thread(target=limiter.call, args=(lambda: None,))
+    waiter.start()
+    while limiter.stats()['waiting'] == 0:
+        pass
+    with pytest.raises(GeminiUnavailable) as rejected:
+        limiter.call(lambda: None)
+    assert rejected.value.reason == 'queue_full'
+    release.set()
+    holder.join()
+    waiter.join()
+    assert limiter.stats() == {"inflight": 0, "waiting": 0, "breaker": CircuitBreaker.CLOSED}
+
+
+def test_rate_limit_rejects_when_wait_exceeds_queue_timeout():
+    bucket = MemoryTokenBucket(rate=0.001, burst=1)
+    limiter = GeminiLimiter(bucket=bucket, queue_timeout=0.5)
+    assert limiter.call(lambda: 1) == 1
+    with pytest.raises(GeminiUnavailable) as rejected:
+        limiter.call(lambda: 2)
+    assert rejected.value.reason == 'rate_limited'
+
+
+def test_analyze_returns_503_with_retry_after_when_breaker_is_open():
+    import app as petai_app
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=12)
+    breaker.record_failure()
+    set_limiter(GeminiLimiter(breaker=breaker))
+    try:
+        client = petai_app.create_app({'SECRET_KEY': 'test'}).test_client()
+        response = client.post('/analyze', data={'symptoms': '눈곱이 껴요', 'pet_type': '고양이'})
+        assert response.status_code == 503
+        assert 1 <= int(response.headers['Retry-After']) <= 12
+    finally:
+        set_limiter(None)
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+from flask import Flask
+
+import petai_metrics as metrics
+from petai_metrics import Counter, Histogram, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('t_seconds', '테스트', ('stage',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage='db')
+    histogram.observe(0.5, stage='db')
+    histogram.observe(5, stage='db')
+    text = '\n'.join(histogram.render())
+    assert 't_seconds_bucket{stage="db",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="db",le="1.0"} 2' in text
+    assert 't_seconds_bucket{stage="db",le="+Inf"} 3' in text
+    assert 't_seconds_count{stage="db"} 3' in text
+    assert 't_seconds_sum{stage="db"} 5.55' in text
+
+
+def test_counter_is_thread_safe_and_escapes_labels():
+    counter = Counter('t_total', '테스트', ('kind',))
+
+    def work():
+        for _ in range(1000):
+            counter.inc(kind='a"b')
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.value(kind='a"b') == 4000
+    assert 't_total{kind="a\\"b"} 4000' in counter.render()
+
+
+def test_stage_records_errors_and_reraises():
+    before = metrics.errors_total.value(stage='t_stage', kind='ValueError')
+    with pytest.raises(ValueError):
+        with metrics.stage('t_stage'):
+            raise ValueError("실패")
+    assert metrics.stage_seconds.count(stage='t_stage', status='error') == 1
+    assert metrics.errors_total.value(stage='t_stage', kind='ValueError') == before + 1
+
+
+def test_record_gemini_usage_counts_tokens():
+    class Usage:
+        prompt_token_count = 12
+        candidates_token_count = 30
+
+    class Response:
+        usage_metadata = Usage()
+
+    metrics.record_gemini_usage('t-model', Response())
+    metrics.record_gemini_usage('t-model', object())  # usage_metadata가 없는 응답
+    assert metrics.gemini_tokens_total.value(model='t-model', kind='prompt') == 12
+    assert metrics.gemini_tokens_total.value(model='t-model', kind='candidates') == 30
+    assert metrics.gemini_requests_total.value(model='t-model', status='ok') == 2
+
+
+def test_collector_failures_do_not_break_render():
+    registry = Registry()
+    registry.add_collector(lambda: [('t_gauge', '테스트', 3)])
+    registry.add_collector(lambda: 1 / 0)
+    assert 't_gauge 3' in registry.render()
+
+
+def test_init_app_sets_request_id_and_records_latency(capsys):
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/ping')
+    def ping():
+        return metrics.current_request_id()
+
+    response = app.test_client().get('/ping', headers={'X-Request-ID': 'abc123'})
+    assert response.get_data(as_text=True) == 'abc123'
+    assert response.headers['X-Request-ID'] == 'abc123'
+    assert metrics.request_seconds.count(method='GET', endpoint='/ping', status=200) == 1
+    assert '"request_id": "abc123"' in capsys.readouterr().out
+    assert metrics.current_request_id() is None
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+import petai_db
+from petai_migrations import migrate, reset_seed_data, SEED_DISEASES, MIGRATIONS
+
+
+def disease_names():
+    with petai_db.get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT disease_name FROM diseases ORDER BY id")]
+
+
+def test_migrate_applies_once(empty_db):
+    assert migrate() == [version for version, _, _ in MIGRATIONS]
+    assert migrate() == []
+    assert disease_names() == [row[0] for row in SEED_DISEASES]
+    with petai_db.get_connection() as conn:
+        assert conn.execute("SELECT version FROM disease_version").fetchone()[0] > 0
+
+
+def test_migrate_fills_missing_seed_rows_in_legacy_db(empty_db):
+    with petai_db.get_connection() as conn:
+        conn.execute("CREATE TABLE diseases (id INTEGER PRIMARY KEY AUTOINCREMENT, disease_name TEXT NOT NULL, "
+                     "image_labels TEXT, text_symptoms TEXT, warning_level TEXT, advice TEXT)")
+        conn.executemany("INSERT INTO diseases (disease_name, image_labels, text_symptoms, warning_level, advice) "
+                         "VALUES (?, ?, ?, ?, ?)", SEED_DISEASES[:4] + [("직접 추가한 질병", "", "", "", "")])
+    migrate()
+    names = disease_names()
+    assert len(names) == len(SEED_DISEASES) + 1
+    assert names.count(SEED_DISEASES[0][0]) == 1
+
+    reset_seed_data()
+    assert disease_names() == [row[0] for row in SEED_DISEASES]
+
+
+def test_concurrent_migrations_apply_each_version_once(empty_db):
+    calls = []
+    slow = [(1, 'slow', lambda cur, postgres: calls.append(threading.get_ident()))]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(migrate(slow))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(results) == [[], [], [], [1]]
+
+
+def test_failed_migration_rolls_back(empty_db):
+    def broken(cur, postgres):
+        cur.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("실패")
+
+    with pytest.raises(RuntimeError):
+        migrate(MIGRATIONS + [(99, 'broken', broken)])
+    with petai_db.get_connection() as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'half_done' not in tables
+    assert 'schema_migrations' not in tables
@@ -0,0 +1,124 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from petai_pipeline import Pipeline, Stage, StageTimeout, add_stage_observer
+
+
+def sleepy(value, seconds=0.1):
+    def run(*args):
+        time.sleep(seconds)
+        return value
+    return run
+
+
+def test_independent_stages_overlap():
+    pipeline = Pipeline([Stage('a', sleepy(1)), Stage('b', sleepy(2)), Stage('c', sleepy(3))])
+    started = time.monotonic()
+    run = pipeline.run()
+    assert time.monotonic() - started < 0.25
+    assert run.results == {'a': 1, 'b': 2, 'c': 3}
+    assert run.errors == {}
+
+
+def test_dependencies_receive_results_in_order():
+    pipeline = Pipeline([
+        Stage('label', lambda: "눈곱"),
+        Stage('upper', lambda label: label + "!", deps=['label']),
+        Stage('both', lambda label, upper: (label, upper), deps=['label', 'upper']),
+    ])
+    assert pipeline.run().results['both'] == ("눈곱", "눈곱!")
+
+
+def test_timeout_and_error_fall_back_to_default():
+    seen = []
+    add_stage_observer(lambda name, seconds, status: seen.append((name, status)))
+
+    def boom():
+        raise RuntimeError("실패")
+
+    pipeline = Pipeline([
+        Stage('slow', sleepy("늦음", 1.0), timeout=0.05, default="대체"),
+        Stage('broken', boom, default=[]),
+        Stage('after', lambda slow, broken: (slow, broken), deps=['slow', 'broken']),
+    ])
+    started = time.monotonic()
+    run = pipeline.run()
+    assert time.monotonic() - started < 0.5
+    assert run.results['after'] == ("대체", [])
+    assert isinstance(run.errors['slow'], StageTimeout)
+    assert not run.ok('broken') and run.ok('after')
+    assert ('slow', 'timeout') in seen and ('broken', 'error') in seen
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        Pipeline([Stage('a', lambda x: x, deps=['missing'])])
+
+
+def test_overall_deadline_bounds_the_run():
+    pipeline = Pipeline([
+        Stage('fast', sleepy("빠름", 0.01)),
+        Stage('slow', sleepy("늦음", 1.0), default="대체"),
+        Stage('after', lambda slow: slow + "!", deps=['slow']),
+    ])
+    started = time.monotonic()
+    run = pipeline.run(deadline=0.1)
+    assert time.monotonic() - started < 0.3
+    assert run.results['fast'] == "빠름" and run.ok('fast')
+    assert run.results['slow'] == "대체" and isinstance(run.errors['slow'], StageTimeout)
+    assert isinstance(run.errors['after'], StageTimeout)
+
+
+def test_stage_timeout_starts_when_stage_starts_running():
+    # 워커 1개가 앞 단계로 바쁜 동안 기다린 시간은 뒤 단계의 제한 시간에 들어가지 않습니다.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        run = Pipeline([Stage('busy', sleepy("먼저", 0.2)), Stage('quick', sleepy("빠름", 0.02), timeout=0.1)],
+                       executor=executor).run()
+    assert run.ok('quick') and run.results['quick'] == "빠름"
+
+
+def test_abandoned_gemini_stages_do_not_starve_db_stages():
+    hung = threading.Event()
+    executors = {'default': ThreadPoolExecutor(max_workers=2), 'gemini': ThreadPoolExecutor(max_workers=2)}
+    try:
+        # 멈춘 Gemini 호출이 풀 크기보다 많이 쌓여도 (스레드는 돌려받지 못함)
+        for _ in range(4):
+            run = Pipeline([Stage('vision', lambda: hung.wait(5), timeout=0.05, default="실패", pool='gemini')],
+                           executor=executors).run(deadline=0.2)
+            assert not run.ok('vision')
+        # DB 단계는 다른 풀에서 바로 실행됩니다.
+        run = Pipeline([
+            Stage('db', sleepy(["결막염"], 0.01), timeout=0.1),
+            Stage('diagnosis', lambda: hung.wait(5), timeout=0.05, pool='gemini'),
+        ], executor=executors).run(deadline=0.5)
+        assert run.ok('db') and run.results['db'] == ["결막염"]
+    finally:
+        hung.set()
+        for executor in executors.values():
+            executor.shutdown()
+
+
+def test_run_async_awaits_coroutine_stages_with_the_same_semantics():
+    import asyncio
+    seen = []
+    add_stage_observer(lambda name, seconds, status: seen.append((name, status)))
+
+    async def nap(value, seconds):
+        await asyncio.sleep(seconds)
+        return value
+
+    pipeline = Pipeline([
+        Stage('label', lambda: nap("눈곱", 0.05)),
+        Stage('search', lambda label: nap([label], 0.01), deps=['label']),
+        Stage('hung', lambda: nap("늦음", 5), timeout=0.05, default="대체"),
+        Stage('prompt', lambda search, hung: (search, hung), deps=['search', 'hung']),
+        Stage('diagnosis', lambda prompt: nap("답변", 5), deps=['prompt']),
+    ])
+    started = time.monotonic()
+    run = asyncio.run(pipeline.run_async(deadline=0.3))
+    assert time.monotonic() - started < 0.5
+    assert run.results['prompt'] == (["눈곱"], "대체") and run.ok('prompt')
+    assert isinstance(run.errors['hung'], StageTimeout) and isinstance(run.errors['diagnosis'], StageTimeout)
+    assert ('hung', 'timeout') in seen and ('diagnosis', 'timeout') in seen and ('label', 'ok') in seen
@@ -0,0 +1,43 @@
+from petai_prompt import build_prompt, estimate_tokens, format_disease, select_context, IMAGE_SECTION, SYMPTOM_SECTION
+
+
+def disease(i, name, labels='', symptoms='', advice='조언 ' * 40):
+    return {"id": i, "disease_name": name, "image_labels": labels, "text_symptoms": symptoms,
+            "warning_level": "주의 🟡", "advice": advice}
+
+
+def test_estimate_tokens_counts_hangul_per_character():
+    assert estimate_tokens('abcd') == 1
+    assert estimate_tokens('눈곱') == 2
+
+
+def test_format_disease_is_compact():
+    line = format_disease(disease(1, '결막염', '눈곱,붉은 눈', '눈물', advice='  병원에\n 가세요 '))
+    assert line == "- 결막염 (주의 🟡) | 사진 징후: 눈곱,붉은 눈 | 증상: 눈물 | 조언: 병원에 가세요"
+    assert "{" not in line and "'id'" not in line
+
+
+def test_prompt_ranks_by_match_strength_and_strips_indentation():
+    db_results = [disease(1, '피부염', '발진'), disease(2, '결막염', '눈곱,붉은 눈', '눈물')]
+    prompt = build_prompt('고양이', '눈물이 나요', True, '눈곱', db_results)
+    assert prompt.index('결막염') < prompt.index('피부염')
+    assert not any(line.startswith(' ') for line in prompt.splitlines())
+    assert "[사진 분석 결과 라벨]\n눈곱" in prompt
+
+
+def test_context_stays_within_budget():
+    many = [disease(i, f'질병{i}', '눈곱') for i in range(200)]
+    small = build_prompt('강아지', '눈곱', True, '눈곱', many[:3])
+    large = build_prompt('강아지', '눈곱', True, '눈곱', many, budget=800)
+    assert estimate_tokens(large) - estimate_tokens(small) < 800
+    assert '개는 생략했습니다' in large
+
+
+def test_select_context_shortens_then_drops_and_dedupes():
+    a, b = disease(1, 'A', '눈곱'), disease(2, 'B', '콧물')
+    full, short = estimate_tokens(format_disease(a)) + 1, estimate_tokens(format_disease(b, advice=False)) + 1
+    lines, dropped = select_context([(IMAGE_SECTION, [a]), (SYMPTOM_SECTION, [a, b])], budget=full + short)
+    assert lines[IMAGE_SECTION] == [format_disease(a)]
+    assert lines[SYMPTOM_SECTION] == [format_disease(b, advice=False)] and dropped == 0
+    lines, dropped = select_context([(IMAGE_SECTION, [a, b])], budget=1)
+    assert lines[IMAGE_SECTION] == [] and dropped == 2
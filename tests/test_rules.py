@@ -0,0 +1,71 @@
+import json
+import os
+import time
+
+import pytest
+
+from petai_rules import BehaviorRules, RuleSet, normalize_korean
+from petai_utils import analyze_behaviors
+
+LICK, SCRATCH = "과도한 핥기", "과도한 긁기(발톱으로 긁음)"
+
+
+def test_normalize_korean_strips_particles_spaces_and_joins_jamo():
+    assert normalize_korean("피부에 발진이") == "피부발진"
+    assert normalize_korean("피 부") == "피부"
+    # 분리된 자모(U+1111 U+1175 U+1107 U+116E)도 같은 음절이 됩니다.
+    assert normalize_korean("피부가") == "피부"
+    assert normalize_korean("ABC를") == "abc"
+
+
+def test_analyze_behaviors_uses_rules():
+    results = analyze_behaviors([LICK, "설사"], "피부에 빨간 발진이 생겼어요")
+    assert [r.get('priority') for r in results] == ["높음", None]
+    assert all('priority' not in r for r in analyze_behaviors([LICK], "밥을 잘 먹어요"))
+
+
+def test_ruleset_picks_highest_priority_and_caches():
+    ruleset = RuleSet({"priority_levels": ["높음", "보통"], "rules": [
+        {"keywords": ["기침"], "behaviors": [LICK, SCRATCH], "priority": "보통"},
+        {"keywords": ["피부"], "behaviors": [SCRATCH], "priority": "높음"},
+    ]})
+    text = normalize_korean("기침하고 피부를 긁어요")
+    assert ruleset.priorities((LICK, SCRATCH, "설사"), text) == ("보통", "높음", None)
+    ruleset.priorities((LICK, SCRATCH, "설사"), text)
+    assert ruleset.priorities.cache_info().hits == 1
+
+
+def test_ruleset_rejects_unknown_priority():
+    with pytest.raises(ValueError):
+        RuleSet({"priority_levels": ["높음"], "rules": [{"keywords": ["a"], "behaviors": [LICK], "priority": "낮음"}]})
+
+
+def write_rules(path, keywords, mtime):
+    path.write_text(json.dumps({"rules": [{"keywords": keywords, "behaviors": [LICK]}]}, ensure_ascii=False),
+                    encoding='utf-8')
+    os.utime(path, (mtime, mtime))
+
+
+def test_rules_reload_when_file_changes_and_keep_old_rules_on_error(tmp_path):
+    path = tmp_path / 'rules.json'
+    write_rules(path, ["피부"], 1_000_000)
+    rules = BehaviorRules(str(path), recheck_seconds=0)
+    assert rules.get().behavior_priorities("피부") == {LICK: "높음"}
+
+    write_rules(path, ["구토"], 2_000_000)
+    assert rules.get().behavior_priorities("피부") == {}
+    assert rules.get().behavior_priorities("구토") == {LICK: "높음"}
+
+    path.write_text("{not json", encoding='utf-8')
+    os.utime(path, (3_000_000, 3_000_000))
+    assert rules.get().behavior_priorities("구토") == {LICK: "높음"}
+
+
+def test_matching_cost_is_flat_in_rule_count():
+    rules = [{"keywords": [f"증상{i}번"], "behaviors": [LICK]} for i in range(2000)]
+    ruleset = RuleSet({"rules": rules + [{"keywords": ["피부"], "behaviors": [SCRATCH]}]})
+    text = normalize_korean("피부에 발진이 있고 자꾸 핥아요 " * 20)
+    started = time.perf_counter()
+    for _ in range(200):
+        assert ruleset.behavior_priorities(text) == {SCRATCH: "높음"}
+    assert (time.perf_counter() - started) / 200 < 0.005
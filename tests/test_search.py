@@ -0,0 +1,47 @@
+import time
+
+import pytest
+import petai_db
+from petai_search import SymptomSearch, bigrams, _query_terms
+
+
+def test_bigrams_split_words_and_keep_single_characters():
+    assert bigrams("눈곱이 껴요, 붉은 눈") == ['눈곱', '곱이', '껴요', '붉은', '눈']
+    assert _query_terms('눈곱이 "눈곱"…') == ['눈곱', '곱이']
+
+
+@pytest.fixture
+def search_db(migrated_db):
+    return SymptomSearch(recheck_seconds=0)
+
+
+def names(results):
+    return [d['disease_name'] for d in results]
+
+
+def test_search_matches_inflected_symptoms(search_db):
+    results = search_db.search("눈곱이 자꾸 껴요")
+    assert set(names(results)[:2]) == {"결막염 (의심)", "고양이 허피스 바이러스 (상부 호흡기 감염)"}
+    assert results[0]['search_score'] >= results[-1]['search_score']
+    assert names(search_db.search("깽깽이걸음을 해요"))[0] == "슬개골 탈구 (강아지)"
+    assert search_db.search("!!!") == []
+
+
+def test_search_index_follows_table_changes(search_db):
+    assert search_db.search("귀 진드기") == []
+    with petai_db.get_connection() as conn:
+        conn.execute("INSERT INTO diseases (disease_name, image_labels, text_symptoms) "
+                     "VALUES ('귀 진드기 감염', '귀 분비물', '귀를 긁음,머리를 흔듦')")
+    assert names(search_db.search("귀를 자주 긁어요"))[0] == "귀 진드기 감염"
+
+
+def test_search_stays_fast_on_large_tables(search_db):
+    with petai_db.get_connection() as conn:
+        conn.executemany("INSERT INTO diseases (disease_name, image_labels, text_symptoms) VALUES (?, ?, ?)",
+                         [(f"합성 질병 {i}", f"증상{i} 표시", f"행동{i} 관찰") for i in range(20000)])
+    search_db.search("눈곱")  # 색인 재생성
+    started = time.perf_counter()
+    for _ in range(20):
+        results = search_db.search("눈곱이 껴요", limit=5)
+    assert (time.perf_counter() - started) / 20 < 0.05
+    assert "결막염 (의심)" in names(results)
@@ -0,0 +1,65 @@
+import os
+import time
+
+import pytest
+from petai_storage import LocalUploadStore, S3UploadStore, content_key
+
+
+def test_local_store_dedupes_and_shards(tmp_path):
+    store = LocalUploadStore(root=str(tmp_path / 'static' / 'uploads'), static_root=str(tmp_path / 'static'))
+    key = store.put(b"same photo", 'jpg')
+    assert store.put(b"same photo", 'jpg') == key
+    assert key == content_key(b"same photo", 'jpg')
+    shard1, shard2, filename = key.split('/')
+    assert filename.startswith(shard1 + shard2)
+    assert store.read(key) == b"same photo"
+    assert store.static_filename(key) == f"uploads/{key}"
+    assert len(list(store.entries())) == 1
+
+
+def test_local_sweep_enforces_age_and_size(tmp_path):
+    store = LocalUploadStore(root=str(tmp_path))
+    old = store.put(b"old", 'jpg')
+    mid = store.put(b"middle" * 10, 'jpg')
+    new = store.put(b"newest" * 10, 'jpg')
+    now = time.time()
+    os.utime(store.path(old), (now - 1000, now - 1000))
+    os.utime(store.path(mid), (now - 10, now - 10))
+
+    assert store.sweep(max_age=500) == 1
+    assert not os.path.exists(store.path(old))
+    assert store.sweep(max_bytes=70) == 1
+    assert not os.path.exists(store.path(mid))
+    assert os.path.exists(store.path(new))
+
+
+def test_s3_store_with_moto():
+    boto3 = pytest.importorskip('boto3')
+    moto = pytest.importorskip('moto')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='uploads')
+        store = S3UploadStore('uploads', client=client)
+        key = store.put(b"photo", 'jpg')
+        assert store.read(key) == b"photo"
+        assert [e[0] for e in store.entries()] == [key]
+        assert key in store.url(key)
+        assert store.sweep(max_bytes=0) == 1
+        assert list(store.entries()) == []
+
+
+def test_local_sweep_ignores_temp_files_and_kept_overflow(tmp_path):
+    store = LocalUploadStore(root=str(tmp_path))
+    kept = store.put(b"kept" * 30, 'jpg')
+    queued = store.put(b"queued", 'jpg')
+    partial = store.path(queued) + '.abc.tmp'
+    with open(partial, 'wb') as f:
+        f.write(b"x" * 1000)
+    assert [e[0] for e in store.entries()].count(queued) == 1 and len(list(store.entries())) == 2
+
+    # 남길 파일만으로 한도를 넘으면 용량 기준으로는 다른 업로드를 지우지 않습니다.
+    assert store.sweep(max_bytes=100, keep={kept}) == 0
+    assert os.path.exists(store.path(queued)) and os.path.exists(partial)
+    # 한도 안에 남길 여유가 있으면 남길 파일이 아닌 것부터 지웁니다.
+    assert store.sweep(max_bytes=121, keep={kept}) == 1
+    assert os.path.exists(store.path(kept)) and not os.path.exists(store.path(queued))